@@ -0,0 +1,63 @@
+"""
+Mede o tempo de inicialização do CLI e garante que torch/transformers não
+são importados antes da etapa BERT. Cada medição roda em um processo novo.
+
+Uso:
+    python benchmarks/bench_import_time.py [--max-seconds 0.5] [--repeat 5]
+
+Sai com código 1 se algum módulo pesado for importado ou se o tempo
+(melhor de --repeat) passar de --max-seconds.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+HEAVY_MODULES = ("torch", "transformers", "onnxruntime", "optimum")
+
+# Módulos importados pelo CLI antes de qualquer etapa rodar
+TARGETS = ("main", "src.pipeline")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure(module: str) -> dict:
+    code = PROBE.format(module=module, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-seconds", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for module in TARGETS:
+        runs = [measure(module) for _ in range(args.repeat)]
+        best = min(run["seconds"] for run in runs)
+        heavy = sorted({name for run in runs for name in run["heavy"]})
+        status = "✅"
+        if heavy or best > args.max_seconds:
+            status = "❌"
+            failed = True
+        print(f"{status} import {module}: {best * 1000:.0f} ms"
+              f"{f' (módulos pesados: {heavy})' if heavy else ''}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Memória por mensagem: ChatMessage antigo (@dataclass sem __slots__, uma cópia
+por etapa) contra a versão com __slots__, timestamps/senders internados e
+etapas aplicadas no lugar.
+
+Mede com tracemalloc os bytes por mensagem mantidos após a leitura e o pico
+de alocação ao passar as mensagens pelas etapas de ID, regex e apelidos.
+
+Uso:
+    python benchmarks/bench_message_memory.py [--messages 100000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.apelidos import anonimizar_apelidos, anonimizar_apelidos_chat_message, compile_apelidos
+from src.chat_message import ChatMessage
+from src.id_anon import anonymize_chat_message_id, anonymize_message_id, anonymize_sender_id, reset_mappings
+from src.regex_anon import anonymize_chat_message, anonymize_message_content
+
+
+@dataclass
+class LegacyChatMessage:
+    """Implementação anterior, mantida aqui apenas para comparação"""
+    timestamp: str
+    sender: str
+    message: str
+    original_message: str = None
+    original_sender: str = None
+
+    def __post_init__(self):
+        if self.original_message is None:
+            self.original_message = self.message
+        if self.original_sender is None:
+            self.original_sender = self.sender
+
+    @classmethod
+    def from_line(cls, line: str):
+        line = line.strip()
+        timestamp_end = line.find('] ')
+        remaining = line[timestamp_end + 2:]
+        sender_end = remaining.find(': ')
+        return cls(timestamp=line[1:timestamp_end], sender=remaining[:sender_end],
+                   message=remaining[sender_end + 2:])
+
+
+def legacy_stages(msg, apelidos):
+    """Etapas como eram antes: uma nova instância copiada a cada etapa"""
+    msg = LegacyChatMessage(msg.timestamp, anonymize_sender_id(msg.sender), anonymize_message_id(msg.message),
+                            msg.original_message, msg.original_sender)
+    msg = LegacyChatMessage(msg.timestamp, msg.sender, anonymize_message_content(msg.message),
+                            msg.original_message, msg.original_sender)
+    return LegacyChatMessage(msg.timestamp, anonimizar_apelidos(msg.sender, apelidos),
+                             anonimizar_apelidos(msg.message, apelidos),
+                             msg.original_message, msg.original_sender)
+
+
+def current_stages(msg, apelidos):
+    msg = anonymize_chat_message_id(msg, inplace=True)
+    msg = anonymize_chat_message(msg, inplace=True)
+    return anonimizar_apelidos_chat_message(msg, apelidos, inplace=True)
+
+
+SENDERS = ["vide", "johny", "maria.souza", "Pedro Henrique", "ana", "bot-deploy"]
+TEXTS = [
+    "bom dia pessoal, alguém viu a reunião de ontem?",
+    "meu cpf é 123.456.789-09, pode cadastrar",
+    "manda pro joao.silva@empresa.com.br por favor",
+    "@johny olha o PR que o Fofucho abriu",
+    "ok",
+    "vou subir o PR hoje à noite, depois eu aviso no canal",
+]
+
+
+def build_lines(size: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(size):
+        # Vários minutos seguidos com mais de uma mensagem, como em um chat real
+        minute = i // 4
+        timestamp = f"{23 + minute // 1440:02d}/07/2025 {minute // 60 % 24:02d}:{minute % 60:02d}"
+        lines.append(f"[{timestamp}] {rng.choice(SENDERS)}: {rng.choice(TEXTS)}\n")
+    return lines
+
+
+def measure(parse, stages, lines, apelidos):
+    """Retorna (bytes/mensagem após a leitura, pico de bytes/mensagem nas etapas)"""
+    reset_mappings()
+    gc.collect()
+    tracemalloc.start()
+    messages = [parse(line) for line in lines]
+    resident = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    messages = [stages(msg, apelidos) for msg in messages]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del messages
+    return resident / len(lines), peak / len(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+
+    # Linhas já em memória antes da medição, como ao ler de um arquivo
+    lines = build_lines(args.messages)
+    apelidos = compile_apelidos(["Fofucho", "Pereira"])
+
+    legacy = measure(LegacyChatMessage.from_line, legacy_stages, lines, apelidos)
+    current = measure(ChatMessage.from_line, current_stages, lines, apelidos)
+
+    print(f"Mensagens: {len(lines)}")
+    print(f"{'':12}{'leitura':>12}{'pico etapas':>14}  (bytes/mensagem)")
+    print(f"{'Antiga':12}{legacy[0]:12,.0f}{legacy[1]:14,.0f}")
+    print(f"{'Slots':12}{current[0]:12,.0f}{current[1]:14,.0f}")
+    print(f"Redução:    {1 - current[0] / legacy[0]:11.0%}{1 - current[1] / legacy[1]:14.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Compara os backends de inferência do NER (torch fp32, int8, onnx, onnx-int8):
+throughput em mensagens/s e concordância das entidades com o backend torch.
+
+Uso:
+    python benchmarks/bench_ner_backends.py [--input arquivo.txt] [--messages 2000]
+                                            [--backends torch,int8,onnx] [--batch-size 32]
+                                            [--json resultado.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.chat_message import iter_messages_from_file
+from src.ner_cache import NerCache
+from src.pt_bert_local import BACKENDS, DEFAULT_BATCH_SIZE, LocalBertAnonymizer, NerGate
+
+SAMPLES = [
+    "oi, johny!",
+    "Oi Theo, tudo bem?",
+    "o Coutinho vai estar presente na reunião com a Maria Fernanda?",
+    "Vai sim, adiciona ele no invite",
+    "Falei com o Dr. Pedro Henrique Albuquerque ontem sobre o contrato da Petrobras",
+    "alguém sabe se a ana já mandou o relatório?",
+    "Amanhã o João e a Beatriz apresentam o projeto em São Paulo",
+    "bom dia pessoal",
+]
+
+
+def load_texts(args) -> list:
+    if args.input:
+        texts = [msg.message for msg in iter_messages_from_file(args.input)]
+    else:
+        texts = SAMPLES
+    repeated = (texts * (args.messages // len(texts) + 1))[:args.messages]
+    # Sufixo para que o cache interno nunca seja usado
+    return [f"{text} ({i})" for i, text in enumerate(repeated)]
+
+
+def run_backend(backend: str, texts: list, batch_size: int):
+    anonymizer = LocalBertAnonymizer(cache=NerCache(max_entries=0), gate=NerGate(enabled=False), backend=backend)
+    if not anonymizer.initialize():
+        return None
+    # Aquecimento
+    anonymizer.extract_entities_batch(texts[:batch_size], batch_size)
+
+    start = time.perf_counter()
+    entities = anonymizer.extract_entities_batch(texts, batch_size)
+    elapsed = time.perf_counter() - start
+    return {"backend": anonymizer.backend, "seconds": elapsed,
+            "msgs_per_sec": len(texts) / elapsed, "entities": entities}
+
+
+def agreement(reference: list, candidate: list) -> dict:
+    """Concordância por mensagem (mesmo conjunto de entidades) e F1 por entidade"""
+    same = tp = fp = fn = 0
+    for ref, cand in zip(reference, candidate):
+        ref, cand = set(ref), set(cand)
+        same += ref == cand
+        tp += len(ref & cand)
+        fp += len(cand - ref)
+        fn += len(ref - cand)
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"message_agreement": same / len(reference) if reference else 1.0,
+            "precision": precision, "recall": recall, "f1": f1}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="Arquivo de chat usado como corpus (padrão: frases de exemplo)")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--json", help="Salva o resultado em JSON")
+    args = parser.parse_args()
+
+    texts = load_texts(args)
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    if "torch" not in backends:
+        backends.insert(0, "torch")
+
+    results = {}
+    for backend in backends:
+        print(f"▶️  {backend}...")
+        result = run_backend(backend, texts, args.batch_size)
+        if result is None or result["backend"] != backend:
+            print(f"⚠️  Backend {backend} não disponível, ignorado")
+            continue
+        results[backend] = result
+
+    if "torch" not in results:
+        print("❌ Backend torch não disponível; nada para comparar")
+        return 1
+
+    reference = results["torch"]
+    report = []
+    print(f"\n{'backend':<10} {'msgs/s':>10} {'speedup':>8} {'concord.':>9} {'F1':>6}")
+    for backend, result in results.items():
+        row = {
+            "backend": backend,
+            "msgs_per_sec": result["msgs_per_sec"],
+            "speedup": result["msgs_per_sec"] / reference["msgs_per_sec"],
+            **agreement(reference["entities"], result["entities"]),
+        }
+        report.append(row)
+        print(f"{backend:<10} {row['msgs_per_sec']:>10,.1f} {row['speedup']:>7.2f}x "
+              f"{row['message_agreement']:>8.1%} {row['f1']:>6.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"messages": len(texts), "batch_size": args.batch_size, "results": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Benchmark reprodutível das 4 etapas do pipeline em arquivos
+(process_with_id/regex/apelidos/bert) sobre um corpus sintético com semente.
+
+Para cada etapa mede mensagens/s, latência p50/p95/p99 e pico de memória
+(RSS). Cada etapa roda em um processo novo, então o pico de RSS é o da etapa.
+A latência é por mensagem nas etapas de ID, regex e apelidos e por bloco
+na etapa BERT (que processa as mensagens em lotes).
+
+A etapa BERT usa por padrão um modelo stub (nomes conhecidos viram entidades),
+que roda offline e sem torch; --ner model usa o modelo real.
+
+Os resultados podem ser gravados em JSON e comparados com uma execução
+anterior: o script termina com código 1 se alguma etapa ficar mais lenta
+(ou usar mais memória) do que a tolerância permite.
+
+Uso:
+    python benchmarks/bench_pipeline.py [--lines 100000] [--seed 42] [--input chat.txt]
+                                        [--stages id,regex,apelidos,bert] [--ner stub|model]
+                                        [--stub-delay-ms 0] [--batch-size 32] [--ner-pack 510] [--workers 1]
+                                        [--json resultado.json] [--baseline base.json]
+                                        [--tolerance 0.15]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_chat import FIRST_NAMES, NICKNAMES, WHITELIST, write_corpus
+
+STAGES = ("id", "regex", "apelidos", "bert")
+
+# Número máximo de amostras de latência guardadas por etapa
+MAX_LATENCY_SAMPLES = 200_000
+
+
+class StubNerPipeline:
+    """
+    Substituto do pipeline de NER do transformers: marca como PER as palavras
+    capitalizadas que estão na lista de nomes do gerador sintético.
+    """
+
+    def __init__(self, delay_ms: float = 0.0):
+        self.delay = delay_ms / 1000
+        self.names = set(FIRST_NAMES) | set(NICKNAMES)
+        self.word_re = re.compile(r"\b[^\W\d_]+\b")
+
+    def _entities(self, text: str) -> list:
+        return [{"entity_group": "PER", "start": m.start(), "end": m.end(), "score": 0.99}
+                for m in self.word_re.finditer(text) if m.group(0) in self.names]
+
+    def __call__(self, texts, batch_size=None):
+        if self.delay:
+            time.sleep(self.delay)
+        if isinstance(texts, str):
+            return self._entities(texts)
+        return [self._entities(text) for text in texts]
+
+
+def stub_anonymizer(delay_ms: float = 0.0):
+    """Anonimizador com o modelo stub já carregado"""
+    from src.pt_bert_local import LocalBertAnonymizer
+
+    anonymizer = LocalBertAnonymizer()
+    anonymizer.pipe = StubNerPipeline(delay_ms)
+    anonymizer.loaded_model = "stub"
+    anonymizer.initialized = True
+    return anonymizer
+
+
+def install_stub_ner(delay_ms: float = 0.0):
+    """Instala um anonimizador com o modelo stub como instância global"""
+    from src.pt_bert_local import set_anonymizer
+
+    set_anonymizer(stub_anonymizer(delay_ms))
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _timed(func, samples, sample_every):
+    """Envolve func guardando a duração de uma a cada sample_every chamadas"""
+    counter = [0]
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        if counter[0] % sample_every == 0 and len(samples) < MAX_LATENCY_SAMPLES:
+            samples.append(time.perf_counter() - start)
+        counter[0] += 1
+        return result
+    return wrapper
+
+
+def run_stage(stage: str, paths: dict, options: dict, results):
+    """Executa uma etapa em um processo próprio e envia as medidas por results"""
+    from src import pipeline
+    from src.parallel import shutdown_pools
+
+    samples = array("d")
+    sample_every = max(1, options["lines"] // MAX_LATENCY_SAMPLES)
+    whitelist = WHITELIST
+    workers = options["workers"]
+
+    if stage == "bert":
+        from src.pt_bert_local import configure_ner_packing, get_anonymizer, get_ner_batch_stats
+        if options["ner"] == "stub":
+            install_stub_ner(options["stub_delay_ms"])
+        elif not get_anonymizer().initialize():
+            results.put({"error": "BERT LOCAL não disponível"})
+            return
+        configure_ner_packing(options["ner_pack"])
+        pipeline.anonymize_chat_messages_bert = _timed(pipeline.anonymize_chat_messages_bert, samples, 1)
+        call = lambda: pipeline.process_with_bert(paths["apelidos"], paths["bert"], paths["bert_all"], whitelist,
+                                                  batch_size=options["batch_size"])
+    elif stage == "id":
+        pipeline.anonymize_chat_message_id = _timed(pipeline.anonymize_chat_message_id, samples, sample_every)
+        call = lambda: pipeline.process_with_id(paths["input"], paths["id"], paths["id_all"], whitelist)
+    elif stage == "regex":
+        # Com workers > 1 a função vai para os processos do pool por pickle: não pode ser envolvida
+        if workers <= 1:
+            pipeline.anonymize_chat_message = _timed(pipeline.anonymize_chat_message, samples, sample_every)
+        call = lambda: pipeline.process_with_regex(paths["id"], paths["regex"], paths["regex_all"], whitelist,
+                                                   workers=workers)
+    else:
+        if workers <= 1:
+            pipeline.anonimizar_apelidos_chat_message = _timed(pipeline.anonimizar_apelidos_chat_message,
+                                                               samples, sample_every)
+        call = lambda: pipeline.process_with_apelidos(paths["regex"], paths["apelidos"], paths["apelidos_all"],
+                                                      NICKNAMES, whitelist, workers=workers)
+
+    start = time.perf_counter()
+    try:
+        call()
+    except Exception as e:
+        # Sem resposta na fila, o processo principal esperaria para sempre
+        results.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    finally:
+        # O processo da etapa só termina depois que os workers do pool são encerrados
+        shutdown_pools()
+    seconds = time.perf_counter() - start
+
+    with open(paths[stage], "r", encoding="utf-8") as f:
+        messages = sum(1 for _ in f)
+
+    # Com workers > 1 as funções rodam nos processos do pool e não há amostras
+    result = {
+        "messages": messages,
+        "seconds": seconds,
+        "msgs_per_sec": messages / seconds if seconds else 0.0,
+        "latency_unit": "bloco" if stage == "bert" else "mensagem",
+        "latency_ms": {
+            "p50": percentile(samples, 0.50) * 1000,
+            "p95": percentile(samples, 0.95) * 1000,
+            "p99": percentile(samples, 0.99) * 1000,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if stage == "bert":
+        result["forward_passes"] = get_ner_batch_stats()["batches"]
+    results.put(result)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Lista as regressões de throughput e de memória em relação ao baseline"""
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        if current["msgs_per_sec"] < previous["msgs_per_sec"] * (1 - tolerance):
+            regressions.append(f"{stage}: {current['msgs_per_sec']:,.0f} msgs/s "
+                               f"(baseline {previous['msgs_per_sec']:,.0f})")
+        if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{stage}: pico de {current['peak_rss_mb']:.1f} MB "
+                               f"(baseline {previous['peak_rss_mb']:.1f} MB)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--input", help="Usa um arquivo existente em vez do corpus sintético")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--ner", choices=("stub", "model"), default="stub")
+    parser.add_argument("--stub-delay-ms", type=float, default=0.0,
+                        help="Tempo simulado por chamada ao modelo stub")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--ner-pack", type=int, help="Empacota mensagens em sequências de até N tokens")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--json", help="Grava os resultados neste arquivo")
+    parser.add_argument("--baseline", help="Resultados anteriores (JSON) para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Variação máxima aceita em relação ao baseline (fração)")
+    args = parser.parse_args()
+
+    stages = [stage for stage in STAGES if stage in args.stages.split(",")]
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    paths = {"input": args.input or os.path.join(workdir, "chat.txt")}
+    for stage in STAGES:
+        paths[stage] = os.path.join(workdir, f"{stage}.txt")
+        paths[f"{stage}_all"] = os.path.join(workdir, f"{stage}_all.txt")
+
+    try:
+        if not args.input:
+            write_corpus(paths["input"], args.lines, args.seed)
+        with open(paths["input"], "r", encoding="utf-8") as f:
+            lines = sum(1 for _ in f)
+        options = {"lines": lines, "ner": args.ner, "stub_delay_ms": args.stub_delay_ms,
+                   "batch_size": args.batch_size, "ner_pack": args.ner_pack, "workers": args.workers}
+
+        results = {
+            "meta": {
+                "lines": lines, "seed": None if args.input else args.seed, "input": args.input,
+                "ner": args.ner, "batch_size": args.batch_size, "ner_pack": args.ner_pack, "workers": args.workers,
+                "python": platform.python_version(), "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "stages": {},
+        }
+
+        # "spawn": cada etapa começa de um processo limpo (RSS e mapas de IDs)
+        context = multiprocessing.get_context("spawn")
+        print(f"Mensagens: {lines}  |  NER: {args.ner}")
+        print(f"{'etapa':10}{'msgs/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MB':>10}")
+        for stage in stages:
+            queue = context.Queue()
+            process = context.Process(target=run_stage, args=(stage, paths, options, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            results["stages"][stage] = result
+            if "error" in result:
+                print(f"{stage:10}{result['error']}")
+                continue
+            latency = result["latency_ms"]
+            print(f"{stage:10}{result['msgs_per_sec']:12,.0f}{latency['p50']:10.3f}{latency['p95']:10.3f}"
+                  f"{latency['p99']:10.3f}{result['peak_rss_mb']:10.1f}")
+            if "forward_passes" in result:
+                print(f"{'':10}{result['forward_passes']:,} forward passes")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Resultados gravados em {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressões em relação a {args.baseline} (tolerância {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"Sem regressões em relação a {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
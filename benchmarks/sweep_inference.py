@@ -0,0 +1,142 @@
+"""
+Varredura das combinações réplicas × threads do pool de inferência
+(src/inference_pool.py) nesta máquina, para escolher --ner-replicas e
+--ner-threads.
+
+Para cada combinação com réplicas × threads <= núcleos disponíveis, inicia o
+pool, aquece as réplicas e mede textos/s e latência p50/p95 por lote sobre
+mensagens do corpus sintético (sem o cache de NER, que esconderia o modelo).
+
+--ner stub troca o modelo por um stub (sem torch), útil apenas para testar a
+ferramenta: o tempo do stub não depende das threads.
+
+Uso:
+    python benchmarks/sweep_inference.py [--texts 4000] [--batch-size 32] [--max-cores 64]
+                                         [--mode process|thread] [--backend torch]
+                                         [--ner model|stub] [--json resultado.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_pipeline import percentile, stub_anonymizer
+from synthetic_chat import generate_lines
+
+from src.inference_pool import POOL_MODES, InferencePool, available_cores
+from src.pt_bert_local import BACKENDS
+
+
+def powers_of_two(limit: int):
+    value = 1
+    while value <= limit:
+        yield value
+        value *= 2
+
+
+def candidate_settings(cores: int):
+    """Combinações (réplicas, threads) em potências de 2, mais as que usam todos os núcleos"""
+    settings = {(replicas, threads) for replicas in powers_of_two(cores) for threads in powers_of_two(cores)
+                if replicas * threads <= cores}
+    settings |= {(replicas, cores // replicas) for replicas in powers_of_two(cores)}
+    return sorted(settings)
+
+
+def _wait_first(pending: dict, latencies: list):
+    """Espera pelo menos um lote de pending ({future: instante do envio}) e registra a latência de cada um pronto"""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    finished = time.perf_counter()
+    for future in done:
+        future.result()
+        latencies.append(finished - pending.pop(future))
+
+
+def measure(pool: InferencePool, texts, batch_size: int) -> dict:
+    """
+    Envia os lotes ao pool, com até 2 lotes por réplica em andamento (como o
+    pipeline), e mede textos/s e a latência de cada lote.
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    # Aquecimento: cada réplica carrega o modelo e faz pelo menos um forward pass
+    for future in pool.submit_batches(batches[:pool.replicas]):
+        future.result()
+
+    latencies = []
+    max_pending = 2 * pool.replicas
+    pending = {}
+    start = time.perf_counter()
+    for batch in batches:
+        submitted = time.perf_counter()
+        pending[pool.submit_batches([batch])[0]] = submitted
+        if len(pending) >= max_pending:
+            _wait_first(pending, latencies)
+    while pending:
+        _wait_first(pending, latencies)
+    seconds = time.perf_counter() - start
+    return {
+        "texts_per_sec": len(texts) / seconds if seconds else 0.0,
+        "seconds": seconds,
+        # Tempo de cada lote desde o seu envio até ficar pronto (inclui a espera na fila limitada do pool)
+        "batch_latency_ms": {"p50": percentile(latencies, 0.50) * 1000, "p95": percentile(latencies, 0.95) * 1000},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-cores", type=int, help="Limita os núcleos considerados (padrão: todos os disponíveis)")
+    parser.add_argument("--mode", choices=POOL_MODES, default="process")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch")
+    parser.add_argument("--ner", choices=("model", "stub"), default="model")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    cores = len(available_cores())
+    if args.max_cores:
+        cores = min(cores, args.max_cores)
+    texts = [line.split(": ", 1)[1] for line in generate_lines(args.texts, args.seed)]
+    factory = stub_anonymizer if args.ner == "stub" else None
+
+    results = {
+        "meta": {
+            "texts": len(texts), "batch_size": args.batch_size, "mode": args.mode, "backend": args.backend,
+            "ner": args.ner, "cores": cores, "python": platform.python_version(), "platform": platform.platform(),
+        },
+        "settings": [],
+    }
+    print(f"Núcleos: {cores}  |  textos: {len(texts)}  |  modo: {args.mode}  |  backend: {args.backend}")
+    print(f"{'réplicas':>9}{'threads':>9}{'textos/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for replicas, threads in candidate_settings(cores):
+        pool = InferencePool(replicas, threads, args.backend, args.mode, factory=factory)
+        try:
+            if pool.start() is None:
+                print("BERT LOCAL não disponível")
+                return
+            result = measure(pool, texts, args.batch_size)
+        finally:
+            pool.close()
+        result.update({"replicas": replicas, "threads": threads, "pinned": pool.pinned})
+        results["settings"].append(result)
+        latency = result["batch_latency_ms"]
+        print(f"{replicas:9}{threads:9}{result['texts_per_sec']:12,.1f}{latency['p50']:10.1f}{latency['p95']:10.1f}")
+
+    best = max(results["settings"], key=lambda setting: setting["texts_per_sec"])
+    results["best"] = {"replicas": best["replicas"], "threads": best["threads"]}
+    print(f"Melhor: --ner-replicas {best['replicas']} --ner-threads {best['threads']} "
+          f"({best['texts_per_sec']:,.1f} textos/s)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Resultados gravados em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Gerador determinístico (com semente) de conversas sintéticas em português no
+formato "[timestamp] sender: mensagem", para benchmarks do pipeline.
+
+As mensagens misturam conversa comum com nomes, apelidos, menções, CPFs,
+telefones, e-mails, chaves de API, trechos de código e colagens longas
+(logs), em proporções parecidas com as de um chat de equipe.
+
+Uso:
+    python benchmarks/synthetic_chat.py saida.txt [--lines 100000] [--seed 42]
+"""
+import argparse
+import random
+import string
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Iterator
+
+FIRST_NAMES = [
+    "Ana", "Beatriz", "Bruno", "Carla", "Daniel", "Eduardo", "Fernanda", "Gabriel", "Helena", "Igor",
+    "Juliana", "João", "Larissa", "Lucas", "Mariana", "Marcelo", "Natália", "Otávio", "Paula", "Pedro",
+    "Rafael", "Renata", "Sérgio", "Tatiana", "Thiago", "Vinícius",
+]
+SURNAMES = [
+    "Silva", "Souza", "Oliveira", "Santos", "Lima", "Carvalho", "Ferreira", "Almeida", "Ribeiro",
+    "Gomes", "Martins", "Rocha", "Barbosa", "Albuquerque",
+]
+NICKNAMES = ["Fofucho", "Coutinho", "Pereira", "Tatá", "Juju", "Binho", "Dudinha", "Netinho"]
+WHITELIST = ["jira", "github", "zoom", "figma", "overleaf", "slack"]
+DOMAINS = ["empresa.com.br", "gmail.com", "puc-rio.br", "hotmail.com", "exemplo.org"]
+
+CASUAL = [
+    "bom dia pessoal", "ok", "kkkkkkk", "valeu!", "beleza, combinado", "alguém viu a reunião de ontem?",
+    "vou subir o PR hoje à noite, depois eu aviso no canal", "tá no {tool}, dá uma olhada",
+    "to sem internet aqui, já volto", "alguém sabe se o deploy terminou?", "reunião em 5 min no {tool}",
+    "acho que o bug é no parser, vou investigar", "👍", "fechou", "pode ser amanhã às 14h?",
+    "abri uma issue no {tool} com os detalhes", "rsrs", "boa tarde!", "obrigado, gente",
+]
+TEMPLATES = [
+    (15, "falei com {name} sobre o contrato, {name2} vai revisar"),
+    (5, "{name} {surname} confirmou presença na apresentação"),
+    (8, "o {nick} vai estar na reunião?"),
+    (8, "@{mention} consegue olhar isso hoje?"),
+    (2, "meu cpf é {cpf}, pode cadastrar"),
+    (2, "me liga no {phone} depois do almoço"),
+    (4, "manda pro {email} por favor"),
+    (1, "token do ambiente de teste: {api_key}"),
+    (3, "olha esse trecho `{inline_code}` que quebrou"),
+    (1, "o bloco que roda é ```py {block_code} ```"),
+    (1, "log completo: {paste}"),
+    (50, "{casual}"),
+]
+INLINE_CODE = ["print(x)", "df.groupby('id').sum()", "git rebase -i HEAD~3", "npm run build", "SELECT * FROM users"]
+BLOCK_CODE = ["for i in range(3): print(i)", "def f(x): return x * 2", "import os; os.listdir('.')"]
+LOG_LINES = [
+    "Traceback (most recent call last):", "File \"/app/src/worker.py\", line 88, in run",
+    "ConnectionError: timeout after 30s", "INFO retrying request id={request_id}",
+    "WARNING queue size above threshold", "DEBUG payload={{'user': 'u{user_id}', 'status': 'ok'}}",
+]
+
+
+def _cpf(rng: random.Random) -> str:
+    digits = "".join(rng.choice(string.digits) for _ in range(11))
+    return f"{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}"
+
+
+def _phone(rng: random.Random) -> str:
+    number = f"{rng.randint(11, 99)}9{rng.randint(10_000_000, 99_999_999)}"
+    return rng.choice([number, f"+55{number}"])
+
+
+def _email(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES).lower()}.{rng.choice(SURNAMES).lower()}@{rng.choice(DOMAINS)}"
+
+
+def _api_key(rng: random.Random) -> str:
+    return "ghp_" + "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(36))
+
+
+def _paste(rng: random.Random) -> str:
+    lines = []
+    for _ in range(rng.randint(20, 120)):
+        line = rng.choice(LOG_LINES)
+        lines.append(line.format(request_id=rng.randint(1000, 9999), user_id=rng.randint(1, 500)))
+    return " | ".join(lines)
+
+
+def generate_lines(count: int, seed: int = 42, users: int = 50) -> Iterator[str]:
+    """
+    Gera count linhas de chat (sem "\\n"), sempre as mesmas para a mesma semente.
+
+    Args:
+        count: Número de linhas
+        seed: Semente do gerador
+        users: Número de participantes distintos
+    """
+    rng = random.Random(seed)
+    senders = [f"{rng.choice(FIRST_NAMES).lower()}{'.' + rng.choice(SURNAMES).lower() if i % 3 else ''}"
+               for i in range(users)]
+    # Poucos participantes concentram a maior parte das mensagens
+    sender_weights = list(accumulate(1 / (i + 1) for i in range(users)))
+    fields = {
+        "name": lambda: rng.choice(FIRST_NAMES),
+        "name2": lambda: rng.choice(FIRST_NAMES),
+        "surname": lambda: rng.choice(SURNAMES),
+        "nick": lambda: rng.choice(NICKNAMES),
+        "mention": lambda: rng.choice(senders),
+        "cpf": lambda: _cpf(rng),
+        "phone": lambda: _phone(rng),
+        "email": lambda: _email(rng),
+        "api_key": lambda: _api_key(rng),
+        "inline_code": lambda: rng.choice(INLINE_CODE),
+        "block_code": lambda: rng.choice(BLOCK_CODE),
+        "paste": lambda: _paste(rng),
+        "casual": lambda: rng.choice(CASUAL).format(tool=rng.choice(WHITELIST)),
+    }
+    # Apenas os campos usados por cada modelo são sorteados
+    templates = [(template, [name for _, name, _, _ in string.Formatter().parse(template) if name])
+                 for _, template in TEMPLATES]
+    weights = list(accumulate(weight for weight, _ in TEMPLATES))
+    moment = datetime(2025, 1, 6, 9, 0)
+
+    for _ in range(count):
+        moment += timedelta(seconds=rng.randint(0, 240))
+        template, names = rng.choices(templates, cum_weights=weights)[0]
+        message = template.format(**{name: fields[name]() for name in names})
+        sender = rng.choices(senders, cum_weights=sender_weights)[0]
+        yield f"[{moment:%d/%m/%Y %H:%M}] {sender}: {message}"
+
+
+def write_corpus(path: str, count: int, seed: int = 42) -> str:
+    """Grava o corpus sintético em path (em streaming, sem guardar as linhas em memória)"""
+    with open(path, "w", encoding="utf-8") as f:
+        for line in generate_lines(count, seed):
+            f.write(line + "\n")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output")
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    write_corpus(args.output, args.lines, args.seed)
+    print(f"{args.lines} linhas gravadas em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
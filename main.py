@@ -1,41 +1,175 @@
 import os
-import sys
-from src.pipeline import process_with_id, process_with_regex, process_with_apelidos, process_with_bert
+import json
+import argparse
+from src.pipeline import (process_with_id, process_with_regex, process_with_apelidos, process_with_bert, process_fused,
+                          process_annotated, STAGES)
+from src.pt_bert_local import (DEFAULT_BATCH_SIZE, BACKENDS, configure_ner_cache, get_ner_cache_stats,
+                               configure_ner_gate, get_ner_gate_stats, configure_ner_backend, get_ner_batch_stats,
+                               configure_ner_pool, configure_ner_packing, MAX_PACK_TOKENS)
+from src.inference_pool import POOL_MODES
+from src.pattern_registry import DEFAULT_BUDGET_MS, REGEX_AVAILABLE
+from src.regex_anon import configure_patterns, get_pattern_registry
+from src.metrics import MetricsRecorder, PROFILERS
+from src.records import (RECORD_FORMATS, RECORD_EXTENSIONS, PARQUET_AVAILABLE, comparison_paths,
+                         export_comparison)
+from src.parallel import DEFAULT_CHUNK_SIZE
+from src.async_pipeline import DEFAULT_QUEUE_SIZE, process_pipelined
 from src.whitelist import load_whitelist_from_file
-from src.utils import load_apelidos_from_file
+from src.utils import load_apelidos_from_file, get_cache_dir, COMPRESSIONS, ZSTD_AVAILABLE, compression, find_compressed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pipeline de anonimização de chats")
+    parser.add_argument("--example", action="store_true",
+                        help="Usa os dados de exemplo da pasta example/")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Etapas a executar, em ordem (padrão: {','.join(STAGES)}). "
+                             "Sem --fused, cada etapa lê a saída já gravada da etapa anterior")
+    parser.add_argument("--fused", action="store_true",
+                        help="Executa as 4 etapas em memória, sem gravar e reler arquivos intermediários")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Executa leitura, etapas, BERT e gravação ao mesmo tempo, ligados por filas limitadas")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Blocos guardados em cada fila do modo --pipelined")
+    parser.add_argument("--annotated", action="store_true",
+                        help="Todas as etapas analisam o texto original; os trechos detectados são "
+                             "resolvidos por prioridade e o resultado é montado uma única vez")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Processa apenas as mensagens novas desde a última execução e as anexa "
+                             "ao resultado final (checkpoint em result/checkpoint.json)")
+    parser.add_argument("--dump", default="",
+                        help="No modo --fused, etapas intermediárias a salvar em disco (ex.: id,regex,apelidos)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Número de mensagens por forward pass do BERT")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Número de processos para as etapas de regex e apelidos")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Número de mensagens enviadas a cada processo por vez")
+    parser.add_argument("--ner-cache", nargs="?", const="default", default=None,
+                        help="Persiste resultados do BERT em um banco SQLite local "
+                             "(padrão: ~/.cache/slack-detox/ner_cache.sqlite)")
+    parser.add_argument("--ner-backend", choices=BACKENDS, default="torch",
+                        help="Backend de inferência do BERT (onnx requer optimum[onnxruntime])")
+    parser.add_argument("--ner-replicas", type=int, default=1,
+                        help="Réplicas do modelo BERT rodando em paralelo (ver benchmarks/sweep_inference.py)")
+    parser.add_argument("--ner-threads", type=int,
+                        help="Threads intra-op por réplica (padrão: núcleos disponíveis / réplicas)")
+    parser.add_argument("--ner-pool-mode", choices=POOL_MODES, default="process",
+                        help="Réplicas em processos separados ou em threads do mesmo processo")
+    parser.add_argument("--ner-pack", nargs="?", type=int, const=MAX_PACK_TOKENS, metavar="TOKENS",
+                        help="Empacota mensagens consecutivas em uma única sequência do BERT, até TOKENS tokens "
+                             f"(padrão: {MAX_PACK_TOKENS})")
+    parser.add_argument("--regex-patterns", metavar="ARQUIVO",
+                        help="Padrões da etapa de regex em JSON {\"RÓTULO\": \"padrão\"}, em ordem de prioridade")
+    parser.add_argument("--regex-budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="Tempo máximo da varredura de regex por mensagem (0 = sem limite)")
+    parser.add_argument("--slack-export", metavar="PASTA",
+                        help="Anonimiza uma exportação do Slack (users.json + uma pasta por canal), "
+                             "gravando um arquivo por canal em result/slack/")
+    parser.add_argument("--serve", action="store_true",
+                        help="Inicia o servidor local de anonimização com o modelo carregado em memória")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço do servidor (--serve)")
+    parser.add_argument("--port", type=int, default=8765, help="Porta do servidor (--serve)")
+    parser.add_argument("--serve-root", metavar="PASTA",
+                        help="Pasta de onde o servidor aceita jobs com \"path\" (padrão: \"path\" desativado)")
+    parser.add_argument("--no-ner-gate", action="store_true",
+                        help="Envia todas as mensagens ao BERT, sem o filtro de mensagens sem nomes")
+    parser.add_argument("--ner-gate-lowercase", action="store_true",
+                        help="Pula no BERT mensagens sem letras maiúsculas (mais rápido, menor recall)")
+    parser.add_argument("--ner-lexicon",
+                        help="Arquivo com nomes conhecidos (um por linha) que sempre passam pelo BERT")
+    parser.add_argument("--format", choices=RECORD_FORMATS, default="text",
+                        help="Formato das saídas: text (.txt + _all.txt), jsonl ou parquet "
+                             "(registros com original e anonimizado juntos)")
+    parser.add_argument("--compress", choices=COMPRESSIONS,
+                        help="Grava os arquivos de resultado comprimidos (zst requer zstandard)")
+    parser.add_argument("--export-text", metavar="REGISTROS",
+                        help="Gera os arquivos .txt/_all.txt (comparação legível) a partir de um "
+                             "arquivo .jsonl/.parquet e sai")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Grava tempos, contagens e substituições por etapa em result/metrics.json "
+                             "e result/metrics.prom (textfile do Prometheus)")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILERS,
+                        help="Perfila cada etapa (padrão: cprofile) e grava o perfil em result/")
+    return parser.parse_args()
+
+def stage_input_exists(path, previous_stage):
+    """Verifica se a saída da etapa anterior existe antes de rodar uma etapa isolada"""
+    if os.path.exists(path):
+        return True
+    print(f"❌ Erro: Arquivo {path} não encontrado!")
+    print(f"💡 Execute antes a etapa '{previous_stage}' (ex.: --stages {previous_stage})")
+    return False
 
 def main():
-    # Detectar se é para usar os arquivos de exemplo ou da pasta data
-    use_example = len(sys.argv) > 1 and sys.argv[1] == "--example"
+    args = parse_args()
     
-    if use_example:
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    invalid = [stage for stage in stages if stage not in STAGES]
+    if invalid or not stages:
+        print(f"❌ Erro: Etapas inválidas em --stages: {', '.join(invalid) or '(nenhuma)'}")
+        print(f"💡 Etapas disponíveis: {', '.join(STAGES)}")
+        return
+    
+    # Detectar se é para usar os arquivos de exemplo ou da pasta data
+    if args.example:
         print("🧪 Usando dados de exemplo...")
         base_path = "example"
     else:
         print("📁 Usando dados da pasta data...")
         base_path = "data"
     
+    if args.export_text:
+        clean_file, all_file = comparison_paths(args.export_text)
+        count = export_comparison(args.export_text, clean_file, all_file)
+        print(f"✅ {count} mensagens exportadas de {args.export_text}:")
+        print(f"   - {clean_file}")
+        print(f"   - {all_file}")
+        return
+    
+    if args.format == "parquet" and not PARQUET_AVAILABLE:
+        print("❌ Erro: --format parquet requer pyarrow. Execute: pip install pyarrow")
+        return
+    if args.format == "parquet" and args.incremental:
+        print("❌ Erro: o modo --incremental anexa ao resultado; use --format jsonl ou text")
+        return
+    if args.compress and args.format == "parquet":
+        print("❌ Erro: arquivos Parquet já são comprimidos; --compress vale para text e jsonl")
+        return
+    if args.compress == "zst" and not ZSTD_AVAILABLE:
+        print("❌ Erro: --compress zst requer zstandard. Execute: pip install zstandard")
+        return
+    if args.slack_export and args.workers > 1 and (args.ner_replicas > 1 or args.ner_threads) and "bert" in stages:
+        # Cada worker processa canais com o seu próprio modelo; réplicas dentro de workers não são suportadas
+        print("❌ Erro: --ner-replicas/--ner-threads não funcionam com --slack-export e --workers > 1")
+        print("💡 Use --workers para paralelizar os canais ou --ner-replicas para o modelo, não os dois")
+        return
+    
     # Criar diretórios se não existirem
     os.makedirs(f"{base_path}/result", exist_ok=True)
     
     # Arquivos de entrada e saída
-    input_file = f"{base_path}/data/chat_original.txt"
+    # A entrada pode vir comprimida (chat_original.txt.gz, .bz2, .xz, .zst)
+    input_file = find_compressed(f"{base_path}/data/chat_original.txt")
+    suffix = f".{args.compress}" if args.compress else ""
+    
+    def stage_outputs(name):
+        """Arquivos (limpo, completo) de uma etapa; em jsonl/parquet ambos são o mesmo arquivo de registros"""
+        if args.format == "text":
+            return f"{base_path}/result/{name}.txt{suffix}", f"{base_path}/result/{name}_all.txt{suffix}"
+        records = f"{base_path}/result/{name}{RECORD_EXTENSIONS[args.format]}{suffix}"
+        return records, records
     
     # Etapa 1: Processamento com ID
-    id_clean = f"{base_path}/result/id_anon.txt"
-    id_all = f"{base_path}/result/id_anon_all.txt"
+    id_clean, id_all = stage_outputs("id_anon")
     
     # Etapa 2: Processamento com Regex
-    regex_clean = f"{base_path}/result/pre_processado.txt"
-    regex_all = f"{base_path}/result/pre_processado_all.txt"
+    regex_clean, regex_all = stage_outputs("pre_processado")
     
     # Etapa 3: Processamento com Apelidos
-    apelidos_clean = f"{base_path}/result/apelidos_anon.txt"
-    apelidos_all = f"{base_path}/result/apelidos_anon_all.txt"
+    apelidos_clean, apelidos_all = stage_outputs("apelidos_anon")
     
     # Etapa 4: Processamento com BERT (resultado final)
-    bert_clean = f"{base_path}/result/result_final.txt"
-    bert_all = f"{base_path}/result/result_final_all.txt"
+    bert_clean, bert_all = stage_outputs("result_final")
     
     # Carregar listas dos arquivos
     apelidos_lista = load_apelidos_from_file(f"{base_path}/data/apelidos_lista.txt")
@@ -46,68 +180,404 @@ def main():
     print(f"🛡️  Palavras protegidas: {', '.join(whitelist) if whitelist else 'Nenhuma'}")
     print("=" * 60)
     
+    if args.ner_cache:
+        cache_path = args.ner_cache
+        if cache_path == "default":
+            cache_path = os.path.join(get_cache_dir(), "ner_cache.sqlite")
+        configure_ner_cache(cache_path)
+        print(f"🗃️  Cache NER em disco: {cache_path}")
+    
+    configure_ner_backend(args.ner_backend)
+    if args.ner_replicas > 1 or args.ner_threads:
+        try:
+            configure_ner_pool(args.ner_replicas, args.ner_threads, args.ner_pool_mode)
+        except ValueError as e:
+            print(f"❌ Erro: {e}")
+            return
+    if args.ner_pack is not None:
+        try:
+            configure_ner_packing(args.ner_pack)
+        except ValueError as e:
+            print(f"❌ Erro: {e}")
+            return
+    configure_ner_gate(
+        lexicon=load_apelidos_from_file(args.ner_lexicon) if args.ner_lexicon else None,
+        skip_lowercase=args.ner_gate_lowercase,
+        enabled=not args.no_ner_gate,
+    )
+    
+    try:
+        configure_patterns(args.regex_patterns, args.regex_budget_ms or None)
+    except (OSError, ValueError) as e:
+        print(f"❌ Erro nos padrões de regex: {e}")
+        return
+    if args.regex_budget_ms and not REGEX_AVAILABLE:
+        print("⚠️  Módulo regex não instalado: o orçamento de tempo do regex será apenas medido")
+    
+    try:
+        metrics = MetricsRecorder(enabled=args.metrics, profile=args.profile, profile_dir=f"{base_path}/result")
+    except ValueError as e:
+        print(f"❌ Erro: {e}")
+        return
+    
+    if args.serve:
+        from src.server import serve
+        serve(args.host, args.port, apelidos_lista, whitelist, args.batch_size, args.serve_root)
+        return
+    
+    if args.slack_export:
+        run_slack_export(args, apelidos_lista, whitelist, f"{base_path}/result/slack", stages, metrics)
+        write_metrics(metrics, base_path)
+        return
+    
     # Verificar se o arquivo de entrada existe
     if not os.path.exists(input_file):
         print(f"❌ Erro: Arquivo {input_file} não encontrado!")
         print("💡 Uso:")
         print("   python main.py                    # Usa dados da pasta data/")
         print("   python main.py --example          # Usa dados de exemplo")
+        print("   python main.py --fused            # Executa as 4 etapas em memória")
+        print("   python main.py --incremental      # Processa apenas as mensagens novas")
+        return
+    
+    if args.incremental:
+        if args.compress or compression(input_file):
+            # O checkpoint guarda posições em bytes da entrada e trunca o resultado ao retomar
+            print("❌ Erro: o modo --incremental não funciona com arquivos comprimidos")
+            return
+        run_incremental(args, input_file, apelidos_lista, whitelist, bert_clean, bert_all,
+                        f"{base_path}/result/checkpoint.json", stages, metrics)
+        write_metrics(metrics, base_path)
+        return
+    
+    if args.annotated:
+        run_annotated(args, input_file, apelidos_lista, whitelist, bert_clean, bert_all, stages, metrics)
+        write_metrics(metrics, base_path)
+        return
+    
+    if args.pipelined:
+        run_pipelined(args, input_file, apelidos_lista, whitelist, bert_clean, bert_all, stages, metrics)
+        write_metrics(metrics, base_path)
+        return
+    
+    if args.fused:
+        run_fused(args, input_file, apelidos_lista, whitelist, {
+            "id": (id_clean, id_all),
+            "regex": (regex_clean, regex_all),
+            "apelidos": (apelidos_clean, apelidos_all),
+        }, bert_clean, bert_all, stages, metrics)
+        write_metrics(metrics, base_path)
         return
     
     # Etapa 1: Processamento com ID
-    print(f"📁 Etapa 1: {input_file} -> {id_clean} + {id_all}")
-    process_with_id(input_file, id_clean, id_all, whitelist)
-    print(f"✅ Etapa 1 concluída! Arquivos gerados:")
-    print(f"   - {id_clean}")
-    print(f"   - {id_all}")
-    print("=" * 60)
+    if "id" in stages:
+        print(f"📁 Etapa 1: {input_file} -> {id_clean} + {id_all}")
+        with metrics.stage("id"):
+            process_with_id(input_file, id_clean, id_all, whitelist)
+        print(f"✅ Etapa 1 concluída! Arquivos gerados:")
+        print_outputs(id_clean, id_all)
+        print_stage_metrics(metrics, "id")
+        print("=" * 60)
     
     # Etapa 2: Processamento com Regex
-    print(f"📁 Etapa 2: {id_clean} -> {regex_clean} + {regex_all}")
-    process_with_regex(id_clean, regex_clean, regex_all, whitelist)
-    print(f"✅ Etapa 2 concluída! Arquivos gerados:")
-    print(f"   - {regex_clean}")
-    print(f"   - {regex_all}")
-    print("=" * 60)
+    if "regex" in stages:
+        if not stage_input_exists(id_clean, "id"):
+            return
+        print(f"📁 Etapa 2: {id_clean} -> {regex_clean} + {regex_all}")
+        with metrics.stage("regex") as stage_metrics:
+            process_with_regex(id_clean, regex_clean, regex_all, whitelist, args.workers, args.chunk_size)
+        record_regex_metrics(stage_metrics)
+        print(f"✅ Etapa 2 concluída! Arquivos gerados:")
+        print_outputs(regex_clean, regex_all)
+        print_regex_stats()
+        print_stage_metrics(metrics, "regex")
+        print("=" * 60)
     
     # Etapa 3: Processamento com Apelidos
-    print(f"📁 Etapa 3: {regex_clean} -> {apelidos_clean} + {apelidos_all}")
-    process_with_apelidos(regex_clean, apelidos_clean, apelidos_all, apelidos_lista, whitelist)
-    print(f"✅ Etapa 3 concluída! Arquivos gerados:")
-    print(f"   - {apelidos_clean}")
-    print(f"   - {apelidos_all}")
-    print("=" * 60)
+    if "apelidos" in stages:
+        if not stage_input_exists(regex_clean, "regex"):
+            return
+        print(f"📁 Etapa 3: {regex_clean} -> {apelidos_clean} + {apelidos_all}")
+        with metrics.stage("apelidos"):
+            process_with_apelidos(regex_clean, apelidos_clean, apelidos_all, apelidos_lista, whitelist,
+                                  args.workers, args.chunk_size)
+        print(f"✅ Etapa 3 concluída! Arquivos gerados:")
+        print_outputs(apelidos_clean, apelidos_all)
+        print_stage_metrics(metrics, "apelidos")
+        print("=" * 60)
     
     # Etapa 4: Processamento com BERT LOCAL
-    print(f"📁 Etapa 4: {apelidos_clean} -> {bert_clean} + {bert_all}")
-    bert_success = process_with_bert(apelidos_clean, bert_clean, bert_all, whitelist)
+    bert_success = False
+    if "bert" in stages:
+        if not stage_input_exists(apelidos_clean, "apelidos"):
+            return
+        print(f"📁 Etapa 4: {apelidos_clean} -> {bert_clean} + {bert_all}")
+        with metrics.stage("bert") as stage_metrics:
+            bert_success = process_with_bert(apelidos_clean, bert_clean, bert_all, whitelist, args.batch_size)
+        record_ner_metrics(stage_metrics)
+        
+        if bert_success:
+            print(f"✅ Etapa 4 concluída! Arquivos gerados:")
+            print_outputs(bert_clean, bert_all)
+            print_ner_stats()
+            print_stage_metrics(metrics, "bert")
+        else:
+            print("⚠️  Etapa 4 pulada (BERT LOCAL não disponível)")
+        
+        print("=" * 60)
+    
+    print("🎉 Pipeline de anonimização finalizado com sucesso!")
+    print("\n📊 Resumo dos arquivos gerados:")
+    if "id" in stages:
+        print_summary("🆔", id_clean, "Mensagens anonimizadas por ID", id_all, "Formato completo com ID")
+    if "regex" in stages:
+        print_summary("🔧", regex_clean, "Mensagens anonimizadas por regex",
+                      regex_all, "Formato completo com regex")
+    if "apelidos" in stages:
+        print_summary("😎", apelidos_clean, "Mensagens com apelidos substituídos",
+                      apelidos_all, "Formato completo com apelidos")
     
     if bert_success:
-        print(f"✅ Etapa 4 concluída! Arquivos gerados:")
-        print(f"   - {bert_clean}")
-        print(f"   - {bert_all}")
-    else:
-        print("⚠️  Etapa 4 pulada (BERT LOCAL não disponível)")
+        print_summary("🎯", bert_clean, "Resultado final da anonimização ⭐", bert_all, "Formato completo final")
+    elif "bert" in stages:
+        print("   ⚠️  Arquivos finais não gerados (dependências BERT não disponíveis)")
+    
+    write_metrics(metrics, base_path)
     
+    print("\n💡 Dica: Para testar com dados de exemplo, use:")
+    print("   python main.py --example")
+
+def print_summary(icon, clean_file, clean_description, all_file, all_description):
+    """Linha do resumo final para os arquivos limpo e completo de uma etapa (um só em jsonl/parquet)"""
+    print(f"   {icon} {clean_file} - {clean_description}")
+    if all_file != clean_file:
+        print(f"   {icon} {all_file} - {all_description}")
+
+def print_outputs(*paths):
+    """Lista os arquivos gerados por uma etapa (sem repetir o arquivo de registros)"""
+    for path in dict.fromkeys(paths):
+        print(f"   - {path}")
+
+def print_stage_metrics(metrics, stage):
+    """Mostra o resumo de tempo e substituições de uma etapa (com --metrics)"""
+    summary = metrics.summary(stage)
+    if summary:
+        print(summary)
+
+def record_ner_metrics(stage_metrics):
+    """Acrescenta às métricas da etapa BERT os contadores de cache, filtro e lotes"""
+    if stage_metrics is None:
+        return
+    cache_stats = get_ner_cache_stats()
+    gate_stats = get_ner_gate_stats()
+    batch_stats = get_ner_batch_stats()
+    stage_metrics.extra.update({
+        "cache_hits": cache_stats["hits"],
+        "cache_disk_hits": cache_stats["disk_hits"],
+        "cache_misses": cache_stats["misses"],
+        "cache_hit_ratio": cache_stats["hit_ratio"],
+        "gate_checked": gate_stats["checked"],
+        "gate_skipped": gate_stats["skipped"],
+        "batches": batch_stats["batches"],
+        "mean_batch_size": batch_stats["mean_batch_size"],
+        "batch_sizes": batch_stats["batch_sizes"],
+        "messages_per_sequence": batch_stats["messages_per_sequence"],
+    })
+
+def write_metrics(metrics, base_path):
+    """Grava o relatório de métricas (JSON + Prometheus) e lista os perfis gerados"""
+    if metrics.enabled and metrics.stages:
+        json_path = f"{base_path}/result/metrics.json"
+        prom_path = f"{base_path}/result/metrics.prom"
+        metrics.write_json(json_path)
+        metrics.write_prometheus(prom_path)
+        print(f"   📈 {json_path} - Métricas por etapa")
+        print(f"   📈 {prom_path} - Métricas no formato do Prometheus")
+    report = get_pattern_registry().report()
+    if metrics.enabled and report["messages"]:
+        report_path = f"{base_path}/result/regex_report.json"
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"   🔎 {report_path} - Custo por padrão e mensagens mais lentas do regex")
+    for stage in metrics.stages.values():
+        if stage.profile_file:
+            print(f"   🔬 {stage.profile_file} - Perfil da etapa {stage.name}")
+
+def record_regex_metrics(stage_metrics):
+    """Acrescenta às métricas da etapa de regex os contadores de orçamento de tempo"""
+    report = get_pattern_registry().report()
+    if stage_metrics is None or not report["messages"]:
+        return
+    stage_metrics.extra.update({
+        "regex_over_budget": report["over_budget"],
+        "regex_fallbacks": report["fallbacks"],
+        "regex_timeouts": report["timeouts"],
+    })
+
+def print_regex_stats():
+    """Mostra o custo dos padrões de regex e as mensagens acima do orçamento"""
+    report = get_pattern_registry().report()
+    if not report["messages"]:
+        return
+    line = (f"🔎 Regex: {report['messages']} mensagens em {report['seconds']:.2f}s, "
+            f"{report['over_budget']} acima do orçamento, {report['timeouts']} removidas por tempo")
+    label, costliest = max(report["patterns"].items(), key=lambda item: item[1]["mean_us"])
+    if costliest["mean_us"]:
+        line += f" - padrão mais caro: {label} ({costliest['mean_us']:.1f} µs/mensagem)"
+    print(line)
+
+def print_ner_stats():
+    """Mostra as estatísticas do filtro e do cache NER"""
+    gate_stats = get_ner_gate_stats()
+    if gate_stats["checked"]:
+        reasons = ", ".join(f"{reason}: {count}" for reason, count in gate_stats["by_reason"].items())
+        print(f"🚦 Filtro NER: {gate_stats['skipped']} de {gate_stats['checked']} mensagens puladas "
+              f"({gate_stats['skip_ratio']:.0%}){f' - {reasons}' if reasons else ''}")
+    stats = get_ner_cache_stats()
+    if stats["hits"] or stats["misses"]:
+        print(f"🗃️  Cache NER: {stats['hits']} acertos ({stats['disk_hits']} do disco), "
+              f"{stats['misses']} falhas ({stats['hit_ratio']:.0%} de acerto)")
+
+def run_fused(args, input_file, apelidos_lista, whitelist, stage_files, bert_clean, bert_all, stages, metrics):
+    """Executa o pipeline em memória, salvando apenas as etapas pedidas em --dump"""
+    requested = [stage.strip() for stage in args.dump.split(",") if stage.strip()]
+    invalid = [stage for stage in requested if stage not in stage_files]
+    if invalid:
+        print(f"❌ Erro: Etapas inválidas em --dump: {', '.join(invalid)}")
+        print(f"💡 Etapas disponíveis: {', '.join(stage_files)}")
+        return
+    dumps = {stage: stage_files[stage] for stage in requested}
+    
+    print(f"📁 Pipeline em memória: {input_file} -> {bert_clean} + {bert_all}")
+    # As etapas são intercaladas mensagem a mensagem, então são medidas em conjunto
+    with metrics.stage("fused") as stage_metrics:
+        bert_success = process_fused(input_file, bert_clean, bert_all, apelidos_lista, whitelist, dumps,
+                                     batch_size=args.batch_size, workers=args.workers,
+                                     worker_chunk_size=args.chunk_size, stages=stages)
+    if "bert" in stages:
+        record_ner_metrics(stage_metrics)
+    print_stage_metrics(metrics, "fused")
+    
+    print_regex_stats()
+    if bert_success:
+        print_ner_stats()
+    elif "bert" in stages:
+        print("⚠️  Etapa 4 pulada (BERT LOCAL não disponível)")
     print("=" * 60)
     
     print("🎉 Pipeline de anonimização finalizado com sucesso!")
     print("\n📊 Resumo dos arquivos gerados:")
-    print(f"   🆔 {id_clean} - Mensagens anonimizadas por ID")
-    print(f"   🆔 {id_all} - Formato completo com ID")
-    print(f"   🔧 {regex_clean} - Mensagens anonimizadas por regex")
-    print(f"   🔧 {regex_all} - Formato completo com regex")
-    print(f"   😎 {apelidos_clean} - Mensagens com apelidos substituídos")
-    print(f"   😎 {apelidos_all} - Formato completo com apelidos")
+    for stage in STAGES:
+        if stage in dumps:
+            stage_clean, stage_all = dumps[stage]
+            print_summary("📄", stage_clean, f"Etapa {stage}", stage_all, f"Formato completo da etapa {stage}")
+    print_summary("🎯", bert_clean, "Resultado final da anonimização ⭐", bert_all, "Formato completo final")
+
+def run_pipelined(args, input_file, apelidos_lista, whitelist, bert_clean, bert_all, stages, metrics):
+    """Executa as etapas como estágios concorrentes ligados por filas"""
+    print(f"📁 Pipeline em estágios concorrentes: {input_file} -> {bert_clean} + {bert_all}")
+    with metrics.stage("pipelined") as stage_metrics:
+        result = process_pipelined(input_file, bert_clean, bert_all, apelidos_lista, whitelist,
+                                   batch_size=args.batch_size, workers=args.workers,
+                                   queue_size=args.queue_size, stages=stages)
+    if stage_metrics is not None:
+        stage_metrics.extra.update({f"busy_{stage}_seconds": seconds
+                                    for stage, seconds in result["stage_seconds"].items()})
+        if "bert" in stages:
+            record_ner_metrics(stage_metrics)
+    print_stage_metrics(metrics, "pipelined")
+    
+    busy = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["stage_seconds"].items())
+    print(f"⏳ Tempo ocupado por estágio: {busy}")
+    print_regex_stats()
+    if result["bert_success"]:
+        print_ner_stats()
+    elif "bert" in stages:
+        print("⚠️  Etapa 4 pulada (BERT LOCAL não disponível)")
+    print("=" * 60)
+    
+    print("🎉 Pipeline de anonimização finalizado com sucesso!")
+    print_summary("🎯", bert_clean, "Resultado final da anonimização ⭐", bert_all, "Formato completo final")
+
+def run_annotated(args, input_file, apelidos_lista, whitelist, bert_clean, bert_all, stages, metrics):
+    """Executa o pipeline por anotações sobre o texto original"""
+    print(f"📁 Pipeline por anotações: {input_file} -> {bert_clean} + {bert_all}")
+    with metrics.stage("annotated") as stage_metrics:
+        bert_success = process_annotated(input_file, bert_clean, bert_all, apelidos_lista, whitelist,
+                                         batch_size=args.batch_size, stages=stages)
+    if "bert" in stages:
+        record_ner_metrics(stage_metrics)
+    print_stage_metrics(metrics, "annotated")
     
+    print_regex_stats()
     if bert_success:
-        print(f"   🎯 {bert_clean} - Resultado final da anonimização ⭐")
-        print(f"   🎯 {bert_all} - Formato completo final")
-    else:
-        print("   ⚠️  Arquivos finais não gerados (dependências BERT não disponíveis)")
+        print_ner_stats()
+    elif "bert" in stages:
+        print("⚠️  Etapa 4 pulada (BERT LOCAL não disponível)")
+    print("=" * 60)
     
-    print("\n💡 Dica: Para testar com dados de exemplo, use:")
-    print("   python main.py --example")
+    print("🎉 Pipeline de anonimização finalizado com sucesso!")
+    print_summary("🎯", bert_clean, "Resultado final da anonimização ⭐", bert_all, "Formato completo final")
+
+def run_incremental(args, input_file, apelidos_lista, whitelist, bert_clean, bert_all, checkpoint_file, stages,
+                    metrics):
+    """Processa apenas o trecho novo da entrada, anexando ao resultado final"""
+    from src.incremental import process_incremental
+    
+    print(f"📁 Pipeline incremental: {input_file} -> {bert_clean} + {bert_all}")
+    with metrics.stage("incremental") as stage_metrics:
+        result = process_incremental(input_file, bert_clean, bert_all, apelidos_lista, whitelist, checkpoint_file,
+                                     batch_size=args.batch_size, workers=args.workers,
+                                     worker_chunk_size=args.chunk_size, stages=stages)
+    if stage_metrics is not None:
+        stage_metrics.messages = result["messages"]
+        if "bert" in stages:
+            record_ner_metrics(stage_metrics)
+    print_stage_metrics(metrics, "incremental")
+    
+    if result["full"]:
+        print("🔄 Checkpoint ausente ou desatualizado: entrada reprocessada do início")
+    print_regex_stats()
+    if result["bert_success"]:
+        print_ner_stats()
+    elif "bert" in stages:
+        print("⚠️  Etapa 4 pulada (BERT LOCAL não disponível)")
+    print("=" * 60)
+    
+    if not result["saved"]:
+        print("❌ Etapa 4 não executada: resultado e checkpoint não foram atualizados")
+        print("💡 Instale as dependências do BERT ou rode com --stages id,regex,apelidos")
+        return
+    print(f"✅ {result['messages']} mensagens novas processadas (offset {result['offset']} bytes)")
+    print_summary("🎯", bert_clean, "Resultado final da anonimização ⭐", bert_all, "Formato completo final")
+    print(f"   💾 {checkpoint_file} - Checkpoint e mapeamentos de IDs")
+
+def run_slack_export(args, apelidos_lista, whitelist, output_dir, stages, metrics):
+    """Anonimiza uma exportação do Slack, um arquivo de saída por canal"""
+    from src.slack_export import channel_outputs, process_slack_export
+    
+    if not os.path.isdir(args.slack_export):
+        print(f"❌ Erro: Pasta {args.slack_export} não encontrada!")
+        return
+    
+    print(f"📁 Exportação do Slack: {args.slack_export} -> {output_dir}/")
+    # Os canais são processados juntos (e em paralelo com --workers), então são medidos em conjunto
+    with metrics.stage("slack") as stage_metrics:
+        result = process_slack_export(args.slack_export, output_dir, apelidos_lista, whitelist, args.format,
+                                      workers=args.workers, batch_size=args.batch_size, stages=stages,
+                                      compression=args.compress)
+    if stage_metrics is not None:
+        stage_metrics.messages = sum(result["channels"].values())
+    print_stage_metrics(metrics, "slack")
+    
+    if not result["bert_success"] and "bert" in stages:
+        print("⚠️  Etapa 4 pulada (BERT LOCAL não disponível)")
+    print("=" * 60)
+    
+    print(f"🎉 {len(result['channels'])} canais anonimizados:")
+    for channel, count in result["channels"].items():
+        channel_clean, channel_all = channel_outputs(output_dir, channel, args.format, args.compress)
+        print_summary("💬", channel_clean, f"{count} mensagens", channel_all, "Formato completo")
 
 if __name__ == "__main__":
     main()
@@ -1,30 +1,131 @@
+import hashlib
+import os
 import re
-from typing import List
+from functools import lru_cache
+from typing import List, Optional, Union
 from .chat_message import ChatMessage
+from .metrics import count_replacement
+from .spans import Annotation
+from .utils import get_cache_dir
+from .whitelist import protected_spans, is_protected
 
-def anonimizar_apelidos(texto: str, apelidos: List[str]) -> str:
-    """Anonimiza apelidos em um texto"""
+def _build_trie(apelidos: List[str]) -> dict:
+    """Monta uma trie (em minúsculas) com todos os apelidos"""
+    root = {}
     for apelido in apelidos:
-        texto = re.sub(rf"\b{re.escape(apelido)}\b", "[PESSOA]", texto, flags=re.IGNORECASE)
-    return texto
+        node = root
+        for char in apelido.lower():
+            node = node.setdefault(char, {})
+        node[""] = True  # Marca fim de apelido
+    return root
 
-def anonimizar_apelidos_chat_message(msg: ChatMessage, apelidos: List[str]) -> ChatMessage:
-    """Anonimiza apelidos em uma mensagem estruturada"""
+def _trie_to_pattern(node: dict) -> str:
+    """
+    Converte a trie em uma expressão regular equivalente à alternância de todos
+    os apelidos. Prefixos comuns são compartilhados, então o custo de casamento
+    depende do tamanho da mensagem, não do número de apelidos.
+    """
+    branches = [re.escape(char) + _trie_to_pattern(child)
+                for char, child in sorted(node.items()) if char != ""]
+    if not branches:
+        return ""
+    
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # Apelido termina aqui, mas pode continuar (o mais longo é tentado primeiro)
+        body = ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+    return body
+
+def build_apelidos_pattern(apelidos: List[str], use_cache: bool = True) -> str:
+    """
+    Gera o padrão único (com limites de palavra) para a lista de apelidos.
+    O padrão é guardado em cache no disco, indexado pelo conteúdo da lista,
+    para não reconstruir a trie a cada execução.
+    """
+    normalized = sorted({apelido.lower() for apelido in apelidos if apelido})
+    digest = hashlib.sha256("\n".join(normalized).encode("utf-8")).hexdigest()[:16]
+    
+    cache_file = None
+    if use_cache:
+        try:
+            cache_file = os.path.join(get_cache_dir("apelidos"), f"{digest}.pattern")
+            if os.path.exists(cache_file):
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    return f.read()
+        except OSError:
+            cache_file = None
+    
+    pattern = rf"\b(?:{_trie_to_pattern(_build_trie(normalized))})\b"
+    
+    if cache_file:
+        try:
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(pattern)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+    return pattern
+
+@lru_cache(maxsize=8)
+def _compile_apelidos(apelidos: tuple) -> "re.Pattern":
+    return re.compile(build_apelidos_pattern(list(apelidos)), flags=re.IGNORECASE)
+
+def compile_apelidos(apelidos: Union[List[str], "re.Pattern", None]) -> Optional["re.Pattern"]:
+    """
+    Compila a lista de apelidos em um único matcher (uma vez por lista).
+    Aceita também um matcher já compilado, que é devolvido sem alteração.
+    """
+    if isinstance(apelidos, re.Pattern):
+        return apelidos
+    if not apelidos:
+        return None
+    return _compile_apelidos(tuple(apelidos))
+
+def apelidos_spans(texto: str, apelidos: Union[List[str], "re.Pattern"], whitelist=None) -> List[Annotation]:
+    """Trechos (start, end, "[PESSOA]") com apelidos da lista, respeitando a whitelist"""
+    matcher = compile_apelidos(apelidos)
+    if matcher is None:
+        return []
+    
+    spans = protected_spans(texto, whitelist)
+    return [
+        (m.start(), m.end(), "[PESSOA]")
+        for m in matcher.finditer(texto)
+        if not (spans and is_protected(spans, m.start(), m.end()))
+    ]
+
+def anonimizar_apelidos(texto: str, apelidos: Union[List[str], "re.Pattern"], whitelist=None) -> str:
+    """Anonimiza apelidos em um texto, em uma única passada, respeitando a whitelist"""
+    matcher = compile_apelidos(apelidos)
+    if matcher is None:
+        return texto
+    
+    spans = protected_spans(texto, whitelist)
+    if not spans:
+        texto, count = matcher.subn("[PESSOA]", texto)
+        count_replacement("[PESSOA]", count)
+        return texto
+    
+    def repl(m):
+        if is_protected(spans, m.start(), m.end()):
+            return m.group(0)
+        count_replacement("[PESSOA]")
+        return "[PESSOA]"
+    return matcher.sub(repl, texto)
+
+def anonimizar_apelidos_chat_message(msg: ChatMessage, apelidos: Union[List[str], "re.Pattern"],
+                                     whitelist=None, inplace: bool = False) -> ChatMessage:
+    """Anonimiza apelidos em uma mensagem estruturada (inplace=True altera msg em vez de copiar)"""
     # Anonimiza apelidos no sender
-    anonymized_sender = anonimizar_apelidos(msg.sender, apelidos)
+    anonymized_sender = anonimizar_apelidos(msg.sender, apelidos, whitelist)
     
     # Anonimiza apelidos no conteúdo da mensagem
-    anonymized_message = anonimizar_apelidos(msg.message, apelidos)
+    anonymized_message = anonimizar_apelidos(msg.message, apelidos, whitelist)
     
-    return ChatMessage(
-        timestamp=msg.timestamp,
-        sender=anonymized_sender,
-        message=anonymized_message,
-        original_sender=msg.original_sender if hasattr(msg, 'original_sender') else msg.sender,
-        original_message=msg.original_message if hasattr(msg, 'original_message') else msg.message
-    )
+    return msg.update(sender=anonymized_sender, message=anonymized_message, inplace=inplace)
 
-def anonimizar_apelidos_messages(messages: list, apelidos: List[str]) -> list:
+def anonimizar_apelidos_messages(messages: list, apelidos: Union[List[str], "re.Pattern"]) -> list:
     """Anonimiza apelidos em uma lista de mensagens"""
     result = []
     
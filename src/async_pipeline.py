@@ -0,0 +1,201 @@
+"""
+Pipeline em estágios concorrentes (asyncio): leitura, IDs, regex, apelidos,
+NER em lotes e gravação rodam ao mesmo tempo, ligados por filas limitadas.
+Cada estágio processa um bloco de mensagens em seu próprio executor
+(thread ou, para regex e apelidos com workers > 1, o pool de processos),
+então o tempo total tende ao do estágio mais lento em vez da soma de todos.
+As filas limitadas seguram o leitor quando um estágio adiante está atrasado,
+e a memória fica limitada a alguns blocos por estágio.
+"""
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List
+
+from .apelidos import anonimizar_apelidos_chat_message, compile_apelidos
+from .id_anon import anonymize_chat_message_id
+from .metrics import count_messages
+from .parallel import call_in_worker, get_process_pool, merge_worker_stats
+from .pipeline import BERT_CHUNK_SIZE, STAGES, bert_ready
+from .pt_bert_local import DEFAULT_BATCH_SIZE, anonymize_chat_messages_bert
+from .records import open_message_writer, read_messages
+from .regex_anon import anonymize_chat_message
+from .utils import chunked
+from .whitelist import compile_whitelist
+
+# Número de blocos que cada fila guarda antes de segurar o estágio anterior
+DEFAULT_QUEUE_SIZE = 4
+
+# Marca de fim de fluxo passada de estágio em estágio
+_END = object()
+
+
+def _map_chunk(func, args: tuple, chunk: list) -> list:
+    """Aplica func(mensagem, *args) a cada mensagem do bloco (serializável, para o pool de processos)"""
+    return [func(message, *args) for message in chunk]
+
+
+def _timed(func, stage: str, timings: Dict[str, float]):
+    """Envolve func somando em timings[stage] o tempo gasto (no estágio, não na fila)"""
+    def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+async def _read(read_chunk, outbox: asyncio.Queue, executor):
+    """Estágio de leitura: lê um bloco por vez no executor (o disco não bloqueia o laço)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(executor, read_chunk)
+        if chunk is None:
+            break
+        await outbox.put(chunk)
+    await outbox.put(_END)
+
+
+def _chunk_result(result, in_worker: bool):
+    """Resultado de um bloco; do pool de processos vem com as estatísticas do worker, somadas aqui"""
+    if not in_worker:
+        return result
+    result, stats = result
+    merge_worker_stats(stats)
+    return result
+
+
+async def _process(func, inbox: asyncio.Queue, outbox: asyncio.Queue, executor, concurrency: int = 1):
+    """
+    Estágio de processamento: aplica func a cada bloco no executor, com até
+    concurrency blocos em andamento, repassando os resultados na ordem de chegada.
+    """
+    loop = asyncio.get_running_loop()
+    in_worker = isinstance(executor, ProcessPoolExecutor)
+    pending = deque()
+    while True:
+        chunk = await inbox.get()
+        if chunk is _END:
+            break
+        if in_worker:
+            pending.append(loop.run_in_executor(executor, call_in_worker, func, chunk))
+        else:
+            pending.append(loop.run_in_executor(executor, func, chunk))
+        if len(pending) >= concurrency:
+            await outbox.put(_chunk_result(await pending.popleft(), in_worker))
+    while pending:
+        await outbox.put(_chunk_result(await pending.popleft(), in_worker))
+    await outbox.put(_END)
+
+
+async def _write(write_chunk, inbox: asyncio.Queue, executor) -> int:
+    """Estágio de gravação: grava cada bloco no executor"""
+    loop = asyncio.get_running_loop()
+    count = 0
+    while True:
+        chunk = await inbox.get()
+        if chunk is _END:
+            return count
+        await loop.run_in_executor(executor, write_chunk, chunk)
+        count += len(chunk)
+
+
+def _write_chunk(writer, chunk: list):
+    for message in chunk:
+        writer.write(message)
+    count_messages(len(chunk))
+
+
+async def _run(read_chunk, write_chunk, stage_funcs: list, executors: dict, queue_size: int) -> int:
+    """Liga os estágios por filas limitadas e espera todos terminarem"""
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in range(len(stage_funcs) + 1)]
+    tasks = [asyncio.create_task(_read(read_chunk, queues[0], executors["read"]))]
+    for i, (stage, func, concurrency) in enumerate(stage_funcs):
+        tasks.append(asyncio.create_task(_process(func, queues[i], queues[i + 1], executors[stage], concurrency)))
+    tasks.append(asyncio.create_task(_write(write_chunk, queues[-1], executors["write"])))
+    # Um erro em qualquer estágio interrompe o pipeline (asyncio.run cancela os demais)
+    results = await asyncio.gather(*tasks)
+    return results[-1]
+
+
+def process_pipelined(input_file, output_clean, output_all, apelidos_lista, whitelist,
+                      batch_size=DEFAULT_BATCH_SIZE, chunk_size=BERT_CHUNK_SIZE, workers=None,
+                      queue_size=DEFAULT_QUEUE_SIZE, stages=STAGES) -> dict:
+    """
+    Pipeline completo com os estágios rodando ao mesmo tempo, bloco a bloco.
+    Produz a mesma saída de process_fused.
+
+    Args:
+        input_file: Arquivo de entrada com mensagens
+        output_clean: Arquivo de saída final apenas com mensagens processadas
+        output_all: Arquivo de saída final com todas as transformações
+        apelidos_lista: Lista de apelidos para anonimizar
+        whitelist: Lista de palavras protegidas
+        batch_size: Número máximo de mensagens por forward pass do BERT
+        chunk_size: Número de mensagens por bloco passado entre os estágios
+        workers: Processos para os estágios de regex e apelidos (None ou 1 = uma thread por estágio)
+        queue_size: Número de blocos guardados em cada fila
+        stages: Etapas a aplicar (padrão: todas, ver STAGES)
+
+    Returns:
+        Dicionário com "messages", "bert_success" e "stage_seconds" (tempo
+        ocupado de cada estágio; o maior indica o gargalo)
+    """
+    whitelist_matcher = compile_whitelist(whitelist)
+    timings: Dict[str, float] = {}
+    state = {"bert_success": "bert" in stages}
+
+    def bert_chunk(chunk: List):
+        if not bert_ready(state):
+            return chunk
+        try:
+            return anonymize_chat_messages_bert(chunk, batch_size, whitelist_matcher, inplace=True)
+        except Exception as e:
+            print(f"⚠️  Erro no processamento BERT: {e}")
+            print("📝 Mantendo resultado da etapa anterior...")
+            state["bert_success"] = False
+            return chunk
+
+    parallel = bool(workers and workers > 1)
+    stage_funcs = []
+    if "id" in stages:
+        # Os mapeamentos de IDs são globais: um bloco por vez, na ordem do arquivo
+        stage_funcs.append(("id", partial(_map_chunk, partial(anonymize_chat_message_id, inplace=True),
+                                          (whitelist_matcher,)), 1))
+    if "regex" in stages:
+        stage_funcs.append(("regex", partial(_map_chunk, partial(anonymize_chat_message, inplace=True),
+                                             (whitelist_matcher,)), workers if parallel else 1))
+    if "apelidos" in stages:
+        stage_funcs.append(("apelidos", partial(_map_chunk, partial(anonimizar_apelidos_chat_message, inplace=True),
+                                                (compile_apelidos(apelidos_lista), whitelist_matcher)),
+                            workers if parallel else 1))
+    if "bert" in stages:
+        stage_funcs.append(("bert", bert_chunk, 1))
+
+    # No pool de processos o tempo de cada bloco não volta para este processo
+    timed_funcs = [(stage, func if parallel and stage in ("regex", "apelidos") else _timed(func, stage, timings),
+                    concurrency) for stage, func, concurrency in stage_funcs]
+
+    # Uma thread por estágio; regex e apelidos em paralelo usam o pool de processos compartilhado
+    executors = {}
+    for stage in ("read", "write", *(stage for stage, _, _ in stage_funcs)):
+        if parallel and stage in ("regex", "apelidos"):
+            executors[stage] = get_process_pool(workers)
+        else:
+            executors[stage] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"pipeline-{stage}")
+
+    chunks = chunked(read_messages(input_file, workers), chunk_size)
+    read_chunk = _timed(partial(next, chunks, None), "read", timings)
+    writer = open_message_writer(output_clean, output_all)
+    write_chunk = _timed(partial(_write_chunk, writer), "write", timings)
+    try:
+        count = asyncio.run(_run(read_chunk, write_chunk, timed_funcs, executors, queue_size))
+    finally:
+        for executor in executors.values():
+            if isinstance(executor, ThreadPoolExecutor):
+                executor.shutdown()
+        writer.close()
+    return {"messages": count, "bert_success": state["bert_success"], "stage_seconds": timings}
@@ -1,20 +1,64 @@
-from dataclasses import dataclass
-from typing import List
+import sys
+from typing import Iterable, Iterator, List, Optional
+from .utils import open_text
 
-@dataclass
 class ChatMessage:
-    timestamp: str
-    sender: str
-    message: str
-    original_message: str = None  # Para guardar a mensagem original
-    original_sender: str = None   # Para guardar o sender original
+    """
+    Mensagem de chat estruturada (timestamp, sender, mensagem e os originais).
+    Usa __slots__ para não ter um __dict__ por instância, e timestamps/senders
+    lidos do arquivo são internados (sys.intern), já que se repetem muito.
+    channel e thread_ts são metadados opcionais (ex.: exportações do Slack).
+    """
+    __slots__ = ('timestamp', 'sender', 'message', 'original_message', 'original_sender', 'channel', 'thread_ts')
     
-    def __post_init__(self):
+    def __init__(self, timestamp: str, sender: str, message: str,
+                 original_message: str = None, original_sender: str = None,
+                 channel: str = None, thread_ts: str = None):
+        self.timestamp = timestamp
+        self.sender = sender
+        self.message = message
         # Se não foi especificado, original é igual ao atual
-        if self.original_message is None:
-            self.original_message = self.message
-        if self.original_sender is None:
-            self.original_sender = self.sender
+        self.original_message = message if original_message is None else original_message
+        self.original_sender = sender if original_sender is None else original_sender
+        self.channel = channel
+        self.thread_ts = thread_ts
+    
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+    
+    def __reduce__(self):
+        # Serializa como os argumentos de __init__ (mesma ordem de __slots__): bem mais
+        # rápido de enviar a um pool de processos do que o estado padrão de __slots__
+        return (self.__class__, (self.timestamp, self.sender, self.message, self.original_message,
+                                 self.original_sender, self.channel, self.thread_ts))
+    
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"ChatMessage({fields})"
+    
+    def update(self, sender: str = None, message: str = None, inplace: bool = False) -> "ChatMessage":
+        """
+        Aplica o resultado de uma etapa de anonimização.
+        
+        Args:
+            sender: Novo sender (None = mantém o atual)
+            message: Nova mensagem (None = mantém a atual)
+            inplace: Altera esta instância em vez de criar uma nova
+            
+        Returns:
+            A mensagem atualizada (a própria instância se inplace=True)
+        """
+        if not inplace:
+            return ChatMessage(self.timestamp, self.sender if sender is None else sender,
+                               self.message if message is None else message,
+                               self.original_message, self.original_sender, self.channel, self.thread_ts)
+        if sender is not None:
+            self.sender = sender
+        if message is not None:
+            self.message = message
+        return self
     
     def to_dict(self):
         return {
@@ -22,7 +66,9 @@ class ChatMessage:
             'sender': self.sender,
             'message': self.message,
             'original_sender': self.original_sender,
-            'original_message': self.original_message
+            'original_message': self.original_message,
+            'channel': self.channel,
+            'thread_ts': self.thread_ts
         }
     
     @classmethod
@@ -45,7 +91,7 @@ class ChatMessage:
                 sender = remaining[:sender_end]
                 message = remaining[sender_end + 2:]
                 
-                return cls(timestamp=timestamp, sender=sender, message=message)
+                return cls(timestamp=sys.intern(timestamp), sender=sys.intern(sender), message=message)
             except:
                 pass
         
@@ -70,69 +116,148 @@ class ChatMessage:
         
         return f"ORIGINAL: {original}\nANONIMIZADO: {anonymized}\n" + "="*50
 
-def load_messages_from_file(file_path: str) -> List[ChatMessage]:
-    """Carrega mensagens de um arquivo assumindo formato genérico"""
-    messages = []
+def _message_from_comparison(original_line: str, anonymized_line: str) -> Optional[ChatMessage]:
+    """Reconstrói uma mensagem a partir das linhas ORIGINAL/ANONIMIZADO (já sem prefixo)"""
+    # Parsear linha original
+    original_msg = ChatMessage.from_line(original_line)
+    # Parsear linha anonimizada
+    anonymized_msg = ChatMessage.from_line(anonymized_line)
     
+    if original_msg and anonymized_msg:
+        # Criar mensagem com dados originais preservados
+        return ChatMessage(
+            timestamp=anonymized_msg.timestamp,
+            sender=anonymized_msg.sender,
+            message=anonymized_msg.message,
+            original_sender=original_msg.sender,
+            original_message=original_msg.message
+        )
+    return None
+
+def iter_messages_from_lines(lines: Iterable[str]) -> Iterator[ChatMessage]:
+    """
+    Converte linhas de texto em mensagens (gerador). Aceita o formato genérico
+    e o formato de comparação.
+    """
+    pending_original = None  # Linha "ORIGINAL: " aguardando a linha "ANONIMIZADO: "
+    skip_separator = False
+    
+    for raw_line in lines:
+        line = raw_line.strip()
+        
+        if pending_original is not None:
+            original_line = pending_original
+            pending_original = None
+            
+            # Verificar se é um arquivo de comparação (formato ORIGINAL/ANONIMIZADO)
+            if line.startswith("ANONIMIZADO: "):
+                msg = _message_from_comparison(original_line[10:], line[12:])
+                if msg:
+                    yield msg
+                # Pular a próxima linha (separador)
+                skip_separator = True
+                continue
+            
+            # "ORIGINAL: " sem par, trata como formato normal
+            msg = ChatMessage.from_line(original_line)
+            if msg and msg.message:
+                yield msg
+        
+        if skip_separator:
+            skip_separator = False
+            continue
+        
+        if line.startswith("ORIGINAL: "):
+            pending_original = line
+            continue
+        
+        # Formato normal
+        msg = ChatMessage.from_line(line)
+        if msg and msg.message:  # Ignora linhas vazias
+            yield msg
+    
+    if pending_original is not None:
+        msg = ChatMessage.from_line(pending_original)
+        if msg and msg.message:
+            yield msg
+
+def iter_messages_from_file(file_path: str) -> Iterator[ChatMessage]:
+    """
+    Lê mensagens de um arquivo uma a uma (gerador), sem carregar o arquivo
+    inteiro em memória. Aceita o formato genérico e o formato de comparação.
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            i = 0
-            lines = f.readlines()
-            while i < len(lines):
-                line = lines[i].strip()
-                
-                # Verificar se é um arquivo de comparação (formato ORIGINAL/ANONIMIZADO)
-                if line.startswith("ORIGINAL: ") and i + 1 < len(lines) and lines[i + 1].strip().startswith("ANONIMIZADO: "):
-                    # Extrair dados do formato de comparação
-                    original_line = line[10:]  # Remove "ORIGINAL: "
-                    anonymized_line = lines[i + 1].strip()[12:]  # Remove "ANONIMIZADO: "
-                    
-                    # Parsear linha original
-                    original_msg = ChatMessage.from_line(original_line)
-                    # Parsear linha anonimizada
-                    anonymized_msg = ChatMessage.from_line(anonymized_line)
-                    
-                    if original_msg and anonymized_msg:
-                        # Criar mensagem com dados originais preservados
-                        msg = ChatMessage(
-                            timestamp=anonymized_msg.timestamp,
-                            sender=anonymized_msg.sender,
-                            message=anonymized_msg.message,
-                            original_sender=original_msg.sender,
-                            original_message=original_msg.message
-                        )
-                        messages.append(msg)
-                    
-                    # Pular as próximas 2 linhas (linha anonimizada e separador)
-                    i += 3
-                else:
-                    # Formato normal
-                    msg = ChatMessage.from_line(line)
-                    if msg and msg.message:  # Ignora linhas vazias
-                        messages.append(msg)
-                    i += 1
+        with open_text(file_path) as f:
+            yield from iter_messages_from_lines(f)
                     
     except FileNotFoundError:
         print(f"Erro: Arquivo {file_path} não encontrado")
     except Exception as e:
         print(f"Erro ao ler arquivo {file_path}: {e}")
-    
-    return messages
+
+def load_messages_from_file(file_path: str) -> List[ChatMessage]:
+    """Carrega mensagens de um arquivo assumindo formato genérico"""
+    return list(iter_messages_from_file(file_path))
 
 def save_messages_to_file(messages: List[ChatMessage], file_path: str):
-    """Salva apenas mensagens anonimizadas"""
+    """Salva apenas mensagens anonimizadas (comprimido se a extensão pedir, ex.: .txt.gz)"""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with open_text(file_path, 'w') as f:
             for msg in messages:
                 f.write(msg.format_message() + '\n')
     except Exception as e:
         print(f"Erro ao salvar arquivo {file_path}: {e}")
 
 def save_messages_comparison_to_file(messages: List[ChatMessage], file_path: str):
-    """Salva comparação original vs anonimizado"""
+    """Salva comparação original vs anonimizado (comprimido se a extensão pedir, ex.: .txt.gz)"""
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with open_text(file_path, 'w') as f:
             for msg in messages:
                 f.write(msg.format_comparison() + '\n')
     except Exception as e:
         print(f"Erro ao salvar arquivo {file_path}: {e}")
+
+def stream_messages_to_files(messages: Iterable[ChatMessage], output_clean: Optional[str],
+                             output_all: Optional[str], append: bool = False) -> int:
+    """
+    Grava as mensagens anonimizadas e a comparação em uma única passada,
+    consumindo o iterável mensagem a mensagem.
+    
+    Args:
+        append: Acrescenta ao final dos arquivos em vez de sobrescrevê-los
+    
+    Returns:
+        Número de mensagens gravadas
+    """
+    count = 0
+    mode = 'a' if append else 'w'
+    clean_file = all_file = None
+    try:
+        if output_clean:
+            clean_file = open_text(output_clean, mode)
+        if output_all:
+            all_file = open_text(output_all, mode)
+        for msg in messages:
+            if clean_file:
+                clean_file.write(msg.format_message() + '\n')
+            if all_file:
+                all_file.write(msg.format_comparison() + '\n')
+            count += 1
+    finally:
+        if clean_file:
+            clean_file.close()
+        if all_file:
+            all_file.close()
+    return count
+
+def tee_messages_to_files(messages: Iterable[ChatMessage], output_clean: str,
+                          output_all: str) -> Iterator[ChatMessage]:
+    """
+    Repassa as mensagens adiante (gerador) gravando cada uma nos arquivos
+    limpo e de comparação à medida que passam.
+    """
+    with open_text(output_clean, 'w') as clean_file, open_text(output_all, 'w') as all_file:
+        for msg in messages:
+            clean_file.write(msg.format_message() + '\n')
+            all_file.write(msg.format_comparison() + '\n')
+            yield msg
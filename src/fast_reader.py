@@ -0,0 +1,118 @@
+"""
+Leitura paralela de arquivos de texto muito grandes.
+O arquivo é mapeado em memória (mmap) e dividido em faixas de bytes que
+começam sempre no início de uma mensagem: no início de uma linha e, no
+formato de comparação, em uma linha "ORIGINAL: ". Cada faixa é decodificada
+e convertida em mensagens em um worker do pool de processos, e as mensagens
+voltam na ordem do arquivo. O arquivo nunca é lido inteiro para strings.
+"""
+
+import io
+import mmap
+import os
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
+
+from .chat_message import ChatMessage, iter_messages_from_file, iter_messages_from_lines
+from .parallel import call_in_worker, get_process_pool, merge_worker_stats
+from .utils import compression
+
+# Tamanho de cada faixa entregue a um worker
+DEFAULT_SEGMENT_BYTES = 32 * 1024 * 1024
+
+# Arquivos menores que isto são lidos em série (o pool não compensa)
+MIN_PARALLEL_BYTES = 64 * 1024 * 1024
+
+_ANONYMIZED_PREFIX = b"ANONIMIZADO: "
+
+
+def _line_starts_with(mm, position: int, prefix: bytes) -> bool:
+    # As linhas são lidas sem espaços nas pontas (ver iter_messages_from_lines)
+    return mm[position:position + len(prefix) + 16].lstrip().startswith(prefix)
+
+
+def _next_boundary(mm, position: int) -> int:
+    """
+    Primeiro início de mensagem a partir de position (fim do arquivo se não houver):
+    um início de linha que não seja a linha "ANONIMIZADO: " nem o separador que
+    vem depois dela no formato de comparação.
+    """
+    if position <= 0:
+        return 0
+    newline = mm.find(b"\n", position - 1)
+    while newline != -1 and newline + 1 < len(mm):
+        start = newline + 1
+        previous = mm.rfind(b"\n", 0, newline) + 1
+        if not (_line_starts_with(mm, start, _ANONYMIZED_PREFIX)
+                or _line_starts_with(mm, previous, _ANONYMIZED_PREFIX)):
+            return start
+        newline = mm.find(b"\n", start)
+    return len(mm)
+
+
+def split_ranges(mm, segment_bytes: int = DEFAULT_SEGMENT_BYTES) -> List[Tuple[int, int]]:
+    """
+    Divide o conteúdo mapeado em faixas (início, fim) de cerca de segment_bytes
+    bytes, cada uma começando no início de uma mensagem.
+    """
+    ranges = []
+    start = 0
+    while start < len(mm):
+        end = _next_boundary(mm, start + segment_bytes)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _parse_range(file_path: str, start: int, end: int) -> List[ChatMessage]:
+    """Converte uma faixa de bytes do arquivo em mensagens (executado no worker)"""
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Mesmo tratamento de quebras de linha de open() em modo texto
+        lines = io.TextIOWrapper(io.BytesIO(mm[start:end]), encoding='utf-8')
+        return list(iter_messages_from_lines(lines))
+
+
+def _range_result(future) -> List[ChatMessage]:
+    """Mensagens de uma faixa, somando as estatísticas do worker neste processo"""
+    messages, stats = future.result()
+    merge_worker_stats(stats)
+    return messages
+
+
+def iter_messages_parallel(file_path: str, workers: Optional[int] = None,
+                           segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                           min_parallel_bytes: int = MIN_PARALLEL_BYTES) -> Iterator[ChatMessage]:
+    """
+    Lê as mensagens de um arquivo de texto em paralelo, preservando a ordem.
+    Produz as mesmas mensagens de iter_messages_from_file. Mantém no máximo 2
+    faixas por worker em processamento, então a memória continua limitada.
+
+    Args:
+        file_path: Arquivo no formato genérico ou de comparação
+        workers: Número de processos (padrão: número de CPUs)
+        segment_bytes: Tamanho de cada faixa
+        min_parallel_bytes: Abaixo deste tamanho, o arquivo é lido em série
+    """
+    workers = workers or os.cpu_count() or 1
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = 0
+    # Arquivos comprimidos não podem ser divididos em faixas de bytes
+    if workers <= 1 or size < max(min_parallel_bytes, 1) or compression(file_path):
+        yield from iter_messages_from_file(file_path)
+        return
+
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        ranges = split_ranges(mm, segment_bytes)
+
+    pool = get_process_pool(workers)
+    max_pending = 2 * workers
+    pending = deque()
+    for start, end in ranges:
+        pending.append(pool.submit(call_in_worker, _parse_range, file_path, start, end))
+        if len(pending) >= max_pending:
+            yield from _range_result(pending.popleft())
+
+    while pending:
+        yield from _range_result(pending.popleft())
@@ -1,45 +1,66 @@
 import re
+from typing import Iterator, List
 from .chat_message import ChatMessage
+from .metrics import count_replacement
+from .spans import Annotation, render_spans
+from .whitelist import compile_whitelist, protected_spans, is_protected
 
 _user_map = {}
 _sender_map = {}
 
-def anonymize_message_id(text: str) -> str:
+_MENTION_RE = re.compile(r'@(\w+)')
+
+def iter_mentions(text: str, whitelist=None) -> Iterator[re.Match]:
+    """Menções @nome do texto (grupo 1 = nome), exceto as de palavras da whitelist"""
+    spans = protected_spans(text, whitelist)
+    for m in _MENTION_RE.finditer(text):
+        if not (spans and is_protected(spans, m.start(1), m.end(1))):
+            yield m
+
+def mention_spans(text: str, whitelist=None) -> List[Annotation]:
     """
-    Substitui todas as menções @nome por @user_N,
-    mantendo consistência ao longo do arquivo.
+    Trechos (start, end, "@user_N") das menções @nome, com numeração
+    consistente ao longo do arquivo.
+    Menções a palavras da whitelist (ex.: @jira) são mantidas.
     """
-    pattern = r'@(\w+)'
-    def repl(m):
+    result = []
+    for m in iter_mentions(text, whitelist):
         nome = m.group(1)
         if nome not in _user_map:
             _user_map[nome] = f'user_{len(_user_map) + 1}'
-        return '@' + _user_map[nome]
-    return re.sub(pattern, repl, text)
+        result.append((m.start(), m.end(), '@' + _user_map[nome]))
+    return result
+
+def anonymize_message_id(text: str, whitelist=None) -> str:
+    """
+    Substitui todas as menções @nome por @user_N,
+    mantendo consistência ao longo do arquivo.
+    Menções a palavras da whitelist (ex.: @jira) são mantidas.
+    """
+    return render_spans(text, mention_spans(text, whitelist))
 
-def anonymize_sender_id(sender: str) -> str:
+def anonymize_sender_id(sender: str, whitelist=None) -> str:
     """
-    Substitui nomes de senders por user_N de forma consistente
+    Substitui nomes de senders por user_N de forma consistente.
+    Senders que são inteiramente uma palavra da whitelist (ex.: bots) são mantidos.
     """
+    matcher = compile_whitelist(whitelist)
+    if matcher is not None and matcher.fullmatch(sender):
+        return sender
     if sender not in _sender_map:
         _sender_map[sender] = f'user_{len(_sender_map) + 1}'
+    count_replacement(_sender_map[sender])
     return _sender_map[sender]
 
-def anonymize_chat_message_id(msg: ChatMessage) -> ChatMessage:
-    """Anonimiza uma mensagem estruturada substituindo IDs"""
+def anonymize_chat_message_id(msg: ChatMessage, whitelist=None, inplace: bool = False) -> ChatMessage:
+    """Anonimiza uma mensagem estruturada substituindo IDs (inplace=True altera msg em vez de copiar)"""
     # Anonimiza o sender
-    anonymized_sender = anonymize_sender_id(msg.sender)
+    anonymized_sender = anonymize_sender_id(msg.sender, whitelist)
     
     # Anonimiza menções no conteúdo da mensagem
-    anonymized_message = anonymize_message_id(msg.message)
+    anonymized_message = anonymize_message_id(msg.message, whitelist)
     
-    return ChatMessage(
-        timestamp=msg.timestamp,  # Mantém timestamp original
-        sender=anonymized_sender,
-        message=anonymized_message,
-        original_sender=msg.original_sender if hasattr(msg, 'original_sender') else msg.sender,
-        original_message=msg.original_message if hasattr(msg, 'original_message') else msg.message
-    )
+    return msg.update(sender=anonymized_sender, message=anonymized_message, inplace=inplace)
 
 def anonymize_messages_id(messages: list) -> list:
     """Anonimiza uma lista de mensagens (ChatMessage ou strings)"""
@@ -60,4 +81,14 @@ def reset_mappings():
     """Reset dos mapeamentos para novo processamento"""
     global _user_map, _sender_map
     _user_map = {}
-    _sender_map = {}
\ No newline at end of file
+    _sender_map = {}
+
+def export_mappings() -> dict:
+    """Exporta os mapeamentos atuais (para persistir entre execuções)"""
+    return {"user_map": dict(_user_map), "sender_map": dict(_sender_map)}
+
+def load_mappings(data: dict):
+    """Restaura mapeamentos exportados por export_mappings"""
+    global _user_map, _sender_map
+    _user_map = dict(data.get("user_map", {}))
+    _sender_map = dict(data.get("sender_map", {}))
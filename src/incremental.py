@@ -0,0 +1,190 @@
+"""
+Processamento incremental de exportações que só crescem (append-only).
+Um checkpoint em JSON guarda o último byte processado da entrada, um hash
+do trecho final já lido e os mapeamentos user_N do id_anon. Na execução
+seguinte, apenas as mensagens acrescentadas depois desse ponto passam pelo
+pipeline e são anexadas aos arquivos de resultado existentes.
+"""
+import hashlib
+import json
+import os
+from typing import Iterator, List, Optional
+
+from .chat_message import ChatMessage
+from .id_anon import export_mappings, load_mappings, reset_mappings
+from .pipeline import BERT_CHUNK_SIZE, STAGES, anonymize_stream
+from .parallel import DEFAULT_CHUNK_SIZE
+from .pt_bert_local import DEFAULT_BATCH_SIZE
+from .records import write_messages
+from .utils import strip_compression
+
+CHECKPOINT_VERSION = 1
+
+# Quantidade de bytes antes do offset usada para detectar se a entrada foi reescrita
+TAIL_HASH_BYTES = 64 * 1024
+
+
+def _tail_hash(file_path: str, offset: int) -> str:
+    """Hash SHA-256 dos últimos TAIL_HASH_BYTES bytes antes de offset"""
+    start = max(0, offset - TAIL_HASH_BYTES)
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+
+def _file_size(file_path: Optional[str]) -> int:
+    return os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
+
+
+def load_checkpoint(checkpoint_file: str) -> Optional[dict]:
+    """Lê o checkpoint (None se não existir ou estiver corrompido)"""
+    try:
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_file: str, checkpoint: dict):
+    """Grava o checkpoint de forma atômica (arquivo temporário + rename)"""
+    tmp_file = f"{checkpoint_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def checkpoint_is_valid(checkpoint: Optional[dict], input_file: str, output_clean: str,
+                        output_all: str, stages) -> bool:
+    """
+    Verifica se é possível continuar a partir do checkpoint: a entrada precisa
+    conter o mesmo trecho já processado e os resultados anteriores precisam existir.
+    """
+    if not checkpoint:
+        return False
+    if checkpoint.get("input") != os.path.abspath(input_file) or checkpoint.get("stages") != list(stages):
+        return False
+    offset = checkpoint.get("offset", 0)
+    if _file_size(input_file) < offset or _tail_hash(input_file, offset) != checkpoint.get("tail_hash"):
+        return False
+    outputs = checkpoint.get("outputs", {})
+    return (_file_size(output_clean) >= outputs.get("clean", 0)
+            and _file_size(output_all) >= outputs.get("all", 0)
+            and os.path.exists(output_clean) and os.path.exists(output_all))
+
+
+def iter_new_messages(input_file: str, offset: int, state: dict) -> Iterator[ChatMessage]:
+    """
+    Lê mensagens a partir de offset (posição em bytes no início de uma linha).
+    Para na primeira linha sem quebra de linha no final: ela pode estar sendo
+    gravada agora e será lida inteira na próxima execução.
+
+    Args:
+        state: Dicionário atualizado com "offset" (fim da última linha completa lida)
+    """
+    with open(input_file, 'rb') as f:
+        f.seek(offset)
+        for raw_line in f:
+            if not raw_line.endswith(b"\n"):
+                break
+            state["offset"] += len(raw_line)
+            msg = ChatMessage.from_line(raw_line.decode('utf-8'))
+            if msg and msg.message:
+                yield msg
+
+
+def _temp_path(path: str) -> str:
+    """Arquivo temporário de path com a mesma extensão (o formato de gravação vem dela)"""
+    plain = strip_compression(path)
+    base, extension = os.path.splitext(plain)
+    return f"{base}.tmp{extension}{path[len(plain):]}"
+
+
+def process_incremental(input_file: str, output_clean: str, output_all: str, apelidos_lista: List[str],
+                        whitelist: List[str], checkpoint_file: str,
+                        batch_size: int = DEFAULT_BATCH_SIZE, chunk_size: int = BERT_CHUNK_SIZE,
+                        workers: Optional[int] = None, worker_chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        stages=STAGES) -> dict:
+    """
+    Processa apenas as mensagens acrescentadas à entrada desde a última execução
+    e as anexa aos arquivos de resultado. Se o checkpoint não existir ou não
+    corresponder à entrada atual (arquivo reescrito, etapas diferentes,
+    resultados apagados), a entrada é reprocessada do início.
+
+    Args:
+        input_file: Arquivo de entrada com mensagens (formato "[timestamp] sender: mensagem")
+        output_clean: Arquivo de saída final apenas com mensagens processadas
+        output_all: Arquivo de saída final com todas as transformações
+        apelidos_lista: Lista de apelidos para anonimizar
+        whitelist: Lista de palavras protegidas
+        checkpoint_file: Caminho do checkpoint JSON
+        Demais argumentos: iguais aos de process_fused
+
+    Se a etapa BERT foi pedida e falhou, nada é anexado aos resultados e o
+    checkpoint não muda: as mensagens serão processadas de novo na próxima execução.
+
+    Returns:
+        Dicionário com "messages" (mensagens novas processadas), "offset",
+        "full" (True se houve reprocessamento completo), "bert_success" e
+        "saved" (False se o resultado foi descartado pela falha do BERT)
+    """
+    checkpoint = load_checkpoint(checkpoint_file)
+    resume = checkpoint_is_valid(checkpoint, input_file, output_clean, output_all, stages)
+
+    if resume:
+        load_mappings(checkpoint["id_maps"])
+        # Descarta o que uma execução interrompida possa ter anexado após o checkpoint
+        for path, size in ((output_clean, checkpoint["outputs"]["clean"]), (output_all, checkpoint["outputs"]["all"])):
+            if os.path.getsize(path) > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        offset = checkpoint["offset"]
+    else:
+        reset_mappings()
+        offset = 0
+
+    read_state = {"offset": offset}
+    state = {}
+    messages = anonymize_stream(iter_new_messages(input_file, offset, read_state), apelidos_lista, whitelist,
+                                state, batch_size=batch_size, chunk_size=chunk_size, workers=workers,
+                                worker_chunk_size=worker_chunk_size, stages=stages)
+    # Do início, grava em arquivos temporários: os resultados anteriores só são trocados se tudo der certo
+    targets = (output_clean, output_all) if resume else (_temp_path(output_clean), _temp_path(output_all))
+    count = write_messages(messages, *targets, append=resume)
+
+    if "bert" in stages and not state["bert_success"]:
+        # Mensagens que não passaram pelo NER não podem ser marcadas como processadas
+        if resume:
+            for path, size in ((output_clean, checkpoint["outputs"]["clean"]),
+                               (output_all, checkpoint["outputs"]["all"])):
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        else:
+            for path in dict.fromkeys(targets):
+                if os.path.exists(path):
+                    os.remove(path)
+        return {"messages": count, "offset": offset, "full": not resume, "bert_success": False, "saved": False}
+    if not resume:
+        # Em JSONL/Parquet os dois destinos são o mesmo arquivo
+        for tmp_file, path in dict.fromkeys(zip(targets, (output_clean, output_all))):
+            os.replace(tmp_file, path)
+
+    save_checkpoint(checkpoint_file, {
+        "version": CHECKPOINT_VERSION,
+        "input": os.path.abspath(input_file),
+        "stages": list(stages),
+        "offset": read_state["offset"],
+        "tail_hash": _tail_hash(input_file, read_state["offset"]),
+        "outputs": {"clean": _file_size(output_clean), "all": _file_size(output_all)},
+        "id_maps": export_mappings(),
+    })
+
+    return {
+        "messages": count,
+        "offset": read_state["offset"],
+        "full": not resume,
+        "bert_success": state["bert_success"],
+        "saved": True,
+    }
@@ -0,0 +1,205 @@
+"""
+Pool de réplicas do modelo de NER para CPUs com muitos núcleos.
+Um único modelo escala mal com mais threads em lotes pequenos; em vez disso,
+N réplicas (processos ou threads) rodam ao mesmo tempo, cada uma com o seu
+número de threads intra-op e presa (sched_setaffinity) a um conjunto próprio
+de núcleos, sem disputar os mesmos núcleos.
+
+O cache, o filtro e o agrupamento em lotes continuam no anonimizador
+principal: apenas os forward passes são distribuídos entre as réplicas.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, List, Optional
+
+from .pt_bert_local import LocalBertAnonymizer
+
+POOL_MODES = ("process", "thread")
+
+# Réplica carregada neste processo (modo "process") ou nesta thread (modo "thread")
+_replica = None
+_local = threading.local()
+
+
+def available_cores() -> List[int]:
+    """Núcleos que este processo pode usar"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cores(replicas: int, threads: int, cores: Optional[List[int]] = None) -> List[Optional[List[int]]]:
+    """
+    Divide os núcleos entre as réplicas, threads núcleos consecutivos para cada uma.
+    Se não houver núcleos para todas, nenhuma réplica é presa (None).
+    """
+    cores = cores if cores is not None else available_cores()
+    if replicas * threads > len(cores):
+        return [None] * replicas
+    return [cores[i * threads:(i + 1) * threads] for i in range(replicas)]
+
+
+def _default_factory(backend: str) -> LocalBertAnonymizer:
+    return LocalBertAnonymizer(backend=backend)
+
+
+def _load_replica(factory: Callable[[], LocalBertAnonymizer], threads: int,
+                  cores: Optional[List[int]]) -> Optional[LocalBertAnonymizer]:
+    """Prende a thread/processo atual aos núcleos, limita as threads do torch e carrega o modelo"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        # Com pid 0, vale para a thread atual (e para as threads que ela criar)
+        os.sched_setaffinity(0, cores)
+    replica = factory()
+    if not replica.initialize():
+        return None
+    if replica.model is not None:
+        import torch
+        torch.set_num_threads(threads)
+    return replica
+
+
+def _init_process_replica(factory, threads: int, core_queue):
+    """
+    Inicializador de cada processo do pool: pega um conjunto de núcleos da fila e carrega a réplica.
+    Se o modelo não carregar, o processo falha e o pool fica inutilizável (BrokenProcessPool),
+    em vez de receber lotes sem réplica.
+    """
+    global _replica
+    # Precisa ser definido antes do torch ser importado no processo
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    try:
+        cores = core_queue.get_nowait()
+    except queue.Empty:
+        # Processo além dos planejados (ex.: substituto de um que morreu): roda sem núcleos próprios
+        cores = None
+    _replica = _load_replica(factory, threads, cores)
+    if _replica is None:
+        raise RuntimeError("Réplica do modelo de NER não carregou")
+
+
+def _wait_all(barrier: threading.Barrier, func: Callable):
+    """Segura a thread até todas as réplicas chegarem, para que cada consulta rode em uma thread própria"""
+    barrier.wait()
+    return func()
+
+
+def _process_replica_model() -> Optional[str]:
+    return _replica.loaded_model if _replica is not None else None
+
+
+def _process_replica_infer(texts: List[str]):
+    return _replica.pipe(texts, batch_size=len(texts))
+
+
+class InferencePool:
+    """N réplicas do modelo de NER, cada uma com threads e núcleos próprios"""
+
+    def __init__(self, replicas: int, threads: Optional[int] = None, backend: str = "torch", mode: str = "process",
+                 pin: bool = True, factory: Optional[Callable[[], LocalBertAnonymizer]] = None):
+        """
+        Args:
+            replicas: Número de réplicas do modelo
+            threads: Threads intra-op por réplica (padrão: núcleos disponíveis / réplicas)
+            backend: Backend de inferência de cada réplica (ver BACKENDS)
+            mode: "process" (um processo por réplica) ou "thread" (réplicas no mesmo processo;
+                o número de threads do torch é global, então vale o mesmo para todas)
+            pin: Prende cada réplica a um conjunto próprio de núcleos
+            factory: Cria o anonimizador de cada réplica (serializável no modo "process";
+                padrão: LocalBertAnonymizer com o backend escolhido)
+        """
+        if mode not in POOL_MODES:
+            raise ValueError(f"Modo inválido: {mode}. Opções: {', '.join(POOL_MODES)}")
+        if replicas < 1:
+            raise ValueError("O pool precisa de pelo menos uma réplica")
+        self.replicas = replicas
+        self.threads = threads or max(1, len(available_cores()) // replicas)
+        self.mode = mode
+        self.cores = plan_cores(replicas, self.threads) if pin else [None] * replicas
+        self.factory = factory or partial(_default_factory, backend)
+        self.loaded_model = None
+        self._executor = None
+        self._failed = False
+        self._next_cores = iter(self.cores)
+        self._cores_lock = threading.Lock()
+
+    @property
+    def pinned(self) -> bool:
+        return all(cores is not None for cores in self.cores)
+
+    def start(self) -> Optional[str]:
+        """
+        Inicia as réplicas e carrega o modelo.
+
+        Returns:
+            Modelo carregado (chave do cache de NER) ou None se o modelo não carregar
+            em alguma das réplicas
+        """
+        if self._executor is not None or self._failed:
+            return self.loaded_model
+        if self.mode == "process":
+            import multiprocessing
+            # "spawn": cada réplica começa sem o estado (e as threads) do processo principal
+            context = multiprocessing.get_context("spawn")
+            core_queue = context.Queue()
+            for cores in self.cores:
+                core_queue.put(cores)
+            self._executor = ProcessPoolExecutor(max_workers=self.replicas, mp_context=context,
+                                                 initializer=_init_process_replica,
+                                                 initargs=(self.factory, self.threads, core_queue))
+            probe = _process_replica_model
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.replicas, thread_name_prefix="ner-replica")
+            probe = self._thread_replica_model
+        # Uma consulta por réplica: enviadas juntas, cada uma inicia (e carrega) uma réplica
+        barrier = threading.Barrier(self.replicas) if self.mode == "thread" else None
+        futures = [self._executor.submit(_wait_all, barrier, probe) if barrier else self._executor.submit(probe)
+                   for _ in range(self.replicas)]
+        try:
+            models = {future.result() for future in futures}
+        except Exception as e:
+            print(f"❌ Erro ao iniciar as réplicas do modelo BERT: {e}")
+            models = {None}
+        if None in models:
+            self.close()
+            self._failed = True
+            return None
+        self.loaded_model = models.pop()
+        return self.loaded_model
+
+    def _thread_replica(self) -> Optional[LocalBertAnonymizer]:
+        """Réplica da thread atual, carregada no primeiro uso"""
+        if not hasattr(_local, "replica"):
+            with self._cores_lock:
+                cores = next(self._next_cores, None)
+            _local.replica = _load_replica(self.factory, self.threads, cores)
+        return _local.replica
+
+    def _thread_replica_model(self) -> Optional[str]:
+        replica = self._thread_replica()
+        return replica.loaded_model if replica is not None else None
+
+    def _thread_replica_infer(self, texts: List[str]):
+        replica = self._thread_replica()
+        if replica is None:
+            raise RuntimeError("Réplica do modelo de NER não carregou")
+        return replica.pipe(texts, batch_size=len(texts))
+
+    def submit_batches(self, batches: List[List[str]]) -> List[Future]:
+        """Envia os lotes às réplicas; cada Future resulta na saída do pipeline de NER para o lote"""
+        self.start()
+        infer = _process_replica_infer if self.mode == "process" else self._thread_replica_infer
+        return [self._executor.submit(infer, batch) for batch in batches]
+
+    def infer(self, texts: List[str]):
+        """Forward pass de um único lote em uma das réplicas"""
+        return self.submit_batches([texts])[0].result()
+
+    def close(self):
+        """Encerra as réplicas"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,243 @@
+"""
+Métricas por etapa do pipeline: tempo de parede e de CPU, número de mensagens,
+mensagens/s e substituições por rótulo ([CPF], [EMAIL], [PESSOA], user_N...).
+Os resultados podem ser gravados em JSON e em um textfile do Prometheus
+(coletor textfile do node_exporter), e cada etapa pode ser perfilada.
+
+As substituições e as mensagens gravadas são contadas onde acontecem
+(count_replacement, count_messages), sem reler os arquivos de saída. Os
+workers do pool de processos devolvem as suas contagens e o seu tempo de CPU
+a cada tarefa (ver parallel.share_worker_state).
+"""
+import cProfile
+import importlib.util
+import io
+import json
+import os
+import pstats
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .parallel import share_worker_state
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+class _Counts:
+    """Contagens acumuladas em um processo"""
+
+    def __init__(self):
+        self.replacements = Counter()
+        self.messages = 0
+        self.cpu_seconds = 0.0  # Tempo de CPU dos workers (somado no processo principal)
+
+
+_counts = _Counts()
+
+# Nos workers: tempo de CPU do processo na última coleta
+_cpu_mark = 0.0
+
+
+def count_replacement(replacement: str, count: int = 1):
+    """Registra substituições feitas por uma etapa ("[CPF]", "@user_3" e "user_3" contam como "user_N")"""
+    label = replacement[1:-1] if replacement.startswith("[") else "user_N"
+    _counts.replacements[label] += count
+
+
+def count_messages(count: int):
+    """Registra mensagens gravadas na saída de uma etapa"""
+    _counts.messages += count
+
+
+def _reset_counts():
+    global _counts, _cpu_mark
+    _counts = _Counts()
+    _cpu_mark = time.process_time()
+
+
+def _take_counts() -> _Counts:
+    global _counts, _cpu_mark
+    counts = _counts
+    now = time.process_time()
+    counts.cpu_seconds += now - _cpu_mark
+    _counts = _Counts()
+    _cpu_mark = now
+    return counts
+
+
+def _merge_counts(counts: _Counts):
+    _counts.replacements.update(counts.replacements)
+    _counts.messages += counts.messages
+    _counts.cpu_seconds += counts.cpu_seconds
+
+
+share_worker_state("metrics", _reset_counts, (), _take_counts, _merge_counts)
+
+
+class StageMetrics:
+    """Medidas de uma etapa"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.messages = 0
+        self.replacements = Counter()
+        self.extra = {}
+        self.profile_file = None
+
+    @property
+    def msgs_per_sec(self) -> float:
+        return self.messages / self.wall_seconds if self.wall_seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "messages": self.messages,
+            "msgs_per_sec": self.msgs_per_sec,
+            "replacements": dict(self.replacements),
+            "extra": self.extra,
+            "profile": self.profile_file,
+        }
+
+
+class MetricsRecorder:
+    """
+    Registra as métricas de cada etapa. Desativado (enabled=False e sem
+    profiler), não mede nada.
+    """
+
+    def __init__(self, enabled: bool = False, profile: Optional[str] = None, profile_dir: str = "."):
+        """
+        Args:
+            enabled: Registra tempos, contagens e substituições
+            profile: Profiler a usar em cada etapa (ver PROFILERS) ou None
+            profile_dir: Pasta onde os perfis são gravados
+        """
+        if profile and profile not in PROFILERS:
+            raise ValueError(f"Profiler inválido: {profile}. Opções: {', '.join(PROFILERS)}")
+        if profile == "pyinstrument" and importlib.util.find_spec("pyinstrument") is None:
+            raise ValueError("pyinstrument não encontrado. Execute: pip install pyinstrument")
+        self.enabled = enabled
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.stages: Dict[str, StageMetrics] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Mede o bloco como a etapa name: mensagens gravadas e substituições
+        feitas durante o bloco (ver count_replacement e count_messages).
+        O tempo de CPU soma o deste processo e o dos workers do pool de
+        processos; as réplicas de --ner-replicas não entram.
+
+        Yields:
+            StageMetrics da etapa (None se as métricas e o profiler estiverem desativados)
+        """
+        if not self.enabled and not self.profile:
+            yield None
+            return
+
+        metrics = StageMetrics(name)
+        self.stages[name] = metrics
+        replacements_before = Counter(_counts.replacements)
+        messages_before = _counts.messages
+        workers_cpu_before = _counts.cpu_seconds
+        profiler = self._start_profiler()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield metrics
+        finally:
+            metrics.wall_seconds = time.perf_counter() - wall_start
+            metrics.cpu_seconds = (time.process_time() - cpu_start) + (_counts.cpu_seconds - workers_cpu_before)
+            if profiler is not None:
+                metrics.profile_file = self._stop_profiler(profiler, name)
+
+        if self.enabled:
+            metrics.messages = _counts.messages - messages_before
+            metrics.replacements = _counts.replacements - replacements_before
+
+    def _start_profiler(self):
+        if self.profile == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if self.profile == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        return None
+
+    def _stop_profiler(self, profiler, name: str) -> str:
+        """Grava o perfil da etapa e retorna o caminho do arquivo"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        if self.profile == "cprofile":
+            profiler.disable()
+            path = os.path.join(self.profile_dir, f"profile_{name}.prof")
+            profiler.dump_stats(path)
+            # Resumo legível ao lado do arquivo binário (abrir o .prof com snakeviz/pstats)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(40)
+            with open(os.path.join(self.profile_dir, f"profile_{name}.txt"), 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+            return path
+        profiler.stop()
+        path = os.path.join(self.profile_dir, f"profile_{name}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+        return path
+
+    def to_dict(self) -> dict:
+        return {"stages": {name: stage.to_dict() for name, stage in self.stages.items()}}
+
+    def write_json(self, path: str):
+        """Grava o relatório em JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+    def write_prometheus(self, path: str, prefix: str = "slack_detox"):
+        """Grava as métricas no formato textfile do Prometheus (escrita atômica)"""
+        gauges = [
+            ("stage_wall_seconds", "Tempo de parede da etapa", lambda s: s.wall_seconds),
+            ("stage_cpu_seconds", "Tempo de CPU da etapa", lambda s: s.cpu_seconds),
+            ("stage_messages", "Mensagens processadas pela etapa", lambda s: s.messages),
+            ("stage_messages_per_second", "Mensagens por segundo da etapa", lambda s: s.msgs_per_sec),
+        ]
+        lines = []
+        for metric, help_text, value in gauges:
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} gauge")
+            for name, stage in self.stages.items():
+                lines.append(f'{prefix}_{metric}{{stage="{name}"}} {value(stage)}')
+
+        lines.append(f"# HELP {prefix}_stage_replacements Substituições feitas pela etapa, por rótulo")
+        lines.append(f"# TYPE {prefix}_stage_replacements gauge")
+        for name, stage in self.stages.items():
+            for label, count in sorted(stage.replacements.items()):
+                lines.append(f'{prefix}_stage_replacements{{stage="{name}",label="{label}"}} {count}')
+
+        lines.append(f"# HELP {prefix}_stage_extra Medidas específicas da etapa (ex.: cache do BERT)")
+        lines.append(f"# TYPE {prefix}_stage_extra gauge")
+        for name, stage in self.stages.items():
+            for key, value in sorted(stage.extra.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'{prefix}_stage_extra{{stage="{name}",key="{key}"}} {value}')
+
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_file, path)
+
+    def summary(self, name: str) -> Optional[str]:
+        """Linha de resumo de uma etapa para o console"""
+        stage = self.stages.get(name)
+        if stage is None or not self.enabled:
+            return None
+        replacements = ", ".join(f"{label}: {count}" for label, count in stage.replacements.most_common())
+        return (f"⏱️  {stage.wall_seconds:.2f}s (CPU {stage.cpu_seconds:.2f}s), {stage.messages} mensagens, "
+                f"{stage.msgs_per_sec:,.0f} msgs/s{f' - {replacements}' if replacements else ''}")
@@ -0,0 +1,142 @@
+"""
+Cache de resultados de NER, indexado por (modelo, hash do texto).
+Mensagens repetidas ("ok", "bom dia", notificações de bots) não passam
+de novo pelo modelo: primeiro é consultado um LRU em memória e, se
+configurado, um banco SQLite local que persiste entre execuções.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+Entities = List[Tuple[int, int, str]]
+
+# Número padrão de textos mantidos no LRU em memória
+DEFAULT_CACHE_SIZE = 100_000
+
+
+def text_hash(text: str) -> str:
+    """
+    Hash do texto da mensagem. O texto não é normalizado além da codificação
+    UTF-8: as posições (start, end) das entidades dependem do texto exato.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class NerCache:
+    """Cache de entidades em duas camadas: LRU em memória + SQLite opcional"""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, db_path: Optional[str] = None):
+        """
+        Args:
+            max_entries: Número máximo de textos no LRU em memória
+            db_path: Caminho do banco SQLite (None = apenas memória)
+        """
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            self.open_disk(db_path)
+
+    def open_disk(self, db_path: str):
+        """Ativa a camada persistente em SQLite"""
+        with self._lock:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                " model TEXT NOT NULL,"
+                " hash TEXT NOT NULL,"
+                " entities TEXT NOT NULL,"
+                " PRIMARY KEY (model, hash))"
+            )
+            self._db.commit()
+
+    def close(self):
+        """Fecha o banco SQLite, se aberto"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: Tuple[str, str], entities: Entities):
+        self._memory[key] = entities
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[int, Entities]:
+        """
+        Consulta vários textos de uma vez.
+
+        Returns:
+            Dicionário {índice em texts: entidades} apenas com os acertos
+        """
+        found = {}
+        missing = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = (model, text_hash(text))
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[i] = self._memory[key]
+                else:
+                    missing.setdefault(key[1], []).append(i)
+
+            if missing and self._db is not None:
+                hashes = list(missing)
+                # Limite de parâmetros do SQLite por consulta
+                for start in range(0, len(hashes), 500):
+                    part = hashes[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT hash, entities FROM entities WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                        [model, *part],
+                    ).fetchall()
+                    for digest, value in rows:
+                        entities = [tuple(entity) for entity in json.loads(value)]
+                        self._remember((model, digest), entities)
+                        for i in missing.pop(digest):
+                            found[i] = entities
+                            self.disk_hits += 1
+
+            self.hits += len(found)
+            self.misses += sum(len(indices) for indices in missing.values())
+        return found
+
+    def get(self, model: str, text: str) -> Optional[Entities]:
+        """Consulta um único texto (None se não estiver no cache)"""
+        return self.get_many(model, [text]).get(0)
+
+    def put_many(self, model: str, items: List[Tuple[str, Entities]]):
+        """Guarda os resultados de vários textos"""
+        with self._lock:
+            rows = []
+            for text, entities in items:
+                digest = text_hash(text)
+                self._remember((model, digest), list(entities))
+                rows.append((model, digest, json.dumps(entities)))
+            if rows and self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entities (model, hash, entities) VALUES (?, ?, ?)", rows
+                )
+                self._db.commit()
+
+    def put(self, model: str, text: str, entities: Entities):
+        """Guarda o resultado de um único texto"""
+        self.put_many(model, [(text, entities)])
+
+    def stats(self) -> dict:
+        """Contadores de acertos e falhas do cache"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,139 @@
+"""
+Execução paralela das etapas puramente de CPU (regex e apelidos).
+As mensagens são divididas em blocos e processadas em um pool de processos
+reutilizável, preservando a ordem original.
+
+Estado de módulo usado pelos workers (ex.: os padrões de regex) é registrado
+com share_worker_state: a configuração é aplicada em cada processo na criação
+do pool, e as estatísticas acumuladas em cada bloco voltam para este processo.
+"""
+
+import atexit
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from .utils import chunked
+
+# Número padrão de mensagens enviadas a cada worker por vez
+DEFAULT_CHUNK_SIZE = 2000
+
+# Pools já criados, por número de workers
+_pools = {}
+
+# Estado compartilhado com os workers, por nome: (configure, args, take_stats, merge_stats)
+_worker_states = {}
+
+# Nos workers: funções que coletam as estatísticas de cada estado (definidas por _init_worker)
+_stats_collectors = {}
+
+
+def share_worker_state(name: str, configure: Callable, args: tuple = (),
+                       take_stats: Optional[Callable] = None, merge_stats: Optional[Callable] = None):
+    """
+    Registra estado de módulo que os workers precisam ter.
+    Os pools existentes são encerrados, para que os próximos usem a nova configuração.
+
+    Args:
+        name: Nome do estado (um registro por nome)
+        configure: Função de nível de módulo chamada como configure(*args) em cada worker
+        args: Argumentos de configure (serializáveis com pickle)
+        take_stats: Função chamada no worker depois de cada tarefa; retorna as
+            estatísticas acumuladas desde a última chamada (None = nada a enviar)
+        merge_stats: Função que soma essas estatísticas neste processo
+    """
+    _worker_states[name] = (configure, args, take_stats, merge_stats)
+    shutdown_pools()
+
+
+def _init_worker(states: list):
+    """Aplica o estado compartilhado no worker (initializer do pool)"""
+    for name, configure, args, take_stats in states:
+        configure(*args)
+        if take_stats is not None:
+            _stats_collectors[name] = take_stats
+
+
+def call_in_worker(func: Callable, *args) -> Tuple[object, Dict[str, object]]:
+    """Executa func(*args) no worker e retorna (resultado, estatísticas acumuladas)"""
+    result = func(*args)
+    stats = {name: take_stats() for name, take_stats in _stats_collectors.items()}
+    return result, {name: delta for name, delta in stats.items() if delta is not None}
+
+
+def merge_worker_stats(stats: Dict[str, object]):
+    """Soma neste processo as estatísticas retornadas por call_in_worker"""
+    for name, delta in stats.items():
+        merge_stats = _worker_states[name][3]
+        if merge_stats is not None:
+            merge_stats(delta)
+
+
+def get_process_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Retorna um pool de processos reutilizável com o número de workers pedido.
+    Cada worker é configurado com o estado registrado em share_worker_state.
+
+    Args:
+        workers: Número de processos (padrão: número de CPUs)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers not in _pools:
+        states = [(name, configure, args, take_stats)
+                  for name, (configure, args, take_stats, _) in _worker_states.items()]
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(states,))
+    return _pools[workers]
+
+
+def shutdown_pools():
+    """Encerra todos os pools criados"""
+    for pool in _pools.values():
+        pool.shutdown()
+    _pools.clear()
+
+
+atexit.register(shutdown_pools)
+
+
+def _apply_to_chunk(func: Callable, chunk: list, args: tuple) -> list:
+    """Aplica func a cada mensagem do bloco (executado no worker)"""
+    return [func(message, *args) for message in chunk]
+
+
+def _chunk_result(future) -> list:
+    """Resultado de um bloco, somando as estatísticas do worker neste processo"""
+    result, stats = future.result()
+    merge_worker_stats(stats)
+    return result
+
+
+def parallel_map(func: Callable, messages: Iterable, *args, workers: Optional[int] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+    """
+    Aplica func(mensagem, *args) em paralelo, bloco a bloco, preservando a ordem.
+    Mantém no máximo 2 blocos por worker em processamento, então a memória
+    continua limitada mesmo para entradas muito grandes.
+
+    Args:
+        func: Função de nível de módulo (precisa ser serializável com pickle)
+        messages: Iterável de mensagens
+        args: Argumentos extras repassados a func
+        workers: Número de processos (padrão: número de CPUs)
+        chunk_size: Número de mensagens por bloco
+
+    Returns:
+        Gerador com os resultados na mesma ordem das mensagens
+    """
+    workers = workers or os.cpu_count() or 1
+    pool = get_process_pool(workers)
+    max_pending = 2 * workers
+    pending = deque()
+
+    for chunk in chunked(messages, chunk_size):
+        pending.append(pool.submit(call_in_worker, _apply_to_chunk, func, chunk, args))
+        if len(pending) >= max_pending:
+            yield from _chunk_result(pending.popleft())
+
+    while pending:
+        yield from _chunk_result(pending.popleft())
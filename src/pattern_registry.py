@@ -0,0 +1,328 @@
+"""
+Registro dos padrões da etapa de regex: padrões carregados de um arquivo (ou
+os embutidos), compilados uma única vez, com contabilidade por padrão
+(casamentos, mensagens atingidas e custo estimado) e um orçamento de tempo
+por mensagem contra backtracking catastrófico.
+
+Com o módulo regex instalado, a varredura das mensagens longas é
+interrompida ao estourar o orçamento e a mensagem é refeita padrão a padrão:
+com re2 (tempo linear) nos padrões que ele aceita e com o mesmo orçamento nos
+demais. Se ainda assim um padrão estourar, a mensagem inteira é substituída
+(falha fechada: nada sai sem anonimização). As mensagens curtas usam o re
+padrão, cerca de 2x mais rápido que o módulo regex. Sem o módulo regex, o
+orçamento é apenas medido e as mensagens lentas aparecem no relatório.
+"""
+import heapq
+import importlib.util
+import json
+import re
+import time
+from typing import Dict, List, Optional, Sequence
+
+from .spans import Annotation, resolve_spans
+from .whitelist import is_protected, protected_spans
+
+REGEX_AVAILABLE = importlib.util.find_spec("regex") is not None
+RE2_AVAILABLE = importlib.util.find_spec("re2") is not None
+
+# Orçamento padrão de tempo da varredura de uma mensagem
+DEFAULT_BUDGET_MS = 100.0
+
+# Mensagens a partir deste tamanho (caracteres) são varridas com limite de tempo
+DEFAULT_GUARD_MIN_LENGTH = 1000
+
+# A cada quantas mensagens cada padrão é medido separadamente (custo por padrão)
+DEFAULT_SAMPLE_EVERY = 100
+
+# Número de mensagens mais lentas guardadas para o relatório
+SLOWEST_MESSAGES = 10
+
+# Substitui a mensagem inteira quando nem o fallback termina dentro do orçamento
+TIMEOUT_REPLACEMENT = "[TEXTO_REMOVIDO]"
+
+_INLINE_FLAGS = re.compile(r"^\(\?([a-zA-Z]+)\)")
+
+
+def scoped_pattern(pattern: str) -> str:
+    """Converte flags globais no início do padrão, ex. (?ms), em flags locais (?ms:...)"""
+    match = _INLINE_FLAGS.match(pattern)
+    if match:
+        return f"(?{match.group(1)}:{pattern[match.end():]})"
+    return f"(?:{pattern})"
+
+
+def ordered_labels(patterns: dict, priority: Sequence[str] = ()) -> List[str]:
+    """Rótulos na ordem de prioridade (padrões fora de priority vão para o final)"""
+    labels = [label for label in priority if label in patterns]
+    return labels + [label for label in patterns if label not in labels]
+
+
+def compile_patterns(patterns: dict, priority: Sequence[str] = (), engine=re):
+    """
+    Compila os padrões em uma única alternância com grupos nomeados,
+    na ordem de prioridade.
+    """
+    alternation = "|".join(f"(?P<{label}>{scoped_pattern(patterns[label])})"
+                           for label in ordered_labels(patterns, priority))
+    return engine.compile(alternation, flags=engine.IGNORECASE)
+
+
+def load_patterns_file(path: str) -> Dict[str, str]:
+    """
+    Lê padrões de um arquivo JSON {"RÓTULO": "padrão", ...}; a ordem das
+    chaves é a ordem de prioridade.
+
+    Raises:
+        ValueError: Arquivo sem um objeto de padrões ou padrão inválido
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not all(isinstance(value, str) for value in data.values()):
+        raise ValueError(f"{path}: esperado um objeto JSON {{\"RÓTULO\": \"padrão\"}}")
+    for label, pattern in data.items():
+        if not label.isidentifier():
+            raise ValueError(f"{path}: rótulo inválido {label!r} (use letras, dígitos e _)")
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"{path}: padrão {label} inválido: {e}")
+    return data
+
+
+class PatternStats:
+    """Contadores de um padrão"""
+
+    def __init__(self):
+        self.matches = 0
+        self.messages = 0  # Mensagens com pelo menos um casamento
+        self.sampled = 0  # Mensagens em que o padrão foi medido separadamente
+        self.sampled_seconds = 0.0
+        self.timeouts = 0
+
+    def merge(self, other: "PatternStats"):
+        """Soma os contadores de other (ex.: de um worker)"""
+        self.matches += other.matches
+        self.messages += other.messages
+        self.sampled += other.sampled
+        self.sampled_seconds += other.sampled_seconds
+        self.timeouts += other.timeouts
+
+    def to_dict(self, total_messages: int) -> dict:
+        return {
+            "matches": self.matches,
+            "messages": self.messages,
+            "hit_rate": self.messages / total_messages if total_messages else 0.0,
+            "mean_us": self.sampled_seconds / self.sampled * 1e6 if self.sampled else 0.0,
+            "timeouts": self.timeouts,
+        }
+
+
+class PatternRegistry:
+    """Padrões compilados da etapa de regex, com medição e orçamento de tempo"""
+
+    def __init__(self, patterns: Dict[str, str], priority: Sequence[str] = (),
+                 budget_ms: Optional[float] = DEFAULT_BUDGET_MS, sample_every: int = DEFAULT_SAMPLE_EVERY,
+                 guard_min_length: int = DEFAULT_GUARD_MIN_LENGTH):
+        """
+        Args:
+            patterns: {rótulo: padrão}; a substituição é "[RÓTULO]" em maiúsculas
+            priority: Ordem de prioridade entre os padrões (ver regex_anon.PRIORITY)
+            budget_ms: Tempo máximo da varredura de uma mensagem (None = sem limite)
+            sample_every: A cada quantas mensagens medir cada padrão separadamente (0 = nunca)
+            guard_min_length: Tamanho a partir do qual a mensagem é varrida com limite de tempo
+                (0 = todas)
+        """
+        self.patterns = dict(patterns)
+        self.labels = ordered_labels(self.patterns, priority)
+        self.budget = budget_ms / 1000 if budget_ms else None
+        self.sample_every = sample_every
+        # O limite de tempo só é possível com o módulo regex; sem ele, o orçamento é apenas medido
+        self.enforced = bool(self.budget and REGEX_AVAILABLE)
+        self.guard_min_length = guard_min_length
+        self._combined = compile_patterns(self.patterns, self.labels)
+        self._single = _compile_each(self.patterns, re)
+        if self.enforced:
+            regex = _regex_module()
+            self._guarded = compile_patterns(self.patterns, self.labels, regex)
+            self._guarded_single = _compile_each(self.patterns, regex)
+        self._linear = _compile_linear(self.patterns) if self.enforced else {}
+        self.replacements = {label: f"[{label.upper()}]" for label in self.labels}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {label: PatternStats() for label in self.labels}
+        self.messages = 0
+        self.seconds = 0.0
+        self.over_budget = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self._slowest = []  # heap de (segundos, número da mensagem, tamanho)
+
+    def _push_slowest(self, entry: tuple):
+        if len(self._slowest) < SLOWEST_MESSAGES:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def take_stats(self) -> Optional[dict]:
+        """
+        Estatísticas acumuladas desde a última chamada, zerando os contadores
+        (None se nenhuma mensagem foi varrida). Usado nos workers do pool de processos.
+        """
+        if not self.messages:
+            return None
+        delta = {
+            "stats": self.stats,
+            "messages": self.messages,
+            "seconds": self.seconds,
+            "over_budget": self.over_budget,
+            "fallbacks": self.fallbacks,
+            "timeouts": self.timeouts,
+            "slowest": self._slowest,
+        }
+        self.reset_stats()
+        return delta
+
+    def merge_stats(self, delta: dict):
+        """Soma as estatísticas de take_stats (numerando as mensagens depois das já contadas)"""
+        offset = self.messages
+        for label, stats in delta["stats"].items():
+            self.stats[label].merge(stats)
+        self.messages += delta["messages"]
+        self.seconds += delta["seconds"]
+        self.over_budget += delta["over_budget"]
+        self.fallbacks += delta["fallbacks"]
+        self.timeouts += delta["timeouts"]
+        for seconds, number, length in delta["slowest"]:
+            self._push_slowest((seconds, offset + number, length))
+
+    def _guarded_scan(self, text: str) -> bool:
+        return self.enforced and len(text) >= self.guard_min_length
+    
+    def _scan(self, text: str) -> List[Annotation]:
+        """Varredura única com todos os padrões (interrompida pelo orçamento nas mensagens longas)"""
+        if self._guarded_scan(text):
+            matches = list(self._guarded.finditer(text, timeout=self.budget))
+        else:
+            matches = self._combined.finditer(text)
+        return [(match.start(), match.end(), match.lastgroup) for match in matches]
+
+    def _scan_fallback(self, text: str) -> List[Annotation]:
+        """
+        Refaz a mensagem padrão a padrão: re2 quando o padrão é aceito por ele,
+        senão o mesmo motor com o orçamento. Os trechos são combinados pela
+        prioridade dos padrões.
+        """
+        layers = []
+        for label in self.labels:
+            linear = self._linear.get(label)
+            if linear is not None:
+                matches = linear.finditer(text)
+            else:
+                try:
+                    matches = list(self._guarded_single[label].finditer(text, timeout=self.budget))
+                except TimeoutError:
+                    self.stats[label].timeouts += 1
+                    self.timeouts += 1
+                    return [(0, len(text), None)]
+            layers.append([(match.start(), match.end(), label) for match in matches])
+        return resolve_spans(layers)
+
+    def _sample(self, text: str):
+        """Mede cada padrão separadamente nesta mensagem (custo estimado por padrão)"""
+        guarded = self._guarded_scan(text)
+        for label, pattern in (self._guarded_single if guarded else self._single).items():
+            start = time.perf_counter()
+            try:
+                if guarded:
+                    for _ in pattern.finditer(text, timeout=self.budget):
+                        pass
+                else:
+                    for _ in pattern.finditer(text):
+                        pass
+            except TimeoutError:
+                pass
+            stats = self.stats[label]
+            stats.sampled += 1
+            stats.sampled_seconds += time.perf_counter() - start
+
+    def spans(self, text: str, whitelist=None) -> List[Annotation]:
+        """
+        Trechos (start, end, "[RÓTULO]") com dados sensíveis.
+        Casamentos contidos em palavras da whitelist são ignorados.
+        """
+        self.messages += 1
+        start = time.perf_counter()
+        try:
+            found = self._scan(text)
+        except TimeoutError:
+            self.fallbacks += 1
+            found = self._scan_fallback(text)
+        seconds = time.perf_counter() - start
+        self.seconds += seconds
+
+        if self.budget and seconds > self.budget:
+            self.over_budget += 1
+        self._push_slowest((seconds, self.messages, len(text)))
+        if self.sample_every and self.messages % self.sample_every == 0:
+            self._sample(text)
+
+        if found and found[0][2] is None:
+            # Nem o fallback terminou no orçamento: nada da mensagem é mantido
+            return [(0, len(text), TIMEOUT_REPLACEMENT)]
+
+        protected = protected_spans(text, whitelist)
+        result = []
+        hit_labels = set()
+        for span_start, span_end, label in found:
+            if protected and is_protected(protected, span_start, span_end):
+                continue
+            self.stats[label].matches += 1
+            hit_labels.add(label)
+            result.append((span_start, span_end, self.replacements[label]))
+        for label in hit_labels:
+            self.stats[label].messages += 1
+        return result
+
+    def report(self) -> dict:
+        """Relatório: padrões (casamentos, taxa de acerto, custo médio) e mensagens mais lentas"""
+        return {
+            "messages": self.messages,
+            "seconds": self.seconds,
+            "budget_ms": self.budget * 1000 if self.budget else None,
+            "enforced": self.enforced,
+            "over_budget": self.over_budget,
+            "fallbacks": self.fallbacks,
+            "timeouts": self.timeouts,
+            "patterns": {label: self.stats[label].to_dict(self.messages) for label in self.labels},
+            "slowest_messages": [
+                {"message": number, "length": length, "ms": seconds * 1000}
+                for seconds, number, length in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+
+def _regex_module():
+    import regex
+    return regex
+
+
+def _compile_each(patterns: Dict[str, str], engine) -> dict:
+    """Compila cada padrão separadamente (fallback e medição por padrão)"""
+    return {label: engine.compile(scoped_pattern(pattern), flags=engine.IGNORECASE)
+            for label, pattern in patterns.items()}
+
+
+def _compile_linear(patterns: Dict[str, str]) -> dict:
+    """Compila com re2 (tempo linear) os padrões que ele aceita (sem lookaround, por exemplo)"""
+    if not RE2_AVAILABLE:
+        return {}
+    import re2
+
+    compiled = {}
+    for label, pattern in patterns.items():
+        try:
+            compiled[label] = re2.compile("(?i)" + scoped_pattern(pattern))
+        except Exception:
+            continue
+    return compiled
@@ -4,11 +4,19 @@ Processa mensagens já estruturadas no formato genérico (timestamp, sender, mes
 """
 
 import os
-from .chat_message import load_messages_from_file, save_messages_to_file, save_messages_comparison_to_file
-from .id_anon import anonymize_chat_message_id
-from .regex_anon import anonymize_chat_message
-from .apelidos import anonimizar_apelidos_chat_message
-from .pt_bert_local import anonymize_chat_message_bert
+from functools import partial
+from .records import read_messages, record_format, tee_messages, write_messages
+from .id_anon import anonymize_chat_message_id, anonymize_sender_id, mention_spans
+from .regex_anon import anonymize_chat_message, regex_spans
+from .apelidos import anonimizar_apelidos, anonimizar_apelidos_chat_message, apelidos_spans, compile_apelidos
+from .pt_bert_local import anonymize_chat_messages_bert, get_anonymizer, ner_spans_batch, DEFAULT_BATCH_SIZE
+from .spans import SPAN_PRIORITY, render_spans, resolve_spans
+from .utils import chunked
+from .whitelist import compile_whitelist
+from .parallel import parallel_map, DEFAULT_CHUNK_SIZE
+
+# Número de mensagens lidas por vez na etapa BERT (memória limitada a um bloco)
+BERT_CHUNK_SIZE = 1024
 
 
 def process_with_id(input_file, output_clean, output_all, whitelist):
@@ -21,26 +29,37 @@ def process_with_id(input_file, output_clean, output_all, whitelist):
         output_all: Arquivo de saída com todas as transformações
         whitelist: Lista de palavras protegidas
     """
-    messages = load_messages_from_file(input_file)
-    clean_messages = []
-    all_messages = []
-    
-    for message in messages:
-        # Na primeira etapa, garantir que original_* são realmente originais
-        if not hasattr(message, 'original_sender') or message.original_sender is None:
-            message.original_sender = message.sender
-        if not hasattr(message, 'original_message') or message.original_message is None:
-            message.original_message = message.message
-            
-        processed_msg = anonymize_chat_message_id(message)
-        clean_messages.append(processed_msg)
-        all_messages.append(processed_msg)  # Mesmo objeto para ambos
+    # Whitelist compilada uma única vez em um matcher
+    whitelist_matcher = compile_whitelist(whitelist)
     
-    save_messages_to_file(clean_messages, output_clean)  # Apenas anonimizado
-    save_messages_comparison_to_file(all_messages, output_all)  # Comparação
+    # Lê, processa e grava uma mensagem por vez
+    processed = (anonymize_chat_message_id(message, whitelist_matcher, inplace=True)
+                 for message in read_messages(input_file))
+    write_messages(processed, output_clean, output_all)
+
+
+def _apply_stage(func, messages, *args, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Aplica func a cada mensagem, em série ou em um pool de processos se workers > 1.
+    As mensagens pertencem ao pipeline, então são alteradas no lugar (inplace=True).
+    """
+    if workers and workers > 1:
+        return parallel_map(partial(func, inplace=True), messages, *args, workers=workers, chunk_size=chunk_size)
+    return (func(message, *args, inplace=True) for message in messages)
+
+
+def _read_stage_input(input_file, workers=None):
+    """Lê a saída da etapa anterior: registros (JSONL/Parquet) ou, em texto, o arquivo _all.txt se existir"""
+    if record_format(input_file):
+        return read_messages(input_file)
+    input_all_file = input_file.replace('.txt', '_all.txt')
+    if os.path.exists(input_all_file):
+        return read_messages(input_all_file, workers)
+    return read_messages(input_file, workers)
 
 
-def process_with_regex(input_file, output_clean, output_all, whitelist):
+def process_with_regex(input_file, output_clean, output_all, whitelist,
+                       workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Etapa 2: Anonimização usando regex para dados sensíveis.
     
@@ -49,27 +68,17 @@ def process_with_regex(input_file, output_clean, output_all, whitelist):
         output_clean: Arquivo de saída apenas com mensagens processadas
         output_all: Arquivo de saída com todas as transformações
         whitelist: Lista de palavras protegidas
+        workers: Número de processos (None ou 1 = execução em série)
+        chunk_size: Número de mensagens enviadas a cada worker por vez
     """
-    # Ler do arquivo _all.txt da etapa anterior se existir
-    input_all_file = input_file.replace('.txt', '_all.txt')
-    if os.path.exists(input_all_file):
-        messages = load_messages_from_file(input_all_file)
-    else:
-        messages = load_messages_from_file(input_file)
-    
-    clean_messages = []
-    all_messages = []
-    
-    for message in messages:
-        processed_msg = anonymize_chat_message(message)
-        clean_messages.append(processed_msg)
-        all_messages.append(processed_msg)  # Mesmo objeto para ambos
-    
-    save_messages_to_file(clean_messages, output_clean)  # Apenas anonimizado
-    save_messages_comparison_to_file(all_messages, output_all)  # Comparação
+    messages = _read_stage_input(input_file, workers)
+    processed = _apply_stage(anonymize_chat_message, messages, compile_whitelist(whitelist),
+                             workers=workers, chunk_size=chunk_size)
+    write_messages(processed, output_clean, output_all)
 
 
-def process_with_apelidos(input_file, output_clean, output_all, apelidos_lista, whitelist):
+def process_with_apelidos(input_file, output_clean, output_all, apelidos_lista, whitelist,
+                          workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
     """
     Etapa 3: Anonimização usando lista de apelidos.
     
@@ -79,27 +88,26 @@ def process_with_apelidos(input_file, output_clean, output_all, apelidos_lista,
         output_all: Arquivo de saída com todas as transformações
         apelidos_lista: Lista de apelidos para anonimizar
         whitelist: Lista de palavras protegidas
+        workers: Número de processos (None ou 1 = execução em série)
+        chunk_size: Número de mensagens enviadas a cada worker por vez
     """
-    # Ler do arquivo _all.txt da etapa anterior se existir
-    input_all_file = input_file.replace('.txt', '_all.txt')
-    if os.path.exists(input_all_file):
-        messages = load_messages_from_file(input_all_file)
-    else:
-        messages = load_messages_from_file(input_file)
-    
-    clean_messages = []
-    all_messages = []
-    
-    for message in messages:
-        processed_msg = anonimizar_apelidos_chat_message(message, apelidos_lista)
-        clean_messages.append(processed_msg)
-        all_messages.append(processed_msg)  # Mesmo objeto para ambos
+    messages = _read_stage_input(input_file, workers)
     
-    save_messages_to_file(clean_messages, output_clean)  # Apenas anonimizado
-    save_messages_comparison_to_file(all_messages, output_all)  # Comparação
+    # Lista de apelidos compilada uma única vez em um matcher
+    apelidos_matcher = compile_apelidos(apelidos_lista)
+    processed = _apply_stage(anonimizar_apelidos_chat_message, messages, apelidos_matcher, compile_whitelist(whitelist),
+                             workers=workers, chunk_size=chunk_size)
+    write_messages(processed, output_clean, output_all)
 
 
-def process_with_bert(input_file, output_clean, output_all, whitelist):
+def _bert_batches(messages, batch_size, chunk_size, whitelist_matcher):
+    """Aplica o BERT em blocos de chunk_size mensagens, com inferência em lotes de batch_size"""
+    for chunk in chunked(messages, chunk_size):
+        yield from anonymize_chat_messages_bert(chunk, batch_size, whitelist_matcher, inplace=True)
+
+
+def process_with_bert(input_file, output_clean, output_all, whitelist,
+                      batch_size=DEFAULT_BATCH_SIZE, chunk_size=BERT_CHUNK_SIZE):
     """
     Etapa 4: Anonimização usando BERT para detecção de entidades.
     
@@ -108,22 +116,16 @@ def process_with_bert(input_file, output_clean, output_all, whitelist):
         output_clean: Arquivo de saída apenas com mensagens processadas
         output_all: Arquivo de saída com todas as transformações
         whitelist: Lista de palavras protegidas
+        batch_size: Número máximo de mensagens por forward pass
+        chunk_size: Número de mensagens lidas por vez (agrupadas por tamanho dentro do bloco)
         
     Returns:
         bool: True se o processamento foi bem-sucedido, False caso contrário
     """
     try:
-        messages = load_messages_from_file(input_file)
-        clean_messages = []
-        all_messages = []
-        
-        for message in messages:
-            processed_msg = anonymize_chat_message_bert(message)
-            clean_messages.append(processed_msg)
-            all_messages.append(processed_msg)  # Mesmo objeto para ambos
-        
-        save_messages_to_file(clean_messages, output_clean)  # Apenas anonimizado
-        save_messages_comparison_to_file(all_messages, output_all)  # Comparação
+        messages = read_messages(input_file)
+        processed = _bert_batches(messages, batch_size, chunk_size, compile_whitelist(whitelist))
+        write_messages(processed, output_clean, output_all)
         return True
         
     except Exception as e:
@@ -132,6 +134,193 @@ def process_with_bert(input_file, output_clean, output_all, whitelist):
         
         # Copiar arquivo da etapa anterior se BERT falhar
         import shutil
-        shutil.copy2(input_file, output_clean)
-        shutil.copy2(input_file, output_all)
-        return False
\ No newline at end of file
+        if record_format(input_file):
+            if record_format(input_file) == record_format(output_all):
+                shutil.copy2(input_file, output_all)
+            else:
+                write_messages(read_messages(input_file), output_clean, output_all)
+        else:
+            shutil.copy2(input_file, output_clean)
+            shutil.copy2(input_file, output_all)
+        return False
+
+# Nomes das etapas, na ordem em que são aplicadas
+STAGES = ("id", "regex", "apelidos", "bert")
+
+
+def _dump_stage(messages, dumps, stage):
+    """Grava os arquivos intermediários de uma etapa à medida que as mensagens passam, se solicitado em dumps"""
+    if dumps and stage in dumps:
+        stage_clean, stage_all = dumps[stage]
+        return tee_messages(messages, stage_clean, stage_all)
+    return messages
+
+
+def bert_ready(state) -> bool:
+    """
+    True se a etapa BERT pode rodar. Sem o modelo, as mensagens passariam sem
+    alteração, então a etapa é marcada como não executada em state["bert_success"].
+    """
+    if state["bert_success"] and not get_anonymizer().initialize():
+        state["bert_success"] = False
+    return state["bert_success"]
+
+
+def _bert_stage(messages, state, batch_size, chunk_size, whitelist_matcher):
+    """Aplica o BERT em blocos; em caso de erro, repassa as mensagens sem alteração"""
+    for chunk in chunked(messages, chunk_size):
+        if bert_ready(state):
+            try:
+                chunk = anonymize_chat_messages_bert(chunk, batch_size, whitelist_matcher, inplace=True)
+            except Exception as e:
+                print(f"⚠️  Erro no processamento BERT: {e}")
+                print("📝 Mantendo resultado da etapa anterior...")
+                state["bert_success"] = False
+        yield from chunk
+
+
+def anonymize_stream(messages, apelidos_lista, whitelist, state, dumps=None,
+                     batch_size=DEFAULT_BATCH_SIZE, chunk_size=BERT_CHUNK_SIZE,
+                     workers=None, worker_chunk_size=DEFAULT_CHUNK_SIZE, stages=STAGES):
+    """
+    Encadeia as etapas pedidas sobre um iterável de mensagens, sem ler nem
+    gravar arquivos (exceto os dumps opcionais). Os parâmetros são os mesmos
+    de process_fused.
+    
+    Args:
+        state: Dicionário preenchido com "bert_success" ao final do consumo
+        
+    Returns:
+        Gerador com as mensagens anonimizadas
+    """
+    whitelist_matcher = compile_whitelist(whitelist)
+    
+    if "id" in stages:
+        messages = (anonymize_chat_message_id(message, whitelist_matcher, inplace=True) for message in messages)
+        messages = _dump_stage(messages, dumps, "id")
+    
+    if "regex" in stages:
+        messages = _apply_stage(anonymize_chat_message, messages, whitelist_matcher,
+                                workers=workers, chunk_size=worker_chunk_size)
+        messages = _dump_stage(messages, dumps, "regex")
+    
+    if "apelidos" in stages:
+        messages = _apply_stage(anonimizar_apelidos_chat_message, messages,
+                                compile_apelidos(apelidos_lista), whitelist_matcher,
+                                workers=workers, chunk_size=worker_chunk_size)
+        messages = _dump_stage(messages, dumps, "apelidos")
+    
+    state["bert_success"] = "bert" in stages
+    if "bert" in stages:
+        messages = _bert_stage(messages, state, batch_size, chunk_size, whitelist_matcher)
+    
+    return messages
+
+
+def process_fused(input_file, output_clean, output_all, apelidos_lista, whitelist, dumps=None,
+                  batch_size=DEFAULT_BATCH_SIZE, chunk_size=BERT_CHUNK_SIZE,
+                  workers=None, worker_chunk_size=DEFAULT_CHUNK_SIZE, stages=STAGES):
+    """
+    Pipeline completo em memória: as 4 etapas são aplicadas em sequência sobre os
+    mesmos objetos ChatMessage, sem gravar e reler arquivos intermediários.
+    As mensagens fluem uma a uma por todas as etapas, então o uso de memória
+    não depende do tamanho do arquivo.
+    
+    Args:
+        input_file: Arquivo de entrada com mensagens
+        output_clean: Arquivo de saída final apenas com mensagens processadas
+        output_all: Arquivo de saída final com todas as transformações
+        apelidos_lista: Lista de apelidos para anonimizar
+        whitelist: Lista de palavras protegidas
+        dumps: Dicionário opcional {etapa: (arquivo_limpo, arquivo_all)} com as
+            etapas intermediárias que devem ser salvas em disco
+        batch_size: Número máximo de mensagens por forward pass do BERT
+        chunk_size: Número de mensagens agrupadas por vez na etapa BERT
+        workers: Número de processos para as etapas de regex e apelidos (None ou 1 = em série)
+        worker_chunk_size: Número de mensagens enviadas a cada worker por vez
+        stages: Etapas a aplicar (padrão: todas, ver STAGES)
+        
+    Returns:
+        bool: True se a etapa BERT foi executada com sucesso, False caso contrário
+        (inclusive quando a etapa não foi pedida em stages)
+    """
+    state = {}
+    messages = anonymize_stream(read_messages(input_file, workers), apelidos_lista, whitelist, state,
+                                dumps, batch_size, chunk_size, workers, worker_chunk_size, stages)
+    write_messages(messages, output_clean, output_all)
+    return state["bert_success"]
+
+
+def annotate_stream(messages, apelidos_lista, whitelist, state,
+                    batch_size=DEFAULT_BATCH_SIZE, chunk_size=BERT_CHUNK_SIZE, stages=STAGES):
+    """
+    Aplica as etapas como anotações: cada etapa marca trechos (start, end, substituição)
+    sobre o texto original da mensagem, os trechos sobrepostos são resolvidos por
+    prioridade (ver SPAN_PRIORITY) e o texto final é montado uma única vez.
+    Assim nenhuma etapa vê a saída de outra (ex.: o BERT não analisa "[CHAVE_API]"
+    e o regex não analisa "@user_3").
+    
+    Args:
+        state: Dicionário preenchido com "bert_success" ao final do consumo
+        
+    Returns:
+        Gerador com as mensagens anonimizadas
+    """
+    whitelist_matcher = compile_whitelist(whitelist)
+    apelidos_matcher = compile_apelidos(apelidos_lista)
+    state["bert_success"] = "bert" in stages
+    
+    for chunk in chunked(messages, chunk_size):
+        texts = [message.message for message in chunk]
+        ner_layers = None
+        if bert_ready(state):
+            try:
+                ner_layers = ner_spans_batch(texts, batch_size, whitelist_matcher)
+            except Exception as e:
+                print(f"⚠️  Erro no processamento BERT: {e}")
+                print("📝 Mantendo apenas as demais etapas...")
+                state["bert_success"] = False
+        
+        for i, message in enumerate(chunk):
+            text = texts[i]
+            layers = {
+                "regex": regex_spans(text, whitelist_matcher) if "regex" in stages else [],
+                "id": mention_spans(text, whitelist_matcher) if "id" in stages else [],
+                "apelidos": apelidos_spans(text, apelidos_matcher, whitelist_matcher) if "apelidos" in stages else [],
+                "bert": ner_layers[i] if ner_layers else [],
+            }
+            spans = resolve_spans([layers[stage] for stage in SPAN_PRIORITY])
+            
+            sender = message.sender
+            if "id" in stages:
+                sender = anonymize_sender_id(sender, whitelist_matcher)
+            if "apelidos" in stages:
+                sender = anonimizar_apelidos(sender, apelidos_matcher, whitelist_matcher)
+            
+            yield message.update(sender=sender, message=render_spans(text, spans), inplace=True)
+
+
+def process_annotated(input_file, output_clean, output_all, apelidos_lista, whitelist,
+                      batch_size=DEFAULT_BATCH_SIZE, chunk_size=BERT_CHUNK_SIZE, stages=STAGES):
+    """
+    Pipeline por anotações: todas as etapas analisam o texto original e o
+    resultado é montado uma única vez por mensagem (ver annotate_stream).
+    
+    Args:
+        input_file: Arquivo de entrada com mensagens
+        output_clean: Arquivo de saída final apenas com mensagens processadas
+        output_all: Arquivo de saída final com todas as transformações
+        apelidos_lista: Lista de apelidos para anonimizar
+        whitelist: Lista de palavras protegidas
+        batch_size: Número máximo de mensagens por forward pass do BERT
+        chunk_size: Número de mensagens agrupadas por vez na etapa BERT
+        stages: Etapas a aplicar (padrão: todas, ver STAGES)
+        
+    Returns:
+        bool: True se a etapa BERT foi executada com sucesso, False caso contrário
+    """
+    state = {}
+    messages = annotate_stream(read_messages(input_file), apelidos_lista, whitelist, state,
+                               batch_size, chunk_size, stages)
+    write_messages(messages, output_clean, output_all)
+    return state["bert_success"]
@@ -2,51 +2,247 @@
 Processamento BERT 100% local para anonimização de entidades nomeadas.
 Não utiliza APIs externas, apenas modelos baixados localmente.
 """
+import importlib.util
 import os
+import re
 import sys
+from bisect import bisect_right
+from collections import Counter
 from typing import List, Tuple, Optional
+from .metrics import count_replacement
+from .spans import Annotation
+from .whitelist import protected_spans, is_protected
+from .ner_cache import NerCache
+from .parallel import share_worker_state
+from .utils import get_cache_dir
 
-try:
-    from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
-    import torch
-    BERT_AVAILABLE = True
-except ImportError:
-    BERT_AVAILABLE = False
-    print("⚠️  Dependências BERT não encontradas. Instalando...")
-    print("Execute: pip install torch transformers")
+# torch e transformers só são importados quando o modelo é carregado (etapa 4),
+# para que as etapas de ID/regex/apelidos iniciem rapidamente
+BERT_AVAILABLE = (importlib.util.find_spec("transformers") is not None
+                  and importlib.util.find_spec("torch") is not None)
+
+# Número padrão de mensagens por forward pass no modo em lote
+DEFAULT_BATCH_SIZE = 32
+
+# Backends de inferência disponíveis:
+#   torch     - PyTorch fp32 (padrão)
+#   int8      - PyTorch com quantização dinâmica int8 das camadas lineares
+#   onnx      - grafo ONNX exportado, executado com onnxruntime (requer optimum[onnxruntime])
+#   onnx-int8 - grafo ONNX com quantização dinâmica int8
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+# Empacotamento de mensagens (--ner-pack): mensagens consecutivas vão juntas em
+# uma única sequência, separadas por PACK_SEPARATOR (um token de pontuação)
+PACK_SEPARATOR = " | "
+
+# Limite de tokens de uma sequência empacotada (512 do BERT menos [CLS] e [SEP])
+MAX_PACK_TOKENS = 510
+
+# Respostas curtas comuns que nunca contêm nomes
+COMMON_REPLIES = frozenset("""
+ok okay blz beleza sim s não nao n obrigado obrigada obg brigado vlw valeu
+bom boa dia tarde noite oi olá ola opa eai tchau td tudo bem certo show top
+perfeito massa rs uhum aham pode ser claro combinado entendi isso sei
+também tambem tbm tb já ja agora depois hoje amanhã amanha ontem e o a de
+que pra para por favor pfv pf bora vamos verdade exato nada ainda mesmo
+""".split())
+
+_PLACEHOLDER_RE = re.compile(r"\[[A-Z_]+\]")
+_NON_TEXT_RE = re.compile(r"\[[A-Z_]+\]|@user_\d+|(?:https?://|www\.)\S+")
+_WORD_RE = re.compile(r"[^\W\d_]+")
+_LAUGH_RE = re.compile(r"^(?:k+|(?:ha)+h?|(?:he)+h?|(?:hi)+h?|rs+)$")
+
+class NerGate:
+    """
+    Filtro barato que decide, por mensagem, se a inferência NER é necessária.
+    Mensagens puladas passam sem alteração. Regras (em ordem):
+    
+    1. Texto sem letras depois de remover placeholders ([CPF], [PESSOA]...),
+       menções @user_N e URLs -> pula (emoji, números, links, já anonimizado)
+    2. Alguma palavra do léxico de nomes conhecidos -> roda o NER
+    3. Todas as palavras são respostas comuns ("ok", "bom dia", "kkk") -> pula
+    4. Opcional: sem nenhuma letra maiúscula -> pula (perde nomes em minúsculas)
+    5. Opcional: placeholders ocupam pelo menos placeholder_ratio do texto -> pula
+    """
+    
+    def __init__(self, lexicon: Optional[List[str]] = None, skip_lowercase: bool = False,
+                 placeholder_ratio: Optional[float] = None, enabled: bool = True):
+        """
+        Args:
+            lexicon: Nomes conhecidos; se aparecerem, o NER sempre roda
+            skip_lowercase: Pula mensagens sem letras maiúsculas
+            placeholder_ratio: Pula mensagens em que placeholders ocupam esta fração do texto
+            enabled: Desativa o filtro (todas as mensagens passam pelo NER)
+        """
+        self.lexicon = frozenset(name.lower() for name in lexicon or [])
+        self.skip_lowercase = skip_lowercase
+        self.placeholder_ratio = placeholder_ratio
+        self.enabled = enabled
+        self.checked = 0
+        self.skipped = {}
+    
+    def _skip_reason(self, text: str) -> Optional[str]:
+        remaining = _NON_TEXT_RE.sub(" ", text)
+        words = _WORD_RE.findall(remaining)
+        if not words:
+            return "sem_texto"
+        
+        lowered = [word.lower() for word in words]
+        if self.lexicon and any(word in self.lexicon for word in lowered):
+            return None
+        
+        if all(word in COMMON_REPLIES or _LAUGH_RE.match(word) for word in lowered):
+            return "resposta_comum"
+        
+        if self.skip_lowercase and not any(char.isupper() for char in remaining):
+            return "minusculas"
+        
+        if self.placeholder_ratio is not None:
+            covered = sum(len(match) for match in _PLACEHOLDER_RE.findall(text))
+            if covered >= self.placeholder_ratio * len(text.strip()):
+                return "placeholders"
+        
+        return None
+    
+    def needs_ner(self, text: str) -> bool:
+        """Retorna True se a mensagem precisa passar pelo modelo"""
+        if not self.enabled:
+            return True
+        self.checked += 1
+        reason = self._skip_reason(text)
+        if reason is None:
+            return True
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        return False
+    
+    def stats(self) -> dict:
+        """Mensagens avaliadas, puladas (por motivo) e taxa de mensagens puladas"""
+        skipped = sum(self.skipped.values())
+        return {
+            "checked": self.checked,
+            "skipped": skipped,
+            "skip_ratio": skipped / self.checked if self.checked else 0.0,
+            "by_reason": dict(self.skipped),
+        }
 
 class LocalBertAnonymizer:
     """Anonimizador BERT 100% local"""
     
-    def __init__(self, model_name: str = "neuralmind/bert-base-portuguese-cased"):
+    def __init__(self, model_name: str = "neuralmind/bert-base-portuguese-cased", cache: Optional[NerCache] = None,
+                 gate: Optional[NerGate] = None, backend: str = "torch"):
         """
         Inicializa o anonimizador com modelo local.
         
         Args:
             model_name: Nome do modelo HuggingFace para NER em português
+            cache: Cache de resultados NER (padrão: LRU apenas em memória)
+            gate: Filtro de mensagens que não precisam de NER (padrão: regras conservadoras)
+            backend: Backend de inferência (ver BACKENDS)
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend inválido: {backend}. Opções: {', '.join(BACKENDS)}")
         self.model_name = model_name
+        self.backend = backend
         self.tokenizer = None
         self.model = None
         self.pipe = None
         self.initialized = False
+        self._warned_unavailable = False
+        self.cache = cache if cache is not None else NerCache()
+        self.gate = gate if gate is not None else NerGate()
+        self.loaded_model = None  # Modelo efetivamente carregado (chave do cache)
+        self.batch_sizes = Counter()  # Número de forward passes por tamanho de lote
+        self.pool = None  # InferencePool: os forward passes rodam nas réplicas em vez de self.pipe
+        self.pack_tokens = None  # Empacota mensagens em sequências de até pack_tokens tokens (None = uma por sequência)
+        self.packed_messages = 0  # Mensagens inferidas dentro de sequências empacotadas
+        
+    def _model_cache_dir(self, model_id: str, variant: str) -> str:
+        """Diretório local onde ficam os modelos exportados/quantizados (ao lado do cache do HF)"""
+        return get_cache_dir("models", model_id.replace("/", "--"), variant)
+    
+    def _load_onnx_model(self, model_id: str, quantize: bool):
+        """
+        Exporta o modelo para ONNX (uma única vez) e carrega com onnxruntime.
+        Com quantize=True, aplica quantização dinâmica int8 ao grafo exportado.
+        """
+        from optimum.onnxruntime import ORTModelForTokenClassification
+        
+        export_dir = self._model_cache_dir(model_id, "onnx")
+        if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+            print(f"🔧 Exportando {model_id} para ONNX (apenas na primeira vez)...")
+            model = ORTModelForTokenClassification.from_pretrained(model_id, export=True)
+            model.save_pretrained(export_dir)
         
+        if not quantize:
+            return ORTModelForTokenClassification.from_pretrained(export_dir)
+        
+        quantized_file = os.path.join(export_dir, "model_quantized.onnx")
+        if not os.path.exists(quantized_file):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            print("🔧 Quantizando modelo ONNX para int8 (apenas na primeira vez)...")
+            quantize_dynamic(os.path.join(export_dir, "model.onnx"), quantized_file, weight_type=QuantType.QInt8)
+        return ORTModelForTokenClassification.from_pretrained(export_dir, file_name="model_quantized.onnx")
+    
+    def _load_int8_model(self, model_id: str):
+        """Quantiza dinamicamente as camadas lineares do modelo PyTorch para int8 (com cache local)"""
+        import torch
+        from transformers import AutoModelForTokenClassification
+        
+        quantized_file = os.path.join(self._model_cache_dir(model_id, "int8"), "model.pt")
+        if os.path.exists(quantized_file):
+            try:
+                return torch.load(quantized_file, weights_only=False)
+            except TypeError:
+                # Versões antigas do torch não têm weights_only
+                return torch.load(quantized_file)
+        
+        print("🔧 Quantizando modelo PyTorch para int8 (apenas na primeira vez)...")
+        model = AutoModelForTokenClassification.from_pretrained(model_id)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        torch.save(model, quantized_file)
+        return model
+    
+    def _build_pipeline(self, model_id: str) -> None:
+        """Carrega tokenizer e modelo no backend escolhido e monta o pipeline de NER"""
+        from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        
+        if self.backend == "onnx":
+            self.model = self._load_onnx_model(model_id, quantize=False)
+        elif self.backend == "onnx-int8":
+            self.model = self._load_onnx_model(model_id, quantize=True)
+        elif self.backend == "int8":
+            self.model = self._load_int8_model(model_id)
+        else:
+            self.model = AutoModelForTokenClassification.from_pretrained(model_id)
+        
+        # A agregação é a mesma em todos os backends
+        self.pipe = pipeline("token-classification", 
+                           model=self.model, 
+                           tokenizer=self.tokenizer,
+                           aggregation_strategy="simple")
+        
+        # Resultados de backends diferentes não são misturados no cache
+        self.loaded_model = model_id if self.backend == "torch" else f"{model_id}@{self.backend}"
+    
     def _download_model_if_needed(self) -> bool:
         """
         Baixa o modelo se não estiver disponível localmente.
         Só baixa uma vez, depois usa cache local.
         """
         try:
-            print(f"🔄 Carregando modelo BERT local: {self.model_name}")
+            print(f"🔄 Carregando modelo BERT local: {self.model_name} (backend: {self.backend})")
             
             # Tentar primeiro com modelo específico para NER português
             try:
-                self.tokenizer = AutoTokenizer.from_pretrained("lfcc/bert-portuguese-ner")
-                self.model = AutoModelForTokenClassification.from_pretrained("lfcc/bert-portuguese-ner")
-                self.pipe = pipeline("token-classification", 
-                                   model=self.model, 
-                                   tokenizer=self.tokenizer,
-                                   aggregation_strategy="simple")
+                self._build_pipeline("lfcc/bert-portuguese-ner")
+                print("✅ Modelo NER português carregado com sucesso!")
+                return True
+            except ImportError as e:
+                print(f"⚠️  Backend {self.backend} não disponível ({e}), usando torch")
+                self.backend = "torch"
+                self._build_pipeline("lfcc/bert-portuguese-ner")
                 print("✅ Modelo NER português carregado com sucesso!")
                 return True
             except Exception as e:
@@ -54,12 +250,7 @@ class LocalBertAnonymizer:
                 print("🔄 Tentando modelo BERT base português...")
                 
                 # Fallback para modelo base português
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-                self.model = AutoModelForTokenClassification.from_pretrained(self.model_name)
-                self.pipe = pipeline("token-classification", 
-                                   model=self.model, 
-                                   tokenizer=self.tokenizer,
-                                   aggregation_strategy="simple")
+                self._build_pipeline(self.model_name)
                 print("✅ Modelo BERT base carregado com sucesso!")
                 return True
                 
@@ -73,13 +264,38 @@ class LocalBertAnonymizer:
         if self.initialized:
             return True
             
+        if self.pool is not None:
+            # O modelo é carregado apenas nas réplicas
+            self.loaded_model = self.pool.start()
+            self.initialized = self.loaded_model is not None
+            return self.initialized
+            
         if not BERT_AVAILABLE:
+            if not self._warned_unavailable:
+                print("⚠️  Dependências BERT não encontradas.")
+                print("Execute: pip install torch transformers")
+                self._warned_unavailable = True
             return False
             
         success = self._download_model_if_needed()
         self.initialized = success
         return success
     
+    def _filter_entities(self, results) -> List[Tuple[int, int, str]]:
+        """Filtra apenas entidades PERSON da saída do pipeline, ordenadas por posição"""
+        entities = []
+        for result in results:
+            if result['entity_group'].upper() in ['PERSON', 'PER', 'PESSOA']:
+                entities.append((
+                    result['start'],
+                    result['end'], 
+                    'PESSOA'
+                ))
+        
+        # Ordenar por posição
+        entities.sort(key=lambda x: x[0])
+        return entities
+    
     def extract_entities(self, text: str) -> List[Tuple[int, int, str]]:
         """
         Extrai entidades nomeadas do texto usando BERT local.
@@ -90,43 +306,179 @@ class LocalBertAnonymizer:
         Returns:
             Lista de tuplas (start, end, label) com as entidades encontradas
         """
-        if not self.initialize():
+        if not self.gate.needs_ner(text) or not self.initialize():
             return []
+        
+        cached = self.cache.get(self.loaded_model, text)
+        if cached is not None:
+            return cached
             
         try:
             # Processar com BERT
-            results = self.pipe(text)
-            
-            # Filtrar apenas entidades PERSON
-            entities = []
-            for result in results:
-                if result['entity_group'].upper() in ['PERSON', 'PER', 'PESSOA']:
-                    entities.append((
-                        result['start'],
-                        result['end'], 
-                        'PESSOA'
-                    ))
-            
-            # Ordenar por posição
-            entities.sort(key=lambda x: x[0])
+            output = self.pool.infer([text])[0] if self.pool is not None else self.pipe(text)
+            entities = self._filter_entities(output)
+            self.cache.put(self.loaded_model, text, entities)
             return entities
             
         except Exception as e:
             print(f"⚠️  Erro ao processar texto com BERT: {e}")
             return []
     
-    def anonymize_text(self, text: str) -> str:
+    def batch_stats(self) -> dict:
+        """Número de forward passes em lote, distribuição dos tamanhos de lote e mensagens por sequência"""
+        batches = sum(self.batch_sizes.values())
+        texts = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "batches": batches,
+            "texts": texts,
+            "mean_batch_size": texts / batches if batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            # Com --ner-pack, cada texto do lote é uma sequência com várias mensagens
+            "messages_per_sequence": self.packed_messages / texts if self.packed_messages and texts else 1.0,
+        }
+    
+    @property
+    def cache_model(self) -> Optional[str]:
+        """Chave do cache do modo em lote: resultados com contexto (empacotados) não se misturam aos sem"""
+        if self.pack_tokens and self.loaded_model:
+            return f"{self.loaded_model}+pack"
+        return self.loaded_model
+    
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Comprimento de cada texto em tokens (sem tokens especiais)"""
+        try:
+            encoded = self.tokenizer(texts, add_special_tokens=False)
+            return [len(ids) for ids in encoded['input_ids']]
+        except Exception:
+            # Aproximação pelo número de caracteres
+            return [len(text) for text in texts]
+    
+    def extract_entities_batch(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE) -> List[List[Tuple[int, int, str]]]:
         """
-        Anonimiza entidades nomeadas no texto.
+        Extrai entidades de vários textos, agrupando-os em lotes de tamanho
+        parecido (em tokens) para reduzir o padding em cada forward pass.
         
         Args:
-            text: Texto original
+            texts: Textos para processar
+            batch_size: Número máximo de textos por forward pass
             
         Returns:
-            Texto com entidades substituídas por [PESSOA]
+            Lista com as entidades de cada texto, na mesma ordem de texts
         """
-        entities = self.extract_entities(text)
+        results = [[] for _ in texts]
+        if not texts or not self.initialize():
+            return results
+        
+        # Textos vazios e os descartados pelo filtro não passam pelo modelo
+        indices = [i for i, text in enumerate(texts) if text.strip() and self.gate.needs_ner(text)]
+        if not indices:
+            return results
         
+        # Textos já vistos vêm do cache
+        cached = self.cache.get_many(self.cache_model, [texts[i] for i in indices])
+        for position, entities in cached.items():
+            results[indices[position]] = entities
+        
+        # Textos repetidos dentro do bloco passam pelo modelo uma única vez
+        duplicates = {}
+        for position, i in enumerate(indices):
+            if position not in cached:
+                duplicates.setdefault(texts[i], []).append(i)
+        indices = [positions[0] for positions in duplicates.values()]
+        if not indices:
+            return results
+        
+        if self.pack_tokens:
+            self._extract_packed(texts, indices, batch_size, results)
+        else:
+            self._extract_batches(texts, indices, batch_size, results)
+        
+        for positions in duplicates.values():
+            for i in positions[1:]:
+                results[i] = results[positions[0]]
+        
+        return results
+    
+    def _run_batches(self, batches: List[List[str]]):
+        """Saída do pipeline de NER para cada lote, na ordem (exceção em vez da saída se o lote falhar)"""
+        # Com um pool de réplicas, todos os lotes do bloco são enviados de uma vez
+        if self.pool is not None:
+            futures = self.pool.submit_batches(batches)
+        for n, batch in enumerate(batches):
+            self.batch_sizes[len(batch)] += 1
+            try:
+                yield futures[n].result() if self.pool is not None else self.pipe(batch, batch_size=len(batch))
+            except Exception as e:
+                yield e
+    
+    def _extract_batches(self, texts: List[str], indices: List[int], batch_size: int, results: list):
+        """Uma mensagem por sequência, em lotes de mensagens de tamanho parecido"""
+        # Ordenar por comprimento para que cada lote tenha textos de tamanho parecido
+        lengths = self._token_lengths([texts[i] for i in indices])
+        order = [i for _, i in sorted(zip(lengths, indices))]
+        
+        batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+        outputs = self._run_batches([[texts[i] for i in batch_indices] for batch_indices in batches])
+        for batch_indices, batch_outputs in zip(batches, outputs):
+            if isinstance(batch_outputs, Exception):
+                print(f"⚠️  Erro ao processar lote com BERT: {batch_outputs}")
+                # Tentar mensagem a mensagem
+                self._extract_each(texts, batch_indices, results)
+                continue
+            for i, output in zip(batch_indices, batch_outputs):
+                results[i] = self._filter_entities(output)
+            self.cache.put_many(self.cache_model, [(texts[i], results[i]) for i in batch_indices])
+    
+    def _extract_each(self, texts: List[str], indices: List[int], results: list):
+        """
+        Uma mensagem por forward pass, depois de um lote que falhou. As mensagens
+        já passaram pelo filtro; as que falharem de novo ficam sem entidades e
+        fora do cache.
+        """
+        done = []
+        for i in indices:
+            try:
+                output = self.pool.infer([texts[i]])[0] if self.pool is not None else self.pipe(texts[i])
+            except Exception as e:
+                print(f"⚠️  Erro ao processar texto com BERT: {e}")
+                results[i] = []
+                continue
+            results[i] = self._filter_entities(output)
+            done.append((texts[i], results[i]))
+        self.cache.put_many(self.cache_model, done)
+    
+    def _extract_packed(self, texts: List[str], indices: List[int], batch_size: int, results: list):
+        """
+        Várias mensagens consecutivas por sequência (até pack_tokens tokens),
+        separadas por PACK_SEPARATOR: menos forward passes, e o modelo vê as
+        mensagens vizinhas como contexto. As entidades voltam para cada mensagem
+        pelo mapa de offsets; uma entidade que atravessa o separador é dividida.
+        """
+        # Sem o tokenizer (ex.: modelo só nas réplicas), o comprimento em caracteres é um limite seguro
+        lengths = self._token_lengths([texts[i] for i in indices])
+        windows = [[indices[position] for position in window]
+                   for window in pack_windows(lengths, self.pack_tokens)]
+        packed = [pack_texts([texts[i] for i in window]) for window in windows]
+        
+        batches = [range(start, min(start + batch_size, len(windows))) for start in range(0, len(windows), batch_size)]
+        outputs = self._run_batches([[packed[n][0] for n in batch] for batch in batches])
+        for batch, batch_outputs in zip(batches, outputs):
+            if isinstance(batch_outputs, Exception):
+                print(f"⚠️  Erro ao processar lote com BERT: {batch_outputs}")
+                self._extract_each(texts, [i for n in batch for i in windows[n]], results)
+                continue
+            for n, output in zip(batch, batch_outputs):
+                window = windows[n]
+                entities = unpack_entities(self._filter_entities(output), packed[n][1],
+                                           [texts[i] for i in window])
+                for i, message_entities in zip(window, entities):
+                    results[i] = message_entities
+                self.packed_messages += len(window)
+                self.cache.put_many(self.cache_model, [(texts[i], results[i]) for i in window])
+    
+    @staticmethod
+    def _replace_entities(text: str, entities: List[Tuple[int, int, str]]) -> str:
+        """Reconstrói o texto substituindo as entidades por [LABEL]"""
         if not entities:
             return text
             
@@ -138,7 +490,9 @@ class LocalBertAnonymizer:
             # Adicionar texto antes da entidade
             result.append(text[last_pos:start])
             # Adicionar placeholder
-            result.append(f"[{label}]")
+            placeholder = f"[{label}]"
+            result.append(placeholder)
+            count_replacement(placeholder)
             # Atualizar posição
             last_pos = end
             
@@ -146,8 +500,102 @@ class LocalBertAnonymizer:
         result.append(text[last_pos:])
         
         return "".join(result)
+    
+    @staticmethod
+    def _drop_protected(text: str, entities: List[Tuple[int, int, str]], whitelist) -> List[Tuple[int, int, str]]:
+        """Remove entidades contidas em palavras da whitelist"""
+        if not entities or not whitelist:
+            return entities
+        spans = protected_spans(text, whitelist)
+        if not spans:
+            return entities
+        return [entity for entity in entities if not is_protected(spans, entity[0], entity[1])]
+    
+    def anonymize_text(self, text: str, whitelist=None) -> str:
+        """
+        Anonimiza entidades nomeadas no texto.
+        
+        Args:
+            text: Texto original
+            whitelist: Palavras protegidas (lista ou matcher compilado)
+            
+        Returns:
+            Texto com entidades substituídas por [PESSOA]
+        """
+        entities = self._drop_protected(text, self.extract_entities(text), whitelist)
+        return self._replace_entities(text, entities)
+    
+    def entity_spans_batch(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                           whitelist=None) -> List[List[Annotation]]:
+        """
+        Trechos (start, end, "[PESSOA]") das entidades de cada texto, com inferência em lote.
+        Entidades contidas em palavras da whitelist são descartadas.
+        """
+        entities = self.extract_entities_batch(texts, batch_size)
+        return [[(start, end, f"[{label}]") for start, end, label in self._drop_protected(text, ents, whitelist)]
+                for text, ents in zip(texts, entities)]
+    
+    def anonymize_texts(self, texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE, whitelist=None) -> List[str]:
+        """
+        Anonimiza vários textos com inferência em lote.
+        
+        Args:
+            texts: Textos originais
+            batch_size: Número máximo de textos por forward pass
+            whitelist: Palavras protegidas (lista ou matcher compilado)
+            
+        Returns:
+            Textos com entidades substituídas por [PESSOA], na mesma ordem
+        """
+        entities = self.extract_entities_batch(texts, batch_size)
+        return [self._replace_entities(text, self._drop_protected(text, ents, whitelist))
+                for text, ents in zip(texts, entities)]
+
+def pack_windows(lengths: List[int], max_tokens: int, separator_tokens: int = 1) -> List[List[int]]:
+    """
+    Agrupa posições consecutivas em janelas cujo total de tokens (com os
+    separadores) não passa de max_tokens. Um texto maior que o limite fica sozinho.
+    """
+    windows = []
+    current = []
+    used = 0
+    for position, length in enumerate(lengths):
+        if current and used + separator_tokens + length > max_tokens:
+            windows.append(current)
+            current = []
+        used = used + separator_tokens + length if current else length
+        current.append(position)
+    if current:
+        windows.append(current)
+    return windows
 
-def anonymize_chat_message_bert(msg):
+def pack_texts(texts: List[str]) -> Tuple[str, List[int]]:
+    """Junta os textos com PACK_SEPARATOR; retorna a sequência e o offset de início de cada texto"""
+    offsets = []
+    position = 0
+    for text in texts:
+        offsets.append(position)
+        position += len(text) + len(PACK_SEPARATOR)
+    return PACK_SEPARATOR.join(texts), offsets
+
+def unpack_entities(entities: List[Tuple[int, int, str]], offsets: List[int],
+                    texts: List[str]) -> List[List[Tuple[int, int, str]]]:
+    """
+    Converte entidades da sequência empacotada em entidades de cada texto
+    (posições relativas ao texto). Partes que caem no separador são descartadas.
+    """
+    result = [[] for _ in texts]
+    for start, end, label in entities:
+        n = max(bisect_right(offsets, start) - 1, 0)
+        while n < len(texts) and offsets[n] < end:
+            text_start = max(start - offsets[n], 0)
+            text_end = min(end - offsets[n], len(texts[n]))
+            if text_start < text_end and texts[n][text_start:text_end].strip():
+                result[n].append((text_start, text_end, label))
+            n += 1
+    return result
+
+def anonymize_chat_message_bert(msg, whitelist=None, inplace: bool = False):
     """Anonimiza uma mensagem estruturada usando BERT"""
     # Import aqui para evitar circular import
     from .chat_message import ChatMessage
@@ -157,15 +605,20 @@ def anonymize_chat_message_bert(msg):
     
     # Anonimiza apenas o conteúdo da mensagem com BERT
     # O sender já deve ter sido anonimizado em etapas anteriores
-    anonymized_message = anonymize_text(msg.message)
+    anonymized_message = anonymize_text(msg.message, whitelist)
     
-    return ChatMessage(
-        timestamp=msg.timestamp,
-        sender=msg.sender,  # Mantém sender como está (já anonimizado)
-        message=anonymized_message,
-        original_sender=msg.original_sender if hasattr(msg, 'original_sender') else msg.sender,
-        original_message=msg.original_message if hasattr(msg, 'original_message') else msg.message
-    )
+    # Mantém sender como está (já anonimizado)
+    return msg.update(message=anonymized_message, inplace=inplace)
+
+def anonymize_chat_messages_bert(messages: list, batch_size: int = DEFAULT_BATCH_SIZE, whitelist=None,
+                                 inplace: bool = False) -> list:
+    """Anonimiza uma lista de mensagens estruturadas usando BERT em lotes"""
+    anonymized_texts = get_anonymizer().anonymize_texts([msg.message for msg in messages], batch_size, whitelist)
+    
+    return [
+        msg.update(message=anonymized_message, inplace=inplace)
+        for msg, anonymized_message in zip(messages, anonymized_texts)
+    ]
 
 def anonymize_messages_bert(messages: list) -> list:
     """Anonimiza uma lista de mensagens usando BERT"""
@@ -192,18 +645,154 @@ def get_anonymizer() -> LocalBertAnonymizer:
         _anonymizer = LocalBertAnonymizer()
     return _anonymizer
 
-def anonymize_text(text: str) -> str:
+def set_anonymizer(anonymizer: Optional[LocalBertAnonymizer]):
+    """
+    Substitui a instância global do anonimizador (ex.: por um modelo stub em
+    benchmarks). None volta ao anonimizador padrão na próxima chamada.
+    """
+    global _anonymizer
+    _anonymizer = anonymizer
+
+# Configuração do anonimizador global, reaplicada nos workers do pool de processos
+# (ex.: canais do Slack com --workers), que criam o seu próprio anonimizador
+_ner_settings = {}
+
+def _apply_ner_settings(settings: dict):
+    """Aplica a configuração registrada por _share_ner_setting (executado em cada worker)"""
+    for name, args in settings.items():
+        _NER_SETTERS[name](*args)
+
+def _share_ner_setting(name: str, *args):
+    _ner_settings[name] = args
+    share_worker_state("ner", _apply_ner_settings, (dict(_ner_settings),))
+
+def _set_ner_cache(db_path: Optional[str], max_entries: Optional[int]) -> NerCache:
+    cache = get_anonymizer().cache
+    if max_entries is not None:
+        cache.max_entries = max_entries
+    if db_path:
+        cache.open_disk(db_path)
+    return cache
+
+def configure_ner_cache(db_path: Optional[str] = None, max_entries: Optional[int] = None) -> NerCache:
+    """
+    Configura o cache de resultados NER do anonimizador global.
+    
+    Args:
+        db_path: Banco SQLite para persistir resultados entre execuções (None = só memória)
+        max_entries: Número máximo de textos no LRU em memória
+        
+    Returns:
+        O cache configurado
+    """
+    cache = _set_ner_cache(db_path, max_entries)
+    _share_ner_setting("cache", db_path, max_entries)
+    return cache
+
+def _set_ner_backend(backend: str):
+    anonymizer = get_anonymizer()
+    if anonymizer.initialized and anonymizer.backend != backend:
+        print("⚠️  Modelo já carregado; o novo backend vale apenas para novos anonimizadores")
+        return
+    anonymizer.backend = backend
+
+def configure_ner_backend(backend: str):
+    """Define o backend de inferência do anonimizador global (antes de carregar o modelo)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inválido: {backend}. Opções: {', '.join(BACKENDS)}")
+    _set_ner_backend(backend)
+    _share_ner_setting("backend", backend)
+
+def _set_ner_gate(lexicon: Optional[List[str]], skip_lowercase: bool, placeholder_ratio: Optional[float],
+                  enabled: bool) -> NerGate:
+    gate = NerGate(lexicon, skip_lowercase, placeholder_ratio, enabled)
+    get_anonymizer().gate = gate
+    return gate
+
+def configure_ner_gate(lexicon: Optional[List[str]] = None, skip_lowercase: bool = False,
+                       placeholder_ratio: Optional[float] = None, enabled: bool = True) -> NerGate:
+    """Substitui o filtro de mensagens do anonimizador global (ver NerGate)"""
+    gate = _set_ner_gate(lexicon, skip_lowercase, placeholder_ratio, enabled)
+    _share_ner_setting("gate", lexicon, skip_lowercase, placeholder_ratio, enabled)
+    return gate
+
+def configure_ner_pool(replicas: int, threads: Optional[int] = None, mode: str = "process", pin: bool = True):
+    """
+    Distribui os forward passes do anonimizador global entre réplicas do modelo
+    (ver InferencePool). As réplicas são iniciadas no primeiro uso do BERT.
+    Vale apenas para este processo: os workers do pool de processos não
+    iniciam réplicas próprias.
+    
+    Args:
+        replicas: Número de réplicas
+        threads: Threads intra-op por réplica (padrão: núcleos disponíveis / réplicas)
+        mode: "process" ou "thread"
+        pin: Prende cada réplica a um conjunto próprio de núcleos
+        
+    Returns:
+        O pool configurado
+    """
+    from .inference_pool import InferencePool
+    
+    anonymizer = get_anonymizer()
+    if anonymizer.initialized:
+        print("⚠️  Modelo já carregado; o pool de réplicas vale apenas para novos anonimizadores")
+        return None
+    anonymizer.pool = InferencePool(replicas, threads, anonymizer.backend, mode, pin)
+    return anonymizer.pool
+
+def _set_ner_packing(max_tokens: Optional[int]):
+    get_anonymizer().pack_tokens = max_tokens
+
+def configure_ner_packing(max_tokens: Optional[int] = MAX_PACK_TOKENS):
+    """
+    Empacota mensagens consecutivas em sequências de até max_tokens tokens na
+    inferência em lote do anonimizador global (None = uma mensagem por sequência).
+    
+    Raises:
+        ValueError: max_tokens fora de 1..MAX_PACK_TOKENS
+    """
+    if max_tokens is not None and not 0 < max_tokens <= MAX_PACK_TOKENS:
+        raise ValueError(f"Limite de tokens inválido: {max_tokens} (use de 1 a {MAX_PACK_TOKENS})")
+    _set_ner_packing(max_tokens)
+    _share_ner_setting("packing", max_tokens)
+
+_NER_SETTERS = {
+    "cache": _set_ner_cache,
+    "backend": _set_ner_backend,
+    "gate": _set_ner_gate,
+    "packing": _set_ner_packing,
+}
+
+def get_ner_gate_stats() -> dict:
+    """Estatísticas do filtro de mensagens do anonimizador global"""
+    return get_anonymizer().gate.stats()
+
+def get_ner_cache_stats() -> dict:
+    """Contadores de acertos/falhas do cache NER do anonimizador global"""
+    return get_anonymizer().cache.stats()
+
+def get_ner_batch_stats() -> dict:
+    """Tamanhos de lote usados pelo anonimizador global"""
+    return get_anonymizer().batch_stats()
+
+def ner_spans_batch(texts: List[str], batch_size: int = DEFAULT_BATCH_SIZE, whitelist=None) -> List[List[Annotation]]:
+    """Trechos de entidades nomeadas de vários textos, usando o anonimizador global"""
+    return get_anonymizer().entity_spans_batch(texts, batch_size, whitelist)
+
+def anonymize_text(text: str, whitelist=None) -> str:
     """
     Função principal para anonimizar texto usando BERT local.
     
     Args:
         text: Texto para anonimizar
+        whitelist: Palavras protegidas (lista ou matcher compilado)
         
     Returns:
         Texto anonimizado
     """
     anonymizer = get_anonymizer()
-    return anonymizer.anonymize_text(text)
+    return anonymizer.anonymize_text(text, whitelist)
 
 def is_bert_available() -> bool:
     """Verifica se BERT está disponível"""
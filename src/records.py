@@ -0,0 +1,226 @@
+"""
+Formato de registros tipados para as saídas do pipeline.
+Cada mensagem vira um registro com os campos originais e anonimizados juntos:
+JSONL (um objeto por linha) ou, se o pyarrow estiver instalado, Parquet
+(colunar, para análises). A etapa seguinte lê os registros sem reparsear
+texto, e a comparação ORIGINAL/ANONIMIZADO passa a ser uma exportação
+gerada sob demanda (export_comparison).
+"""
+import importlib.util
+import json
+import os
+from typing import Iterable, Iterator, Optional
+
+from .chat_message import ChatMessage, iter_messages_from_file, stream_messages_to_files, tee_messages_to_files
+from .fast_reader import iter_messages_parallel
+from .metrics import count_messages
+from .utils import compression, open_text, strip_compression
+
+# Formatos de saída: "text" é o par de arquivos .txt/_all.txt
+RECORD_FORMATS = ("text", "jsonl", "parquet")
+RECORD_EXTENSIONS = {"jsonl": ".jsonl", "parquet": ".parquet"}
+
+# Campos de cada registro, na ordem dos argumentos de ChatMessage
+FIELDS = ChatMessage.__slots__
+
+# pyarrow é opcional e só é importado ao ler/gravar Parquet
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+# Número de mensagens por row group no Parquet
+DEFAULT_ROW_GROUP_SIZE = 65_536
+
+
+def record_format(path: Optional[str]) -> Optional[str]:
+    """Formato de registros pela extensão do arquivo, ignorando a compressão (None para arquivos de texto)"""
+    if not path:
+        return None
+    path = strip_compression(path)
+    for fmt, extension in RECORD_EXTENSIONS.items():
+        if path.endswith(extension):
+            return fmt
+    return None
+
+
+class _JsonlRecordWriter:
+    def __init__(self, path: str, append: bool = False):
+        self._file = open_text(path, 'a' if append else 'w')
+
+    def write(self, msg: ChatMessage):
+        self._file.write(json.dumps(msg.to_dict(), ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetRecordWriter:
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([(field, pa.string()) for field in FIELDS])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._row_group_size = row_group_size
+        self._columns = {field: [] for field in FIELDS}
+        self._rows = 0
+
+    def write(self, msg: ChatMessage):
+        for field in FIELDS:
+            self._columns[field].append(getattr(msg, field))
+        self._rows += 1
+        if self._rows >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pydict(self._columns, schema=self._schema))
+            self._columns = {field: [] for field in FIELDS}
+            self._rows = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def open_record_writer(path: str, append: bool = False):
+    """
+    Abre um gravador de registros (JSONL ou Parquet, pela extensão).
+
+    Raises:
+        ValueError: Formato desconhecido, pyarrow ausente ou append em Parquet
+    """
+    fmt = record_format(path)
+    if fmt == "jsonl":
+        return _JsonlRecordWriter(path, append)
+    if fmt == "parquet":
+        if not PARQUET_AVAILABLE:
+            raise ValueError("Formato parquet requer pyarrow. Execute: pip install pyarrow")
+        if append:
+            raise ValueError("Arquivos Parquet não aceitam acréscimos; use o formato jsonl")
+        return _ParquetRecordWriter(path)
+    raise ValueError(f"Extensão de registros desconhecida: {path}")
+
+
+class _TextMessageWriter:
+    """Par de arquivos de texto: mensagens anonimizadas e comparação ORIGINAL/ANONIMIZADO"""
+
+    def __init__(self, output_clean: Optional[str], output_all: Optional[str], append: bool = False):
+        mode = 'a' if append else 'w'
+        self._clean_file = open_text(output_clean, mode) if output_clean else None
+        try:
+            self._all_file = open_text(output_all, mode) if output_all else None
+        except Exception:
+            if self._clean_file:
+                self._clean_file.close()
+            raise
+
+    def write(self, msg: ChatMessage):
+        if self._clean_file:
+            self._clean_file.write(msg.format_message() + '\n')
+        if self._all_file:
+            self._all_file.write(msg.format_comparison() + '\n')
+
+    def close(self):
+        for f in (self._clean_file, self._all_file):
+            if f:
+                f.close()
+
+
+def open_message_writer(output_clean: Optional[str], output_all: Optional[str], append: bool = False):
+    """
+    Abre um gravador de mensagens (write(msg)/close()) no formato indicado pela
+    extensão de output_all: registros JSONL/Parquet (output_clean ignorado) ou
+    o par de arquivos de texto.
+    """
+    if record_format(output_all):
+        return open_record_writer(output_all, append)
+    return _TextMessageWriter(output_clean, output_all, append)
+
+
+def iter_records(path: str) -> Iterator[ChatMessage]:
+    """Lê os registros de um arquivo JSONL ou Parquet, um a um"""
+    fmt = record_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(columns=list(FIELDS)):
+            columns = batch.to_pydict()
+            for values in zip(*(columns[field] for field in FIELDS)):
+                yield ChatMessage(*values)
+        return
+
+    with open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield ChatMessage(**json.loads(line))
+
+
+def read_messages(path: str, workers: Optional[int] = None) -> Iterator[ChatMessage]:
+    """
+    Lê mensagens de um arquivo de registros ou de texto (formato genérico ou de comparação).
+    Com workers > 1, arquivos de texto grandes são lidos em paralelo (ver fast_reader).
+    """
+    if record_format(path):
+        return iter_records(path)
+    if workers and workers > 1:
+        return iter_messages_parallel(path, workers)
+    return iter_messages_from_file(path)
+
+
+def write_messages(messages: Iterable[ChatMessage], output_clean: Optional[str], output_all: Optional[str],
+                   append: bool = False) -> int:
+    """
+    Grava as mensagens no formato indicado pela extensão de output_all: registros
+    (JSONL/Parquet, com original e anonimizado no mesmo registro, e output_clean
+    ignorado) ou o par de arquivos de texto limpo + comparação.
+
+    Returns:
+        Número de mensagens gravadas
+    """
+    count = 0
+    writer = open_message_writer(output_clean, output_all, append)
+    try:
+        for msg in messages:
+            writer.write(msg)
+            count += 1
+    finally:
+        writer.close()
+        count_messages(count)
+    return count
+
+
+def tee_messages(messages: Iterable[ChatMessage], output_clean: Optional[str],
+                 output_all: Optional[str]) -> Iterator[ChatMessage]:
+    """Repassa as mensagens adiante (gerador) gravando cada uma no formato de output_all"""
+    if not record_format(output_all):
+        yield from tee_messages_to_files(messages, output_clean, output_all)
+        return
+
+    writer = open_record_writer(output_all)
+    try:
+        for msg in messages:
+            writer.write(msg)
+            yield msg
+    finally:
+        writer.close()
+
+
+def comparison_paths(records_path: str):
+    """Arquivos de texto gerados a partir de um arquivo de registros (x.jsonl.gz -> x.txt.gz, x_all.txt.gz)"""
+    suffix = f".{compression(records_path)}" if compression(records_path) else ""
+    base = os.path.splitext(strip_compression(records_path))[0]
+    return f"{base}.txt{suffix}", f"{base}_all.txt{suffix}"
+
+
+def export_comparison(records_path: str, output_clean: Optional[str] = None,
+                      output_all: Optional[str] = None) -> int:
+    """
+    Gera os arquivos legíveis (mensagens anonimizadas e comparação
+    ORIGINAL/ANONIMIZADO) a partir de um arquivo de registros.
+
+    Returns:
+        Número de mensagens exportadas
+    """
+    default_clean, default_all = comparison_paths(records_path)
+    return stream_messages_to_files(iter_records(records_path), output_clean or default_clean,
+                                    output_all or default_all)
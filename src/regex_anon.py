@@ -1,5 +1,8 @@
-import re
+from typing import List, Optional
 from .chat_message import ChatMessage
+from .parallel import share_worker_state
+from .pattern_registry import DEFAULT_BUDGET_MS, DEFAULT_SAMPLE_EVERY, PatternRegistry, load_patterns_file
+from .spans import Annotation, render_spans
 
 patterns = {
     "CPF": r"\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b",
@@ -15,29 +18,86 @@ patterns = {
     ),
 }
 
-def anonymize_message_content(message_content: str) -> str:
-    """Anonimiza apenas o conteúdo da mensagem usando regex"""
-    anonymized = message_content
+# Prioridade entre os padrões, explícita: a varredura é única e da esquerda para
+# a direita, então vence o casamento que começa primeiro; quando dois padrões
+# casam na mesma posição, vence o que aparece antes nesta tupla.
+#   - codigo antes de tudo: um bloco de código é substituído inteiro
+#   - email antes de CPF/telefone: "12345678901@x.com" é um e-mail, não um CPF
+#   - CPF antes de telefone: 11 dígitos no formato de CPF são tratados como CPF
+#   - chave_api e endereco por último (tokens longos e texto livre)
+PRIORITY = ("codigo", "email", "CPF", "telefone", "chave_api", "endereco")
 
-    for label, pattern in patterns.items():
-        matches = re.findall(pattern, anonymized, flags=re.IGNORECASE)
-        for match in matches:
-            anonymized = anonymized.replace(match, f"[{label.upper()}]")
+# Padrões em uso (os embutidos acima ou os de um arquivo, ver configure_patterns)
+_registry = PatternRegistry(patterns, PRIORITY)
 
-    return anonymized
+def _load_registry(path: Optional[str], budget_ms: Optional[float], sample_every: int) -> PatternRegistry:
+    """Cria o registro de padrões em uso (no processo principal e em cada worker)"""
+    global _registry
+    if path:
+        _registry = PatternRegistry(load_patterns_file(path), budget_ms=budget_ms, sample_every=sample_every,
+                                    guard_min_length=0)
+    else:
+        _registry = PatternRegistry(patterns, PRIORITY, budget_ms, sample_every)
+    return _registry
+
+def _take_stats():
+    return _registry.take_stats()
+
+def _merge_stats(delta: dict):
+    _registry.merge_stats(delta)
+
+def _share_registry(path: Optional[str], budget_ms: Optional[float], sample_every: int):
+    # Os workers recriam o registro a partir da mesma origem e devolvem as estatísticas de cada bloco
+    share_worker_state("regex", _load_registry, (path, budget_ms, sample_every), _take_stats, _merge_stats)
+
+_share_registry(None, DEFAULT_BUDGET_MS, DEFAULT_SAMPLE_EVERY)
+
+def configure_patterns(path: Optional[str] = None, budget_ms: Optional[float] = DEFAULT_BUDGET_MS,
+                       sample_every: int = DEFAULT_SAMPLE_EVERY) -> PatternRegistry:
+    """
+    Substitui o registro de padrões da etapa de regex, no processo principal e
+    nos workers do pool de processos (--workers).
+    
+    Args:
+        path: Arquivo JSON {"RÓTULO": "padrão"} em ordem de prioridade (None = padrões embutidos)
+        budget_ms: Tempo máximo da varredura de uma mensagem (None = sem limite)
+        sample_every: A cada quantas mensagens medir cada padrão separadamente (0 = nunca)
+        
+    Os padrões embutidos só são varridos com limite de tempo em mensagens longas
+    (DEFAULT_GUARD_MIN_LENGTH); os de arquivo, desconhecidos, em todas.
+        
+    Raises:
+        ValueError: Arquivo de padrões inválido
+    """
+    registry = _load_registry(path, budget_ms, sample_every)
+    _share_registry(path, budget_ms, sample_every)
+    return registry
+
+def get_pattern_registry() -> PatternRegistry:
+    """Registro de padrões em uso (estatísticas em report())"""
+    return _registry
+
+def regex_spans(message_content: str, whitelist=None) -> List[Annotation]:
+    """
+    Trechos (start, end, "[LABEL]") com dados sensíveis, em uma única varredura.
+    Casamentos contidos em palavras da whitelist são ignorados.
+    """
+    return _registry.spans(message_content, whitelist)
+
+def anonymize_message_content(message_content: str, whitelist=None) -> str:
+    """
+    Anonimiza apenas o conteúdo da mensagem usando regex, em uma única passada.
+    Casamentos contidos em palavras da whitelist são ignorados.
+    """
+    return render_spans(message_content, regex_spans(message_content, whitelist))
 
-def anonymize_chat_message(msg: ChatMessage) -> ChatMessage:
+def anonymize_chat_message(msg: ChatMessage, whitelist=None, inplace: bool = False) -> ChatMessage:
     
     # Anonimiza o conteúdo da mensagem
-    anonymized_message = anonymize_message_content(msg.message)
+    anonymized_message = anonymize_message_content(msg.message, whitelist)
     
-    return ChatMessage(
-        timestamp=msg.timestamp,  # Mantém timestamp original
-        sender=msg.sender,  # Mantém sender atual (já pode estar anonimizado)
-        message=anonymized_message,
-        original_sender=msg.original_sender if hasattr(msg, 'original_sender') else msg.sender,
-        original_message=msg.original_message if hasattr(msg, 'original_message') else msg.message
-    )
+    # Mantém timestamp e sender atual (já pode estar anonimizado)
+    return msg.update(message=anonymized_message, inplace=inplace)
 
 def anonymize_message(msg_line: str) -> str:
     """Função legada para compatibilidade - ainda funciona com linhas de texto"""
@@ -0,0 +1,268 @@
+"""
+Servidor local de anonimização (daemon).
+Carrega o modelo BERT e compila apelidos/whitelist uma única vez e atende
+jobs por HTTP em localhost. Requisições simultâneas compartilham uma fila
+de inferência em lote, e os resultados são enviados em streaming (JSONL).
+
+Endpoints:
+    GET  /health     -> {"status": "ok", "bert": true|false}
+    POST /anonymize  -> corpo JSON com "messages" (lista de linhas "[ts] sender: msg")
+                        ou "path" (arquivo dentro da pasta de dados do servidor),
+                        e opcionalmente "stages" e "reset_ids"; resposta em JSONL,
+                        uma mensagem por linha
+
+"path" só é aceito se o servidor foi iniciado com uma pasta de dados (data_root):
+qualquer cliente que alcance a porta receberia o texto original do arquivo.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from .apelidos import anonimizar_apelidos_chat_message, compile_apelidos
+from .chat_message import ChatMessage, iter_messages_from_file
+from .id_anon import anonymize_chat_message_id, reset_mappings
+from .pipeline import STAGES
+from .pt_bert_local import DEFAULT_BATCH_SIZE, get_anonymizer
+from .regex_anon import anonymize_chat_message
+from .utils import chunked
+from .whitelist import compile_whitelist
+
+# Número de mensagens processadas e enviadas por vez em cada job
+JOB_CHUNK_SIZE = 256
+
+# Tempo máximo (segundos) que a fila espera para juntar textos de outros jobs
+DEFAULT_MAX_WAIT = 0.01
+
+
+class BatchingQueue:
+    """
+    Fila de inferência compartilhada: junta textos de requisições simultâneas
+    em um único lote antes de chamar o modelo.
+    """
+
+    def __init__(self, anonymizer, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_wait: float = DEFAULT_MAX_WAIT, whitelist=None):
+        self.anonymizer = anonymizer
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.whitelist = whitelist
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ner-batching", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Agenda a anonimização de textos; o Future recebe a lista de textos anonimizados"""
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def close(self):
+        """Encerra a thread da fila após os jobs pendentes"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        """Junta jobs que chegarem até max_wait ou até encher alguns lotes"""
+        jobs = [first]
+        total = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while total < self.batch_size * 4:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Repassa o sinal de parada para a próxima iteração
+                self._queue.put(None)
+                break
+            jobs.append(item)
+            total += len(item[0])
+        return jobs
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            jobs = self._collect(item)
+            texts = [text for job_texts, _ in jobs for text in job_texts]
+            try:
+                results = self.anonymizer.anonymize_texts(texts, self.batch_size, self.whitelist)
+            except Exception as e:
+                for _, future in jobs:
+                    future.set_exception(e)
+                continue
+            position = 0
+            for job_texts, future in jobs:
+                future.set_result(results[position:position + len(job_texts)])
+                position += len(job_texts)
+
+
+class RequestError(Exception):
+    """Erro de uma requisição, com o status HTTP da resposta"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve_job_path(data_root: Optional[str], path) -> str:
+    """
+    Caminho de um job "path", relativo a data_root e sem sair dela.
+
+    Raises:
+        RequestError: 403 sem data_root ou fora dela, 400 se path não for texto,
+            404 se o arquivo não existir ou não puder ser lido
+    """
+    if not data_root:
+        raise RequestError(403, "'path' desativado: inicie o servidor com uma pasta de dados (--serve-root)")
+    if not isinstance(path, str) or not path:
+        raise RequestError(400, "'path' deve ser um texto")
+    root = os.path.realpath(data_root)
+    full_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full_path]) != root:
+        raise RequestError(403, "'path' fora da pasta de dados do servidor")
+    try:
+        with open(full_path, 'rb'):
+            pass
+    except OSError:
+        raise RequestError(404, f"Arquivo não encontrado ou sem permissão de leitura: {path}")
+    return full_path
+
+
+class AnonymizationServer(ThreadingHTTPServer):
+    """Servidor HTTP com modelo e matchers residentes em memória"""
+
+    daemon_threads = True
+
+    def __init__(self, address, apelidos_lista: Optional[List[str]] = None,
+                 whitelist: Optional[List[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_wait: float = DEFAULT_MAX_WAIT, data_root: Optional[str] = None):
+        super().__init__(address, AnonymizationHandler)
+        # Pasta de onde jobs "path" podem ler arquivos (None = "path" desativado)
+        self.data_root = data_root
+        self.whitelist_matcher = compile_whitelist(whitelist)
+        self.apelidos_matcher = compile_apelidos(apelidos_lista)
+        self.anonymizer = get_anonymizer()
+        self.bert_available = self.anonymizer.initialize()
+        self.batching = BatchingQueue(self.anonymizer, batch_size, max_wait, self.whitelist_matcher)
+        # Os mapas user_N do id_anon são globais e compartilhados entre jobs
+        self.id_lock = threading.Lock()
+
+    def process_chunk(self, messages: List[ChatMessage], stages) -> List[ChatMessage]:
+        """Aplica as etapas pedidas a um bloco de mensagens"""
+        if "id" in stages:
+            with self.id_lock:
+                messages = [anonymize_chat_message_id(msg, self.whitelist_matcher, inplace=True) for msg in messages]
+        if "regex" in stages:
+            messages = [anonymize_chat_message(msg, self.whitelist_matcher, inplace=True) for msg in messages]
+        if "apelidos" in stages:
+            messages = [anonimizar_apelidos_chat_message(msg, self.apelidos_matcher, self.whitelist_matcher,
+                                                         inplace=True)
+                        for msg in messages]
+        if "bert" in stages and self.bert_available:
+            texts = self.batching.submit([msg.message for msg in messages]).result()
+            messages = [msg.update(message=text, inplace=True) for msg, text in zip(messages, texts)]
+        return messages
+
+    def server_close(self):
+        self.batching.close()
+        super().server_close()
+
+
+class AnonymizationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "bert": self.server.bert_available})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/anonymize":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            job = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(job, dict):
+                raise ValueError("O corpo deve ser um objeto JSON")
+            stages = job.get("stages") or list(STAGES)
+            if not isinstance(stages, list):
+                raise ValueError("'stages' deve ser uma lista")
+            invalid = [str(stage) for stage in stages if stage not in STAGES]
+            if invalid:
+                raise ValueError(f"Etapas inválidas: {', '.join(invalid)}")
+            if "path" in job:
+                messages = iter_messages_from_file(resolve_job_path(self.server.data_root, job["path"]))
+            elif "messages" in job:
+                lines = job["messages"]
+                if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+                    raise ValueError("'messages' deve ser uma lista de textos")
+                messages = (msg for msg in map(ChatMessage.from_line, lines) if msg and msg.message)
+            else:
+                raise ValueError("Informe 'messages' ou 'path'")
+        except RequestError as e:
+            self._send_json(e.status, {"error": str(e)})
+            return
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        if job.get("reset_ids"):
+            with self.server.id_lock:
+                reset_mappings()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunked(messages, JOB_CHUNK_SIZE):
+                processed = self.server.process_chunk(chunk, stages)
+                lines = "".join(json.dumps(msg.to_dict(), ensure_ascii=False) + "\n" for msg in processed)
+                self._write_chunk(lines.encode("utf-8"))
+        except Exception as e:
+            error = json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+            self._write_chunk(error.encode("utf-8"))
+        self._write_chunk(b"")
+
+    def log_message(self, format, *args):
+        # Sem log por requisição (mensagens podem conter dados sensíveis)
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, apelidos_lista: Optional[List[str]] = None,
+          whitelist: Optional[List[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+          data_root: Optional[str] = None):
+    """Inicia o servidor e atende requisições até Ctrl+C (jobs "path" só dentro de data_root)"""
+    server = AnonymizationServer((host, port), apelidos_lista, whitelist, batch_size, data_root=data_root)
+    print(f"🛰️  Servidor de anonimização em http://{host}:{port} "
+          f"(BERT {'carregado' if server.bert_available else 'indisponível'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Encerrando servidor...")
+    finally:
+        server.server_close()
@@ -0,0 +1,238 @@
+"""
+Leitura de exportações do Slack (pasta com users.json, channels.json e uma
+pasta por canal com um JSON por dia) direto em ChatMessage, sem converter
+antes para um único arquivo de texto.
+As menções <@U123> são resolvidas pelo users.json, cada mensagem guarda o
+canal e a thread, e os canais são anonimizados em paralelo, com um arquivo
+de saída por canal.
+"""
+import json
+import os
+import re
+from concurrent.futures import as_completed
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .chat_message import ChatMessage
+from .id_anon import iter_mentions, load_mappings
+from .parallel import call_in_worker, get_process_pool, merge_worker_stats
+from .pipeline import STAGES, anonymize_stream
+from .pt_bert_local import DEFAULT_BATCH_SIZE
+from .records import RECORD_EXTENSIONS, write_messages
+from .whitelist import compile_whitelist
+
+# Listas de conversas da exportação: canais públicos, privados, grupos e DMs
+CONVERSATION_FILES = ("channels.json", "groups.json", "mpims.json", "dms.json")
+
+# Eventos de sistema que não são mensagens de usuários
+SKIPPED_SUBTYPES = {"channel_join", "channel_leave", "group_join", "group_leave"}
+
+# Mesmo formato de timestamp dos arquivos de texto (em UTC)
+TIMESTAMP_FORMAT = "%d/%m/%Y %H:%M"
+
+# Marcações do Slack: <@U123>, <@U123|nome>, <#C123|canal>, <!here>, <https://...|texto>
+_MARKUP_RE = re.compile(r"<([@#!]?)([^>|]*)(?:\|([^>]*))?>")
+_NON_WORD_RE = re.compile(r"\W")
+
+
+def _handle(name: str) -> str:
+    """Nome de usuário sem pontuação (joao.silva -> joao_silva), para a etapa de IDs reconhecer @nome inteiro"""
+    return _NON_WORD_RE.sub("_", name)
+
+
+def load_users(export_dir: str) -> Dict[str, str]:
+    """
+    Lê o users.json da exportação.
+
+    Returns:
+        Dicionário {ID do Slack: nome de usuário}, vazio se o arquivo não existir
+    """
+    users_file = os.path.join(export_dir, "users.json")
+    if not os.path.exists(users_file):
+        return {}
+    with open(users_file, 'r', encoding='utf-8') as f:
+        users = json.load(f)
+    result = {}
+    for user in users:
+        profile = user.get("profile") or {}
+        name = user.get("name") or profile.get("display_name") or profile.get("real_name") or user["id"]
+        result[user["id"]] = _handle(name)
+    return result
+
+
+def seed_mappings(users: Dict[str, str], names: Iterable[str] = ()) -> dict:
+    """
+    Mapeamentos de IDs (no formato de export_mappings) com os usuários do
+    users.json seguidos dos demais nomes, para que cada um receba o mesmo
+    user_N como sender e nas menções, em todos os canais.
+    """
+    handles = dict.fromkeys(users.values())
+    handles.update(dict.fromkeys(name for name in names if name not in handles))
+    numbered = {handle: f"user_{i}" for i, handle in enumerate(handles, 1)}
+    return {"user_map": dict(numbered), "sender_map": dict(numbered)}
+
+
+def allocate_pseudonyms(export_dir: str, channels: List[str], users: Dict[str, str], whitelist) -> dict:
+    """
+    Percorre todos os canais antes da anonimização e numera uma única vez todos
+    os nomes da exportação: os do users.json e também os que não estão nele
+    (bots, autores desconhecidos, @nome digitado sem marcação). Assim um user_N
+    é a mesma pessoa em todos os canais, qualquer que seja o worker.
+    """
+    matcher = compile_whitelist(whitelist)
+    names = {}
+    for channel in channels:
+        for msg in iter_channel_messages(export_dir, channel, users):
+            # Mesmas regras da etapa de IDs: senders e menções da whitelist são mantidos
+            if matcher is None or not matcher.fullmatch(msg.sender):
+                names.setdefault(msg.sender)
+            for mention in iter_mentions(msg.message, matcher):
+                names.setdefault(mention.group(1))
+    return seed_mappings(users, names)
+
+
+def list_channels(export_dir: str) -> List[str]:
+    """Pastas de conversa da exportação (pelos arquivos de conversas ou, sem eles, pelas subpastas)"""
+    channels = []
+    for conversations_file in CONVERSATION_FILES:
+        path = os.path.join(export_dir, conversations_file)
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for conversation in json.load(f):
+                # DMs não têm nome: a pasta é o ID da conversa
+                name = conversation.get("name") or conversation.get("id")
+                if name and os.path.isdir(os.path.join(export_dir, name)):
+                    channels.append(name)
+    if channels:
+        return list(dict.fromkeys(channels))
+    return sorted(entry.name for entry in os.scandir(export_dir) if entry.is_dir())
+
+
+def resolve_markup(text: str, users: Dict[str, str]) -> str:
+    """Converte as marcações do Slack em texto: <@U123> -> @nome, <#C1|geral> -> #geral, links -> texto"""
+    def replace(match):
+        kind, target, label = match.groups()
+        if kind == "@":
+            return "@" + (users.get(target) or _handle(label or target))
+        if kind == "#":
+            return "#" + (label or target)
+        if kind == "!":
+            # <!here>, <!channel>, <!subteam^S123|@equipe>
+            return label or "@" + target
+        return label or target
+
+    text = _MARKUP_RE.sub(replace, text)
+    return text.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+def format_timestamp(ts: str) -> str:
+    """Converte o ts do Slack (segundos desde a época) para o formato dos arquivos de texto"""
+    return datetime.fromtimestamp(float(ts), tz=timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def iter_channel_messages(export_dir: str, channel: str, users: Dict[str, str],
+                          flatten: bool = False) -> Iterator[ChatMessage]:
+    """
+    Lê as mensagens de um canal, um arquivo diário por vez.
+
+    Args:
+        export_dir: Pasta da exportação
+        channel: Nome da pasta do canal
+        users: Dicionário de load_users
+        flatten: Junta as linhas de mensagens com quebras de linha (necessário na saída em texto)
+    """
+    channel_dir = os.path.join(export_dir, channel)
+    # Os arquivos se chamam AAAA-MM-DD.json, então a ordem alfabética é a cronológica
+    for day_file in sorted(name for name in os.listdir(channel_dir) if name.endswith(".json")):
+        with open(os.path.join(channel_dir, day_file), 'r', encoding='utf-8') as f:
+            day = json.load(f)
+        for item in day:
+            if item.get("type") != "message" or item.get("subtype") in SKIPPED_SUBTYPES:
+                continue
+            text = resolve_markup(item.get("text") or "", users)
+            if flatten:
+                text = " ".join(line for line in text.splitlines() if line.strip())
+            if not text.strip():
+                continue
+            sender = users.get(item.get("user")) or _handle(item.get("username") or item.get("bot_id") or "unknown")
+            yield ChatMessage(format_timestamp(item["ts"]), sender, text,
+                              channel=channel, thread_ts=item.get("thread_ts"))
+
+
+def channel_outputs(output_dir: str, channel: str, fmt: str = "text", compression: Optional[str] = None):
+    """
+    Arquivos (limpo, completo) de um canal; em jsonl/parquet ambos são o mesmo arquivo de registros.
+    Com compression (ex.: "gz"), os arquivos são gravados comprimidos (canal.txt.gz).
+    """
+    suffix = f".{compression}" if compression else ""
+    if fmt == "text":
+        return (os.path.join(output_dir, f"{channel}.txt{suffix}"),
+                os.path.join(output_dir, f"{channel}_all.txt{suffix}"))
+    records = os.path.join(output_dir, f"{channel}{RECORD_EXTENSIONS[fmt]}{suffix}")
+    return records, records
+
+
+def _process_channel(export_dir, channel, users, mappings, output_dir, fmt, compression, apelidos_lista, whitelist,
+                     batch_size, stages):
+    """Anonimiza um canal (executado em um worker ou no processo principal)"""
+    # Mapeamentos de toda a exportação, já com todos os nomes: nenhum user_N é criado aqui
+    load_mappings(mappings)
+    state = {}
+    messages = iter_channel_messages(export_dir, channel, users, flatten=fmt == "text")
+    output_clean, output_all = channel_outputs(output_dir, channel, fmt, compression)
+    count = write_messages(anonymize_stream(messages, apelidos_lista, whitelist, state,
+                                            batch_size=batch_size, stages=stages),
+                           output_clean, output_all)
+    return channel, count, state["bert_success"]
+
+
+def process_slack_export(export_dir: str, output_dir: str, apelidos_lista: List[str], whitelist: List[str],
+                         fmt: str = "text", workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                         stages=STAGES, compression: Optional[str] = None) -> dict:
+    """
+    Anonimiza todos os canais de uma exportação do Slack, gravando um arquivo
+    (ou par de arquivos, em texto) por canal em output_dir.
+
+    Os nomes são numerados uma única vez para toda a exportação (ver
+    allocate_pseudonyms), então cada user_N é a mesma pessoa em todos os canais.
+
+    Args:
+        export_dir: Pasta da exportação (users.json, channels.json e pastas dos canais)
+        output_dir: Pasta de saída
+        apelidos_lista: Lista de apelidos para anonimizar
+        whitelist: Lista de palavras protegidas
+        fmt: Formato de saída (ver RECORD_FORMATS)
+        workers: Número de canais processados em paralelo (None ou 1 = em série).
+            Com a etapa BERT, cada worker carrega o seu próprio modelo, com a mesma
+            configuração do anonimizador global (backend, cache, filtro e empacotamento)
+        batch_size: Número máximo de mensagens por forward pass do BERT
+        stages: Etapas a aplicar (padrão: todas, ver STAGES)
+        compression: Compressão dos arquivos de saída (ex.: "gz"; None = sem compressão)
+
+    Returns:
+        Dicionário com "channels" ({canal: mensagens}) e "bert_success"
+        (True se a etapa BERT foi executada com sucesso em todos os canais)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    users = load_users(export_dir)
+    channels = list_channels(export_dir)
+    mappings = allocate_pseudonyms(export_dir, channels, users, whitelist)
+    args = (users, mappings, output_dir, fmt, compression, apelidos_lista, whitelist, batch_size, stages)
+
+    if workers and workers > 1:
+        pool = get_process_pool(workers)
+        futures = [pool.submit(call_in_worker, _process_channel, export_dir, channel, *args) for channel in channels]
+        results = []
+        for future in as_completed(futures):
+            result, stats = future.result()
+            merge_worker_stats(stats)
+            results.append(result)
+    else:
+        results = [_process_channel(export_dir, channel, *args) for channel in channels]
+
+    counts = {channel: count for channel, count, _ in results}
+    return {
+        "channels": {channel: counts[channel] for channel in channels},
+        "bert_success": "bert" in stages and all(success for _, _, success in results),
+    }
@@ -0,0 +1,62 @@
+"""
+Anotações de trechos (start, end, substituição) sobre o texto original.
+Cada etapa indica o que deve ser substituído sem reescrever a mensagem;
+os trechos sobrepostos são resolvidos por prioridade e o texto final é
+montado em uma única passada.
+"""
+from bisect import bisect_right
+from typing import List, Sequence, Tuple
+
+from .metrics import count_replacement
+
+# (start, end, texto que substitui o trecho, ex. "[EMAIL]" ou "@user_3")
+Annotation = Tuple[int, int, str]
+
+# Ordem de prioridade das etapas quando seus trechos se sobrepõem:
+#   - regex primeiro: e-mails, CPFs, chaves e blocos de código são substituídos inteiros
+#   - menções (@nome) antes de apelidos e NER: o nome mencionado vira user_N
+#   - apelidos antes do NER: a lista explícita vale mais que a detecção do modelo
+SPAN_PRIORITY = ("regex", "id", "apelidos", "bert")
+
+
+def resolve_spans(layers: Sequence[List[Annotation]]) -> List[Annotation]:
+    """
+    Combina os trechos de várias etapas, da mais prioritária para a menos.
+    Um trecho que se sobrepõe a outro já aceito é descartado por inteiro.
+
+    Args:
+        layers: Listas de trechos, em ordem decrescente de prioridade
+
+    Returns:
+        Trechos aceitos, sem sobreposição, ordenados por posição
+    """
+    accepted = []
+    starts = []
+    for layer in layers:
+        for span in layer:
+            start, end = span[0], span[1]
+            if start >= end:
+                continue
+            i = bisect_right(starts, start)
+            if i > 0 and accepted[i - 1][1] > start:
+                continue
+            if i < len(accepted) and accepted[i][0] < end:
+                continue
+            starts.insert(i, start)
+            accepted.insert(i, span)
+    return accepted
+
+
+def render_spans(text: str, spans: List[Annotation]) -> str:
+    """Monta o texto final substituindo os trechos (ordenados e sem sobreposição)"""
+    if not spans:
+        return text
+    result = []
+    last_pos = 0
+    for start, end, replacement in spans:
+        result.append(text[last_pos:start])
+        result.append(replacement)
+        count_replacement(replacement)
+        last_pos = end
+    result.append(text[last_pos:])
+    return "".join(result)
@@ -1,4 +1,21 @@
-from typing import List
+import bz2
+import gzip
+import importlib.util
+import io
+import lzma
+import os
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+# Compressão dos arquivos de mensagens, pela extensão (zstd requer o pacote zstandard)
+COMPRESSIONS = ("gz", "bz2", "xz", "zst")
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+
+# Buffer das leituras e gravações dos arquivos de mensagens
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Nível do gzip: o padrão do módulo (9) é bem mais lento e comprime pouco mais
+GZIP_LEVEL = 6
 
 def load_apelidos_from_file(file_path: str) -> List[str]:
     """
@@ -11,3 +28,81 @@ def load_apelidos_from_file(file_path: str) -> List[str]:
     except FileNotFoundError:
         print(f"⚠️  Arquivo de apelidos não encontrado: {file_path}")
         return []
+
+def get_cache_dir(*parts: str) -> str:
+    """
+    Retorna (e cria) um diretório de cache local do projeto.
+    Usa SLACK_DETOX_CACHE se definido, senão ~/.cache/slack-detox
+    """
+    base = os.environ.get("SLACK_DETOX_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "slack-detox")
+    path = os.path.join(base, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Divide um iterável em listas de até size elementos, sem materializá-lo
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def compression(path: str) -> Optional[str]:
+    """Compressão do arquivo pela extensão (ex.: "gz"), None se não for comprimido"""
+    extension = os.path.splitext(path)[1][1:]
+    return extension if extension in COMPRESSIONS else None
+
+def strip_compression(path: str) -> str:
+    """Caminho sem a extensão de compressão (chat.txt.gz -> chat.txt)"""
+    return os.path.splitext(path)[0] if compression(path) else path
+
+def find_compressed(path: str) -> str:
+    """
+    Retorna path se existir, senão a primeira versão comprimida existente
+    (path.gz, path.bz2, ...); se nenhuma existir, retorna path
+    """
+    if os.path.exists(path):
+        return path
+    for extension in COMPRESSIONS:
+        if os.path.exists(f"{path}.{extension}"):
+            return f"{path}.{extension}"
+    return path
+
+def open_text(path: str, mode: str = "r", buffer_size: int = DEFAULT_BUFFER_SIZE):
+    """
+    Abre um arquivo de texto UTF-8, comprimido ou não conforme a extensão
+    (.gz, .bz2, .xz, .zst), com um buffer grande para leituras e gravações.
+    
+    Args:
+        path: Caminho do arquivo
+        mode: "r", "w" ou "a"
+        buffer_size: Tamanho do buffer em bytes
+        
+    Raises:
+        ValueError: Arquivo .zst sem o pacote zstandard instalado
+    """
+    kind = compression(path)
+    if kind is None:
+        return open(path, mode, encoding="utf-8", buffering=buffer_size)
+    
+    binary_mode = mode.replace("t", "") + "b"
+    if kind == "gz":
+        stream = gzip.open(path, binary_mode, compresslevel=GZIP_LEVEL)
+    elif kind == "bz2":
+        stream = bz2.open(path, binary_mode)
+    elif kind == "xz":
+        stream = lzma.open(path, binary_mode)
+    else:
+        if not ZSTD_AVAILABLE:
+            raise ValueError(f"{path}: arquivos .zst requerem zstandard. Execute: pip install zstandard")
+        import zstandard
+        stream = zstandard.open(path, binary_mode)
+    
+    if "r" in mode:
+        stream = io.BufferedReader(stream, buffer_size)
+    else:
+        stream = io.BufferedWriter(stream, buffer_size)
+    return io.TextIOWrapper(stream, encoding="utf-8")
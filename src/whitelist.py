@@ -1,5 +1,46 @@
 import re
-from typing import List, Dict, Tuple
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple, Union
+
+Span = Tuple[int, int]
+
+@lru_cache(maxsize=8)
+def _compile_whitelist(words: tuple) -> "re.Pattern":
+    # Mais longas primeiro, para "google slides" ter prioridade sobre "google"
+    alternatives = sorted({re.escape(word) for word in words}, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)", re.IGNORECASE)
+
+def compile_whitelist(whitelist: Union[List[str], "re.Pattern", None]) -> Optional["re.Pattern"]:
+    """
+    Compila a whitelist em um único matcher (palavras inteiras, sem diferenciar
+    maiúsculas). Aceita também um matcher já compilado, devolvido sem alteração.
+    """
+    if isinstance(whitelist, re.Pattern):
+        return whitelist
+    if not whitelist:
+        return None
+    return _compile_whitelist(tuple(whitelist))
+
+def protected_spans(text: str, whitelist: Union[List[str], "re.Pattern", None]) -> List[Span]:
+    """
+    Retorna os trechos (start, end) do texto ocupados por palavras da whitelist.
+    As etapas descartam detecções contidas nesses trechos, sem reescrever o texto.
+    """
+    matcher = compile_whitelist(whitelist)
+    if matcher is None:
+        return []
+    return [match.span() for match in matcher.finditer(text)]
+
+def is_protected(spans: List[Span], start: int, end: int) -> bool:
+    """
+    Verifica se o trecho [start, end) está inteiramente dentro de uma palavra protegida.
+    Detecções que apenas contêm uma palavra protegida (ex.: e-mail @google.com)
+    continuam sendo anonimizadas.
+    """
+    for span_start, span_end in spans:
+        if span_start <= start and end <= span_end:
+            return True
+    return False
 
 def protect_whitelist_words(text: str, whitelist: List[str]) -> Tuple[str, Dict[str, str]]:
     """
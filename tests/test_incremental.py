@@ -0,0 +1,30 @@
+import json
+
+from src.incremental import process_incremental
+
+STAGES = ("id", "regex", "apelidos")
+
+
+def _records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_incremental_jsonl(tmp_path):
+    input_file = tmp_path / "chat.txt"
+    output = str(tmp_path / "result_final.jsonl")
+    checkpoint = str(tmp_path / "checkpoint.json")
+    input_file.write_text("[1] ana: meu cpf é 123.456.789-09\n[2] bia: oi @ana\n", encoding='utf-8')
+
+    result = process_incremental(str(input_file), output, output, [], [], checkpoint, stages=STAGES)
+    assert result["saved"] and result["full"] and result["messages"] == 2
+    records = _records(output)
+    assert [record["sender"] for record in records] == ["user_1", "user_2"]
+    assert "[CPF]" in records[0]["message"]
+    assert list(tmp_path.glob("*.tmp*")) == []
+
+    with open(input_file, 'a', encoding='utf-8') as f:
+        f.write("[3] ana: tchau\n")
+    result = process_incremental(str(input_file), output, output, [], [], checkpoint, stages=STAGES)
+    assert result["saved"] and not result["full"] and result["messages"] == 1
+    assert [record["sender"] for record in _records(output)] == ["user_1", "user_2", "user_1"]